@@ -0,0 +1,577 @@
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# ------------------------------------------------------------
+# MOCK GITHUB API
+# ------------------------------------------------------------
+# A local stand-in for the parts of the GitHub REST API used by main.py:
+#   /repos/{owner}/{repo}, /repos/{owner}/{repo}/{issues,pulls,commits,comments}
+#   /repos/{owner}/{repo}/{issues,pulls}/comments, /repos/{owner}/{repo}/issues/events
+#   /repos/{owner}/{repo}/issues/{number}/{comments,events}
+#   /rate_limit, /user and the web page /{owner}/{repo}
+#   /graphql, only the issue thread query of github_downloader.graphql_engine
+#            and the repository query of github_downloader.repository_validator
+# with Link headers, per_page, ETags (304 Not Modified), rate limit headers,
+# 'since' and 'direction' on '/issues' and '/pulls', and optional latency and
+# errors. Every item is generated on demand from
+# its index, so large synthetic repositories cost no memory.
+
+MOCK_OWNER = "bench"
+# Every n-th issue has a long thread that needs several pages
+LONG_THREAD_EVERY = 50
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+RATE_LIMIT_WINDOW_SECONDS = 3600
+# 'updated_at' of the issue (or pull, commit, ...) number 0, every next number
+# is a minute later, so newest first is also most recently updated first
+UPDATED_AT_START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# The user with this number is a bot account (a GitHub App)
+BOT_USER_NUMBER = 12
+# GraphQL reaction contents of the REST reaction names, in the REST order
+REACTION_CONTENTS = {
+    "+1": "THUMBS_UP", "-1": "THUMBS_DOWN", "laugh": "LAUGH", "hooray": "HOORAY",
+    "confused": "CONFUSED", "heart": "HEART", "rocket": "ROCKET", "eyes": "EYES",
+}
+
+# Fixed synthetic sizes, per repository
+REPOSITORY_SIZES = {
+    "small": {
+        "repositories": 1, "issues": 250, "pulls": 100, "commits": 300,
+        "commit_comments": 50, "review_comments": 100,
+        "comments_per_issue": 3, "events_per_issue": 2, "long_thread_comments": 45,
+    },
+    "medium": {
+        "repositories": 2, "issues": 2000, "pulls": 800, "commits": 3000,
+        "commit_comments": 400, "review_comments": 1000,
+        "comments_per_issue": 4, "events_per_issue": 3, "long_thread_comments": 120,
+    },
+    "large": {
+        "repositories": 4, "issues": 10000, "pulls": 4000, "commits": 20000,
+        "commit_comments": 2000, "review_comments": 6000,
+        "comments_per_issue": 5, "events_per_issue": 4, "long_thread_comments": 250,
+    },
+}
+
+
+def get_repository_names(size):
+    return [f"repo{number}" for number in range(1, REPOSITORY_SIZES[size]["repositories"] + 1)]
+
+
+def get_updated_at(number):
+    return (UPDATED_AT_START + datetime.timedelta(minutes=number)).strftime(TIMESTAMP_FORMAT)
+
+
+def get_first_number_updated_since(since):
+    """
+    Return the first number whose 'updated_at' is at or after 'since'.
+    Raises ValueError if 'since' is not an ISO 8601 timestamp in UTC.
+    """
+    since_time = datetime.datetime.strptime(since, TIMESTAMP_FORMAT).replace(tzinfo=datetime.timezone.utc)
+    return max(math.ceil((since_time - UPDATED_AT_START).total_seconds() / 60), 1)
+
+
+def sort_collection(count, make_item, query, with_since):
+    """
+    Return the (count, make_item) of a collection listed newest first, with
+    only the items updated at or after 'since' (if 'with_since') and oldest
+    first for 'direction=asc'. The item at index i has the number count - i
+    and 'updated_at' grows with the number, so the 'sort' parameter (created
+    or updated) gives the same order.
+    """
+    since = query.get("since", [None])[0]
+    if with_since and since is not None:
+        count = min(max(count - get_first_number_updated_since(since) + 1, 0), count)
+    if query.get("direction", ["desc"])[0] == "asc":
+        return count, lambda index: make_item(count - 1 - index)
+    return count, make_item
+
+
+class MockRepositoryData:
+    """
+    This class generates the items of the synthetic repositories.
+    'get_collection' returns the number of items of a path and a function
+    that builds the item at an index, newest first like GitHub.
+    """
+
+    def __init__(self, base_url, size="small"):
+        self.base_url = base_url
+        self.size = REPOSITORY_SIZES[size]
+        self.repositories = set(get_repository_names(size))
+
+    def get_issue_url(self, repo, number):
+        return f"{self.base_url}/repos/{MOCK_OWNER}/{repo}/issues/{number}"
+
+    def get_number_of_comments(self, number):
+        if number % LONG_THREAD_EVERY == 0:
+            return self.size["long_thread_comments"]
+        return self.size["comments_per_issue"]
+
+    def make_user(self, user_number):
+        """
+        Return the REST user object of a synthetic user, all of its fields.
+        """
+        if user_number == BOT_USER_NUMBER:
+            login, html_url, user_type = "bench-bot[bot]", "https://github.com/apps/bench-bot", "Bot"
+        else:
+            login, html_url, user_type = f"user{user_number}", f"https://github.com/user{user_number}", "User"
+        user_url = f"{self.base_url}/users/{login.replace('[', '%5B').replace(']', '%5D')}"
+        return {
+            "login": login, "id": 1000 + user_number, "node_id": f"U_{user_number}",
+            "avatar_url": f"https://avatars.githubusercontent.com/u/{1000 + user_number}?v=4", "gravatar_id": "",
+            "url": user_url, "html_url": html_url,
+            "followers_url": f"{user_url}/followers", "following_url": f"{user_url}/following{{/other_user}}",
+            "gists_url": f"{user_url}/gists{{/gist_id}}", "starred_url": f"{user_url}/starred{{/owner}}{{/repo}}",
+            "subscriptions_url": f"{user_url}/subscriptions", "organizations_url": f"{user_url}/orgs",
+            "repos_url": f"{user_url}/repos", "events_url": f"{user_url}/events{{/privacy}}",
+            "received_events_url": f"{user_url}/received_events", "type": user_type, "site_admin": user_number == 0,
+        }
+
+    def make_issue(self, repo, number):
+        url = self.get_issue_url(repo, number)
+        return {
+            "id": number, "node_id": f"I_{repo}_{number}", "number": number, "url": url,
+            "comments_url": f"{url}/comments", "events_url": f"{url}/events",
+            "title": f"Issue {number}", "state": "open" if number % 3 else "closed",
+            "user": self.make_user(number % 17), "comments": self.get_number_of_comments(number),
+            "body": "Synthetic issue body. " * 8,
+            "created_at": "2023-01-01T00:00:00Z",
+            "updated_at": get_updated_at(number),
+        }
+
+    def make_comment(self, repo, number, index):
+        comment_id = number * 100000 + index
+        return {
+            "url": f"{self.base_url}/repos/{MOCK_OWNER}/{repo}/issues/comments/{comment_id}",
+            "html_url": f"https://github.com/{MOCK_OWNER}/{repo}/issues/{number}#issuecomment-{comment_id}",
+            "issue_url": self.get_issue_url(repo, number),
+            "id": comment_id, "node_id": f"IC_{repo}_{number}_{index}", "user": self.make_user(index % 13),
+            "created_at": "2023-06-01T00:00:00Z", "updated_at": "2023-06-01T00:00:00Z",
+            "author_association": "CONTRIBUTOR", "body": "Synthetic comment body. " * 4,
+            "reactions": {
+                "url": f"{self.base_url}/repos/{MOCK_OWNER}/{repo}/issues/comments/{comment_id}/reactions",
+                "total_count": index % 3 + index % 2, "+1": index % 3, "-1": 0, "laugh": 0, "hooray": 0,
+                "confused": 0, "heart": index % 2, "rocket": 0, "eyes": 0,
+            },
+            "performed_via_github_app": None,
+        }
+
+    def make_event(self, repo, number, index, with_issue=False):
+        event_id = number * 100000 + index
+        event = {
+            "id": event_id, "node_id": f"E_{repo}_{number}_{index}",
+            "url": f"{self.base_url}/repos/{MOCK_OWNER}/{repo}/issues/events/{event_id}",
+            "actor": self.make_user(index % 11), "event": "labeled",
+            "created_at": "2023-06-01T00:00:00Z",
+        }
+        if with_issue:
+            event["issue"] = self.make_issue(repo, number)
+        return event
+
+    def make_item(self, repo, kind, number):
+        return {
+            "id": number, "node_id": f"{kind}_{repo}_{number}", "number": number,
+            "user": self.make_user(number % 19), "body": f"Synthetic {kind} body. " * 4,
+            "created_at": "2023-01-01T00:00:00Z", "updated_at": get_updated_at(number),
+        }
+
+    def get_graphql_thread(self, repo, number, page_size):
+        """
+        Return the comments of an issue the way the GraphQL issue thread
+        query does, or None for an unknown issue.
+        """
+        if not 1 <= number <= self.size["issues"]:
+            return None
+
+        number_of_comments = self.get_number_of_comments(number)
+        comments = []
+        for index in range(min(number_of_comments, page_size)):
+            comment = self.make_comment(repo, number, index)
+            user = comment["user"]
+            author = {"__typename": user["type"], "login": user["login"].replace("[bot]", ""), "avatarUrl": user["avatar_url"],
+                      "url": user["html_url"], "id": user["node_id"], "databaseId": user["id"]}
+            if user["type"] == "User":
+                author["isSiteAdmin"] = user["site_admin"]
+            comments.append({
+                "id": comment["node_id"], "databaseId": comment["id"],
+                "url": comment["html_url"], "body": comment["body"],
+                "createdAt": comment["created_at"], "updatedAt": comment["updated_at"],
+                "authorAssociation": comment["author_association"], "author": author,
+                "reactionGroups": [{"content": content, "reactors": {"totalCount": comment["reactions"][name]}}
+                                   for name, content in REACTION_CONTENTS.items()],
+            })
+        return {"comments": {"pageInfo": {"hasNextPage": number_of_comments > page_size}, "nodes": comments}}
+
+    def get_flat_collection(self, count_per_issue, make):
+        """
+        Return a repository-wide collection of the per-issue items,
+        issue after issue.
+        """
+        counts = [count_per_issue(number) for number in range(1, self.size["issues"] + 1)]
+        starts = [0]
+        for count in counts:
+            starts.append(starts[-1] + count)
+
+        def make_flat_item(index):
+            # Binary search of the issue that holds the item
+            low, high = 0, len(counts) - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if starts[middle] <= index:
+                    low = middle
+                else:
+                    high = middle - 1
+            return make(low + 1, index - starts[low])
+        return starts[-1], make_flat_item
+
+    def get_collection(self, path, query=None):
+        # 'query' holds the parsed query parameters, None is returned for an unknown path
+        query = query or {}
+        match = re.fullmatch(rf"/repos/{MOCK_OWNER}/([^/]+)/(.+)", path)
+        if match is None or match.group(1) not in self.repositories:
+            return None
+        repo, rest = match.groups()
+        issues = self.size["issues"]
+
+        match = re.fullmatch(r"issues/(\d+)/(comments|events)", rest)
+        if match is not None:
+            number = int(match.group(1))
+            if not 1 <= number <= issues:
+                return None
+            if match.group(2) == "comments":
+                return self.get_number_of_comments(number), lambda index: self.make_comment(repo, number, index)
+            return self.size["events_per_issue"], lambda index: self.make_event(repo, number, index)
+
+        if rest == "issues":
+            return sort_collection(issues, lambda index: self.make_issue(repo, issues - index), query, with_since=True)
+        if rest == "issues/comments":
+            return self.get_flat_collection(self.get_number_of_comments,
+                                            lambda number, index: self.make_comment(repo, number, index))
+        if rest == "issues/events":
+            return self.get_flat_collection(lambda number: self.size["events_per_issue"],
+                                            lambda number, index: self.make_event(repo, number, index, with_issue=True))
+        kinds = {"pulls": "pulls", "commits": "commits", "comments": "commit_comments", "pulls/comments": "review_comments"}
+        if rest in kinds:
+            count = self.size[kinds[rest]]
+            collection = count, lambda index: self.make_item(repo, kinds[rest], count - index)
+            # Like GitHub, '/pulls' can be sorted but has no 'since'
+            return sort_collection(*collection, query, with_since=False) if rest == "pulls" else collection
+        return None
+
+
+class MockStats:
+    """
+    This class counts the requests and the bytes served by the mock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.statuses = {}
+
+    def record(self, status, number_of_bytes):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += number_of_bytes
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "bytes_sent": self.bytes_sent,
+                "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            }
+
+
+class MockRateLimit:
+    """
+    This class keeps one GitHub style rate limit budget per token.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.budgets = {}
+
+    def get_budget(self, token):
+        now = time.time()
+        remaining, reset_time = self.budgets.get(token, (self.limit, 0))
+        if now >= reset_time:
+            remaining, reset_time = self.limit, int(now) + RATE_LIMIT_WINDOW_SECONDS
+        return remaining, reset_time
+
+    def peek(self, token):
+        with self.lock:
+            return self.get_budget(token)
+
+    def spend(self, token):
+        """
+        Count one request, return (allowed, remaining, reset_time).
+        """
+        with self.lock:
+            remaining, reset_time = self.get_budget(token)
+            if remaining <= 0:
+                self.budgets[token] = (0, reset_time)
+                return False, 0, reset_time
+            self.budgets[token] = (remaining - 1, reset_time)
+            return True, remaining - 1, reset_time
+
+    def refund(self, token):
+        with self.lock:
+            remaining, reset_time = self.get_budget(token)
+            self.budgets[token] = (min(remaining + 1, self.limit), reset_time)
+
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def get_token(self):
+        return self.headers.get("Authorization", "")
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            data = b""
+        self.wfile.write(data)
+        self.server.stats.record(status, len(data))
+
+    def get_rate_limit_headers(self, remaining, reset_time, resource="core"):
+        return {
+            "X-RateLimit-Limit": str(self.server.rate_limit.limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(reset_time),
+            "X-RateLimit-Resource": resource,
+        }
+
+    def get_link_header(self, path, query, page, last_page):
+        def get_page_url(page_number):
+            page_query = {name: values[0] for name, values in query.items()}
+            page_query["page"] = page_number
+            return f"{self.server.base_url}{path}?{urlencode(page_query)}"
+
+        links = []
+        if page > 1:
+            links.append(f'<{get_page_url(1)}>; rel="first"')
+            links.append(f'<{get_page_url(page - 1)}>; rel="prev"')
+        if page < last_page:
+            links.append(f'<{get_page_url(page + 1)}>; rel="next"')
+            links.append(f'<{get_page_url(last_page)}>; rel="last"')
+        return ", ".join(links)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        server = self.server
+        if server.latency_seconds:
+            time.sleep(server.latency_seconds * (1 + server.random_uniform(-0.25, 0.25)))
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlparse(self.path).path.rstrip("/") != "/graphql":
+            return self.send_json(404, {"message": "Not Found"})
+        if server.random_uniform(0, 1) < server.error_rate:
+            return self.send_json(502, {"message": "Server Error"})
+
+        allowed, remaining, reset_time = server.graphql_rate_limit.spend(self.get_token())
+        headers = self.get_rate_limit_headers(remaining, reset_time, "graphql")
+        if not allowed:
+            return self.send_json(403, {"message": "API rate limit exceeded"}, headers)
+
+        try:
+            payload = json.loads(body)
+            query = payload["query"]
+            repositories = re.findall(r'(\w+): repository\(owner: "([^"]+)", name: "([^"]+)"\)', query)
+            if repositories:
+                return self.send_repositories(repositories, headers)
+            repo = payload["variables"]["name"]
+        except (ValueError, KeyError):
+            return self.send_json(400, {"message": "Problems parsing JSON"}, headers)
+        if repo not in server.data.repositories:
+            return self.send_json(200, {"data": {"repository": None}, "errors": [{"type": "NOT_FOUND", "message": "Could not resolve to a Repository"}]}, headers)
+
+        page_size_match = re.search(r"comments\(first: (\d+)\)", query)
+        page_size = int(page_size_match.group(1)) if page_size_match else DEFAULT_PER_PAGE
+        repository = {}
+        for alias, number in re.findall(r"(\w+): issueOrPullRequest\(number: (\d+)\)", query):
+            repository[alias] = server.data.get_graphql_thread(repo, int(number), page_size)
+        data = {"rateLimit": {"cost": 1 + len(repository) // 100, "remaining": remaining}, "repository": repository}
+        return self.send_json(200, {"data": data}, headers)
+
+    def send_repositories(self, repositories, headers):
+        data = {}
+        errors = []
+        for alias, owner, repo in repositories:
+            if owner == MOCK_OWNER and repo in self.server.data.repositories:
+                data[alias] = {"nameWithOwner": f"{owner}/{repo}"}
+            else:
+                data[alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [alias],
+                               "message": f"Could not resolve to a Repository with the name '{owner}/{repo}'."})
+        result = {"data": data}
+        if errors:
+            result["errors"] = errors
+        return self.send_json(200, result, headers)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency_seconds:
+            time.sleep(server.latency_seconds * (1 + server.random_uniform(-0.25, 0.25)))
+
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        query = parse_qs(url.query)
+
+        if path == "/_mock/stats":
+            return self.send_json(200, server.stats.snapshot())
+        if path == "/rate_limit":
+            # Free, like on GitHub
+            resources = {}
+            for name, rate_limit in (("core", server.rate_limit), ("graphql", server.graphql_rate_limit)):
+                remaining, reset_time = rate_limit.peek(self.get_token())
+                resources[name] = {"limit": rate_limit.limit, "remaining": remaining, "reset": reset_time, "used": rate_limit.limit - remaining}
+            return self.send_json(200, {"resources": resources, "rate": resources["core"]})
+
+        match = re.fullmatch(rf"/{MOCK_OWNER}/([^/]+)", path)
+        if match is not None:
+            # The github.com page of a repository, not part of the API budget
+            if match.group(1) in server.data.repositories:
+                return self.send_json(200, {})
+            return self.send_json(404, {"message": "Not Found"})
+
+        if server.random_uniform(0, 1) < server.error_rate:
+            return self.send_json(502, {"message": "Server Error"})
+
+        allowed, remaining, reset_time = server.rate_limit.spend(self.get_token())
+        headers = self.get_rate_limit_headers(remaining, reset_time)
+        if not allowed:
+            return self.send_json(403, {"message": "API rate limit exceeded"}, headers)
+
+        if path == "/user":
+            return self.send_json(200, {"login": "benchmark"}, headers)
+        match = re.fullmatch(rf"/repos/{MOCK_OWNER}/([^/]+)", path)
+        if match is not None and match.group(1) in server.data.repositories:
+            return self.send_json(200, {"full_name": f"{MOCK_OWNER}/{match.group(1)}"}, headers)
+
+        try:
+            collection = server.data.get_collection(path, query)
+        except ValueError:
+            return self.send_json(422, {"message": "Validation Failed"}, headers)
+        if collection is None:
+            return self.send_json(404, {"message": "Not Found"}, headers)
+
+        count, make_item = collection
+        try:
+            per_page = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+            page = max(int(query.get("page", ["1"])[0]), 1)
+        except ValueError:
+            return self.send_json(422, {"message": "Validation Failed"}, headers)
+
+        last_page = max((count + per_page - 1) // per_page, 1)
+        start = (page - 1) * per_page
+        items = [make_item(index) for index in range(start, min(start + per_page, count))]
+        link_header = self.get_link_header(path, query, page, last_page)
+        if link_header:
+            headers["Link"] = link_header
+
+        etag = '"%s"' % hashlib.sha1(json.dumps(items).encode("utf-8")).hexdigest()
+        headers["ETag"] = etag
+        if self.headers.get("If-None-Match") == etag:
+            # 304s are not counted against the rate limit
+            server.rate_limit.refund(self.get_token())
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            server.stats.record(304, 0)
+            return
+        return self.send_json(200, items, headers)
+
+
+class MockGitHubServer(ThreadingHTTPServer):
+    """
+    This class serves the mock API on 'host:port' (port 0 picks a free
+    port). 'latency_seconds' is added to every request (+-25% jitter) and
+    'error_rate' of the API requests fail with a 502. 'seed' makes the
+    injected jitter and errors repeatable.
+    """
+
+    daemon_threads = True
+    # Accept many connections at once, with the default of 5 a burst of new
+    # connections waits for SYN retransmits
+    request_queue_size = 1024
+
+    def __init__(self, host="127.0.0.1", port=0, size="small", rate_limit=1000000,
+                 latency_seconds=0, error_rate=0, seed=0):
+        super().__init__((host, port), MockGitHubHandler)
+        self.base_url = f"http://{host}:{self.server_address[1]}"
+        self.data = MockRepositoryData(self.base_url, size)
+        self.stats = MockStats()
+        self.rate_limit = MockRateLimit(rate_limit)
+        self.graphql_rate_limit = MockRateLimit(rate_limit)
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+    def random_uniform(self, low, high):
+        with self.random_lock:
+            return self.random.uniform(low, high)
+
+    def start(self):
+        """
+        Serve from a daemon thread and return the base url.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self.base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock GitHub API with synthetic repositories.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size", choices=sorted(REPOSITORY_SIZES), default="small")
+    parser.add_argument("--rate-limit", type=int, default=1000000, help="calls per token per hour")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of API requests answered with 502")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockGitHubServer(args.host, args.port, args.size, args.rate_limit,
+                              args.latency_ms / 1000, args.error_rate, args.seed)
+    print(f"Serving the '{args.size}' repositories {get_repository_names(args.size)} of '{MOCK_OWNER}' on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
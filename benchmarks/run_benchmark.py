@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_github import MOCK_OWNER, REPOSITORY_SIZES, MockGitHubServer, get_repository_names
+
+# ------------------------------------------------------------
+# END TO END BENCHMARK
+# ------------------------------------------------------------
+# Runs main.py against the mock GitHub API in a scratch directory and
+# reports requests/sec, pages/sec, bytes written and the peak RSS of the
+# crawl. The first run starts from an empty directory, the next runs
+# resume in the same directory (the conditional request / resume path).
+#
+#   python benchmarks/run_benchmark.py --size small --runs 2
+#   python benchmarks/run_benchmark.py --size medium --latency-ms 20 --output results.json
+#   python benchmarks/run_benchmark.py --size medium -- --graphql --output-format jsonl.gz
+#   python benchmarks/run_benchmark.py --size medium --latency-ms 50 -- --engine async
+#
+# Arguments after '--' are passed to main.py.
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+PAGE_FILE_PATTERN = re.compile(r".+_page_\d+(\.refs)?\.json$")
+INDEX_FILE_SUFFIX = "_index.jsonl"
+
+
+def create_work_directory(work_directory, base_url, size, tokens):
+    """
+    This function lays out the config folder main.py expects, with the
+    repositories of the mock in github_urls.csv.
+    """
+    config_directory = os.path.join(work_directory, "config")
+    os.makedirs(os.path.join(config_directory, "data"), exist_ok=True)
+    with open(os.path.join(config_directory, "credentials.json"), "w") as json_file:
+        json.dump({"github_auth": {"Bearer": tokens}}, json_file)
+    with open(os.path.join(config_directory, "github_urls.csv"), "w") as csv_file:
+        csv_file.write("repository_url\n")
+        for repo in get_repository_names(size):
+            csv_file.write(f"{base_url}/{MOCK_OWNER}/{repo}\n")
+
+
+def measure_output(data_directory):
+    """
+    Return the number of saved pages and the bytes of the data directory,
+    for the pretty json pages, the JSON Lines shards and the reference
+    pages of the dedup format alike.
+    """
+    pages = 0
+    number_of_bytes = 0
+    for directory, _, file_names in os.walk(data_directory):
+        for file_name in file_names:
+            location = os.path.join(directory, file_name)
+            number_of_bytes += os.path.getsize(location)
+            if PAGE_FILE_PATTERN.match(file_name):
+                pages += 1
+            elif file_name.endswith(INDEX_FILE_SUFFIX):
+                with open(location, "r") as index_file:
+                    pages += len({json.loads(line)["page"] for line in index_file})
+    return pages, number_of_bytes
+
+
+def run_crawl(work_directory, base_url, downloader_args=()):
+    """
+    Run main.py once and return (exit code, seconds, peak RSS in bytes).
+    """
+    environment = dict(os.environ, GITHUB_API_URL=base_url, GITHUB_WEB_HOST=base_url.split("//")[1])
+    with open(os.path.join(work_directory, "benchmark_output.txt"), "a") as output_file:
+        start_time = time.perf_counter()
+        process = subprocess.Popen([sys.executable, MAIN_SCRIPT, *downloader_args], cwd=work_directory, env=environment,
+                                   stdout=output_file, stderr=subprocess.STDOUT)
+        # wait4 gives the resource usage of this child alone
+        _, status, resource_usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start_time
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak_rss = resource_usage.ru_maxrss if sys.platform == "darwin" else resource_usage.ru_maxrss * 1024
+    return process.returncode, elapsed, peak_rss
+
+
+def run_benchmark(size, runs, tokens, latency_seconds, error_rate, rate_limit, seed, work_directory, downloader_args=()):
+    server = MockGitHubServer(size=size, rate_limit=rate_limit, latency_seconds=latency_seconds,
+                              error_rate=error_rate, seed=seed)
+    base_url = server.start()
+    create_work_directory(work_directory, base_url, size, tokens)
+    data_directory = os.path.join(work_directory, "config", "data")
+
+    results = []
+    try:
+        for run_number in range(1, runs + 1):
+            server.stats.reset()
+            pages_before, bytes_before = measure_output(data_directory)
+            exit_code, elapsed, peak_rss = run_crawl(work_directory, base_url, downloader_args)
+            pages_after, bytes_after = measure_output(data_directory)
+            stats = server.stats.snapshot()
+            results.append({
+                "run": run_number,
+                "exit_code": exit_code,
+                "seconds": round(elapsed, 3),
+                "requests": stats["requests"],
+                "requests_per_second": round(stats["requests"] / elapsed, 1),
+                "pages": pages_after,
+                "pages_written": pages_after - pages_before,
+                "pages_per_second": round((pages_after - pages_before) / elapsed, 1),
+                "bytes_served": stats["bytes_sent"],
+                "bytes_written": bytes_after - bytes_before,
+                "bytes_on_disk": bytes_after,
+                "peak_rss_bytes": peak_rss,
+                "statuses": stats["statuses"],
+            })
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def print_results(results):
+    columns = ["run", "exit_code", "seconds", "requests", "requests_per_second", "pages_written",
+               "pages_per_second", "bytes_written", "peak_rss_bytes"]
+    print(" ".join(f"{column:>20}" for column in columns))
+    for result in results:
+        print(" ".join(f"{result[column]:>20}" for column in columns))
+        print(f"{'':>20} statuses: {result['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main.py against the mock GitHub API.")
+    parser.add_argument("--size", choices=sorted(REPOSITORY_SIZES), default="small")
+    parser.add_argument("--runs", type=int, default=2, help="the first run is cold, the next ones resume")
+    parser.add_argument("--tokens", type=int, default=1, help="number of tokens in credentials.json")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit", type=int, default=1000000, help="calls per token per hour")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-directory", help="keep the scratch directory here instead of a temporary one")
+    parser.add_argument("--output", help="also write the results to this json file")
+    args, downloader_args = parser.parse_known_args()
+    if downloader_args[:1] == ["--"]:
+        downloader_args = downloader_args[1:]
+
+    tokens = [f"benchmark-token-{number}" for number in range(1, args.tokens + 1)]
+    if args.work_directory:
+        shutil.rmtree(args.work_directory, ignore_errors=True)
+        os.makedirs(args.work_directory)
+        work_directory = args.work_directory
+    else:
+        temporary_directory = tempfile.TemporaryDirectory()
+        work_directory = temporary_directory.name
+
+    results = run_benchmark(args.size, args.runs, tokens, args.latency_ms / 1000, args.error_rate,
+                            args.rate_limit, args.seed, work_directory, downloader_args)
+    print(f"size={args.size} repositories={REPOSITORY_SIZES[args.size]['repositories']} "
+          f"tokens={args.tokens} latency_ms={args.latency_ms} error_rate={args.error_rate} main.py {' '.join(downloader_args)}")
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump({"size": args.size, "tokens": args.tokens, "latency_ms": args.latency_ms,
+                       "error_rate": args.error_rate, "downloader_args": downloader_args, "results": results}, json_file, indent=4)
+
+    if any(result["exit_code"] != 0 for result in results):
+        if args.work_directory:
+            print(f"main.py failed, see {os.path.join(work_directory, 'benchmark_output.txt')}")
+        else:
+            print("main.py failed, run again with --work-directory to keep its output")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
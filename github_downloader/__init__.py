@@ -0,0 +1,19 @@
+"""
+Download the issues, pulls, commits and comments of GitHub repositories.
+
+    from github_downloader import Downloader, DownloaderConfig
+
+    downloader = Downloader(DownloaderConfig(tokens=["..."], output_format="jsonl.gz"))
+    downloader.sync("user/repo", ["issues", "pulls"])
+"""
+from .config import DownloaderConfig
+
+__all__ = ["Downloader", "DownloaderConfig"]
+
+
+def __getattr__(name):
+    # The Downloader pulls in requests, it is only imported when used
+    if name == "Downloader":
+        from .downloader import Downloader
+        return Downloader
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -0,0 +1,366 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .config import ASYNC_MAX_IN_FLIGHT
+from .downloader import create_spool, get_failure_reason, get_next_page_url, ISSUE_ITEMS_PER_PAGE, ISSUE_REQUEST_TIMEOUT_SECONDS
+from .endpoints import check_github_endpoints, get_endpoint_name
+from .http_client import DownloadError, REQUEST_TIMEOUT_SECONDS
+from .output_writer import parse_page
+from .resume_planner import get_contiguous_page_number
+from .retry_policy import RetryState, is_permanent_error
+from .scheduler import order_jobs_fairly
+
+# ------------------------------------------------------------
+# ASYNCIO ENGINE
+# ------------------------------------------------------------
+# Downloads the same pages as Downloader.download_endpoint from one process
+# and one event loop: every request is a coroutine, so thousands can be in
+# flight, capped by a semaphore and the rate limit budget of the tokens.
+# Retry and rate limit waits are 'asyncio.sleep'. The pages of an endpoint
+# are pipelined: a page is fetched, the comments and events of its issues
+# are fetched concurrently, and the page is handed to the write stage, one
+# thread that does every file and progress store write in turn.
+# Needs the 'httpx' package.
+# Connections of one httpx client. httpcore scans every connection of a pool
+# for every queued request, so the requests in flight are spread over several
+# small pools instead of one big one
+ASYNC_CONNECTIONS_PER_CLIENT = 32
+# Pages of one endpoint that are fetched (with their issue threads) at the same time
+ASYNC_PAGES_IN_FLIGHT = 16
+# Repositories downloaded at the same time, the jobs of a repository run in
+# order because some of them write the same pages ('issues' and 'issues_comments')
+ASYNC_REPOSITORIES_IN_FLIGHT = 8
+
+
+class AsyncGitHubClient:
+    """
+    This class is the asyncio counterpart of GitHubClient: the same token
+    pool, retry policy and metrics, with at most 'max_in_flight' requests
+    sent at the same time.
+    """
+
+    def __init__(self, token_pool, retry_policy, metrics, headers, max_in_flight=ASYNC_MAX_IN_FLIGHT):
+        if httpx is None:
+            raise ImportError("The asyncio engine needs the 'httpx' package")
+        self.token_pool = token_pool
+        self.retry_policy = retry_policy
+        self.metrics = metrics
+        self.headers = {**headers, 'Accept-Encoding': 'gzip'}
+        self.max_in_flight = max_in_flight
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.http_clients = []
+        self.next_http_client = None
+
+    async def __aenter__(self):
+        limits = httpx.Limits(max_connections=ASYNC_CONNECTIONS_PER_CLIENT, max_keepalive_connections=ASYNC_CONNECTIONS_PER_CLIENT)
+        number_of_clients = max(1, -(-self.max_in_flight // ASYNC_CONNECTIONS_PER_CLIENT))
+        self.http_clients = [httpx.AsyncClient(headers=self.headers, limits=limits) for _ in range(number_of_clients)]
+        self.next_http_client = itertools.cycle(self.http_clients)
+        return self
+
+    async def __aexit__(self, exception_type, exception, traceback):
+        for http_client in self.http_clients:
+            await http_client.aclose()
+        return False
+
+    async def wait_for_budget(self):
+        """
+        Wait until one of the tokens can send a request, reserve one call
+        from its budget and return that budget, like TokenPool.wait_for_budget
+        but without blocking the event loop.
+        """
+        token_pool = self.token_pool
+        while True:
+            if token_pool.needs_refresh():
+                # try_reserve asks '/rate_limit' first, with the blocking session
+                budget, wait_time_limit = await asyncio.to_thread(token_pool.try_reserve)
+            else:
+                # Only takes the locks of the budgets, which are never held during a request
+                budget, wait_time_limit = token_pool.try_reserve()
+            if budget is not None:
+                return budget
+
+            logging.warning(f"All {len(token_pool.budgets)} tokens are exhausted, sleeping for {int(wait_time_limit)} seconds")
+            await asyncio.sleep(wait_time_limit)
+
+    async def get(self, url, timeout=REQUEST_TIMEOUT_SECONDS, headers=None, max_retries=None):
+        """
+        Send a GET request and return the response, with the retries of
+        GitHubClient.request (both follow a RetryState).
+        """
+        retry_state = RetryState(self.retry_policy, url, self.metrics, max_retries)
+        metrics = self.metrics
+        while retry_state.start_attempt():
+            request_start = time.perf_counter() if metrics.enabled else 0
+            # Picks the token with the most calls left, sleeps if all are exhausted
+            budget = await self.wait_for_budget()
+            if metrics.enabled:
+                now = time.perf_counter()
+                metrics.add("rate_limit_wait_seconds", budget.category, now - request_start)
+                request_start = now
+            request_headers = {**(budget.headers or {}), **(headers or {})}
+            response = None
+            try:
+                async with self.in_flight:
+                    response = await next(self.next_http_client).get(url, headers=request_headers, timeout=timeout)
+                if metrics.enabled:
+                    metrics.observe_request("GET", url, response.status_code, time.perf_counter() - request_start, len(response.content))
+                budget.update_from_headers(response.headers)
+                if response.status_code == 304:
+                    # Conditional requests answered with 304 are free
+                    budget.refund()
+                logging.info(f"Status: {response.status_code} for {response.url}")
+                reason = f"Status {response.status_code}"
+            except httpx.TimeoutException as e:
+                metrics.observe_request("GET", url, type(e).__name__, time.perf_counter() - request_start)
+                reason = "Request timed out"
+            except httpx.HTTPError as e:
+                metrics.observe_request("GET", url, type(e).__name__, time.perf_counter() - request_start)
+                reason = "Request failed"
+
+            wait_time_limit = retry_state.record_attempt(response, reason, budget)
+            if wait_time_limit:
+                await asyncio.sleep(wait_time_limit)
+
+        # If all retries fail, this is the last response (which contains the error status)
+        return retry_state.response
+
+
+class AsyncEngine:
+    """
+    This class runs the (user, repo, endpoint) jobs of a Downloader with
+    asyncio. It uses the Downloader's configuration, output writer,
+    progress store and rate limit budget, so the outputs are the same as
+    the ones of the threaded engine. Planning and finishing an endpoint
+    (with the incremental merge and the bulk issue threads) and the GraphQL
+    queries are not request bound loops of their own, they run as they are
+    in a thread, so the event loop never waits for SQLite or the disk.
+    """
+
+    def __init__(self, downloader, max_in_flight=ASYNC_MAX_IN_FLIGHT):
+        self.downloader = downloader
+        self.config = downloader.config
+        self.max_in_flight = max_in_flight
+        self.client = None
+        # The write stage, one thread so the shard writer never appends twice at once
+        self.write_executor = None
+
+    def run(self, jobs):
+        asyncio.run(self.run_jobs(jobs))
+
+    async def run_jobs(self, jobs):
+        downloader = self.downloader
+        headers = {'Authorization': f'Bearer {self.config.get_tokens()[0]}'}
+        self.write_executor = ThreadPoolExecutor(max_workers=1)
+        repository_slots = asyncio.Semaphore(ASYNC_REPOSITORIES_IN_FLIGHT)
+        jobs_per_repo = {}
+        for job in order_jobs_fairly(jobs):
+            jobs_per_repo.setdefault((job[0], job[1]), []).append(job)
+
+        async def run_repository_jobs(repo_jobs):
+            async with repository_slots:
+                for job in repo_jobs:
+                    try:
+                        await self.download_endpoint(*job)
+                        logging.info(f"Finished job {job}")
+                    except Exception:
+                        logging.exception(f"Job {job} failed")
+
+        try:
+            async with AsyncGitHubClient(downloader.token_pool, downloader.retry_policy, downloader.metrics, headers, self.max_in_flight) as self.client:
+                await asyncio.gather(*(run_repository_jobs(repo_jobs) for repo_jobs in jobs_per_repo.values()))
+        finally:
+            self.write_executor.shutdown()
+
+    async def write(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.write_executor, function, *args)
+
+    # ------------------------------------------------------------
+    # Fetch
+    # ------------------------------------------------------------
+
+    async def spool_all_items(self, url, spool, timeout=REQUEST_TIMEOUT_SECONDS, issue_url=None):
+        """
+        Append every item of a paginated endpoint to 'spool' as json lines,
+        following the 'next' links, so only one page is held in memory.
+        With 'issue_url' the 'url' of every item (an event) is set to it,
+        like Downloader.get_issue_events. Raises DownloadError if a page
+        fails, like Downloader.get_all_items.
+        """
+        while url is not None:
+            r = await self.client.get(url, timeout=timeout)
+            if r is None or r.status_code != 200:
+                raise DownloadError(f"'{url}' got {get_failure_reason(r)}")
+            for item in r.json():
+                if issue_url is not None and 'url' in item:
+                    item['url'] = issue_url
+                spool.write(json.dumps(item) + "\n")
+            url = get_next_page_url(r)
+
+    async def spool_issue_items(self, api_url, spool, issue_url=None):
+        separator = "&" if "?" in api_url else "?"
+        await self.spool_all_items(f"{api_url}{separator}per_page={ISSUE_ITEMS_PER_PAGE}", spool, ISSUE_REQUEST_TIMEOUT_SECONDS, issue_url)
+
+    async def spool_issue_thread(self, each_issue, graphql_thread, thread):
+        """
+        Stream the comments and events of an issue into the two spool files
+        of 'thread', the ones already fetched with GraphQL are used as they
+        are, like Downloader.spool_issue_thread.
+        """
+        comments_url = each_issue.get('comments_url', None)
+        events_url = each_issue.get('events_url', None)
+        if comments_url is None or events_url is None:
+            return
+
+        comments_spool, events_spool = thread
+        comments, events = graphql_thread
+        fetches = []
+        if comments is None:
+            fetches.append(self.spool_issue_items(comments_url, comments_spool))
+        else:
+            comments_spool.writelines(json.dumps(comment) + "\n" for comment in comments)
+        if events is None:
+            fetches.append(self.spool_issue_items(events_url, events_spool, events_url.replace('/events', '')))
+        else:
+            events_spool.writelines(json.dumps(event) + "\n" for event in events)
+        await asyncio.gather(*fetches)
+
+    async def get_issue_threads(self, user, repo, issues_in_page):
+        """
+        Return the (comments, events) spool files of every issue of a page,
+        in the order of the issues. Raises DownloadError if any thread
+        could not be fetched in full, nothing is spooled then.
+        """
+        graphql_threads = {}
+        if self.config.graphql_issue_threads:
+            # The GraphQL client is the blocking one, with its own rate limit
+            graphql_threads = await asyncio.to_thread(self.downloader.graphql_issue_threads.get_threads, user, repo, issues_in_page)
+
+        threads = [(create_spool(), create_spool()) for _ in issues_in_page]
+        # Every fetch finishes before the spools are closed, even if one fails
+        results = await asyncio.gather(*(self.spool_issue_thread(each_issue, graphql_threads.get(each_issue.get('number'), (None, None)), thread)
+                                         for each_issue, thread in zip(issues_in_page, threads)), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        for thread in threads:
+            for spool in thread:
+                if errors:
+                    spool.close()
+                else:
+                    spool.seek(0)
+        if errors:
+            raise errors[0]
+        return threads
+
+    # ------------------------------------------------------------
+    # Download one endpoint of a repository
+    # ------------------------------------------------------------
+
+    async def download_page(self, user, repo, endpoint, category, current_page, resume_plan):
+        """
+        Fetch a page, then the threads of its issues, and write them.
+        Returns (downloaded, number of items), downloaded is None for a
+        permanent error.
+        """
+        downloader = self.downloader
+        url_by_page = downloader.get_github_urls(user, repo, endpoint, category) + f"&page={current_page}"
+        if current_page == 1 and resume_plan.first_page_response is not None:
+            # Page 1 is missing, so the probe was not conditional and is the page itself
+            r = resume_plan.first_page_response
+        else:
+            r = await self.client.get(url_by_page)
+        if r is None or r.status_code != 200:
+            # Error responses are never saved as pages
+            if is_permanent_error(r):
+                return None, None
+            logging.warning(f"Could not download '{url_by_page}' ({get_failure_reason(r)}), it is downloaded on the next run")
+            return False, None
+
+        if endpoint == 'issues' and not self.config.bulk_issue_threads:
+            # The issue threads are written first, so an issues page is
+            # only saved once all of its threads are
+            issues_in_page = parse_page(r.content, downloader.get_page_location(user, repo, endpoint, category, current_page))
+            if issues_in_page is not None:
+                try:
+                    with downloader.metrics.section("issue_threads"):
+                        threads = await self.get_issue_threads(user, repo, issues_in_page)
+                except DownloadError as e:
+                    logging.warning(f"Could not download the issue threads of '{url_by_page}' ({e}), it is downloaded on the next run")
+                    return False, None
+                await self.write(downloader.write_issue_threads, user, repo, current_page, threads, True)
+
+        page_items = await self.write(downloader.save_page, user, repo, endpoint, category, current_page, url_by_page, r)
+        number_of_items_per_page = None if page_items is None else len(page_items)
+        logging.info(f"Saved '{number_of_items_per_page}' items of page {current_page} of '{get_endpoint_name(endpoint, category)}' for {user}_{repo}")
+        return True, number_of_items_per_page
+
+    async def download_endpoint_pages(self, user, repo, endpoint, category, resume_plan):
+        """
+        Download the missing pages, up to ASYNC_PAGES_IN_FLIGHT at a time.
+        Pages finish in any order, but their progress is stored in page
+        order, and like in Downloader.download_endpoint_pages the stored
+        current page never moves past a page that failed. A permanent error
+        skips the pages after it.
+        """
+        downloader = self.downloader
+        missing_pages = resume_plan.missing_pages
+        last_page_number = resume_plan.last_page_number
+        name = get_endpoint_name(endpoint, category)
+        page_slots = asyncio.Semaphore(ASYNC_PAGES_IN_FLIGHT)
+        # Only one page at a time stores the progress of the finished pages
+        progress_lock = asyncio.Lock()
+        finished_pages = {}
+        failed_pages = []
+        next_index = 0
+        skipped = False
+
+        async def download_page(current_page):
+            nonlocal next_index, skipped
+            async with page_slots:
+                if skipped:
+                    finished_pages[current_page] = (False, None)
+                else:
+                    finished_pages[current_page] = await self.download_page(user, repo, endpoint, category, current_page, resume_plan)
+                    if finished_pages[current_page][0] is None:
+                        # The pages that did not start yet are skipped, like the break of the threads engine
+                        logging.warning(f"Skipping the rest of '{name}' for {user}_{repo}, page {current_page} got a permanent error")
+                        skipped = True
+
+            async with progress_lock:
+                while next_index < len(missing_pages) and missing_pages[next_index] in finished_pages:
+                    page = missing_pages[next_index]
+                    downloaded, number_of_items_per_page = finished_pages.pop(page)
+                    next_index += 1
+                    if not downloaded:
+                        failed_pages.append(page)
+                        continue
+                    # Still missing: the failed pages and the next pages of the plan
+                    saved_page_number = get_contiguous_page_number(failed_pages[:1] + missing_pages[next_index:next_index + 1], last_page_number)
+                    await self.write(downloader.update_verification_data, f"{user}_{repo}", endpoint, category, saved_page_number, last_page_number, number_of_items_per_page)
+                    downloader.report_progress(f"{user}_{repo}", name, page, last_page_number, number_of_items_per_page)
+
+        await asyncio.gather(*(download_page(current_page) for current_page in missing_pages))
+
+    async def download_endpoint(self, user, repo, github_endpoint):
+        """
+        The asyncio counterpart of Downloader.download_endpoint. Planning and
+        finishing the endpoint (SQLite, page listings, the incremental merge
+        and the bulk issue threads) run as they are in a thread, only the
+        missing pages are downloaded with asyncio.
+        """
+        downloader = self.downloader
+        endpoint, category = check_github_endpoints(github_endpoint)
+        resume_plan = await asyncio.to_thread(downloader.plan_endpoint, user, repo, endpoint, category)
+        if resume_plan is None:
+            return
+        if not resume_plan.is_complete():
+            await self.download_endpoint_pages(user, repo, endpoint, category, resume_plan)
+        await asyncio.to_thread(downloader.finish_endpoint, user, repo, endpoint, category)
@@ -0,0 +1,125 @@
+import argparse
+import logging
+
+from .config import DownloaderConfig, CONFIG_FILE, GITHUB_INPUT_URL, LOG_FILE, VERIFICATION_JSON, MAX_ISSUE_WORKERS, ENGINES, ASYNC_MAX_IN_FLIGHT, QUEUE_PRIORITIES
+from .endpoints import GITHUB_MAIN_ENDPOINTS
+from .output_writer import OUTPUT_FORMATS, DATA_DIRECTORY
+from .progress_store import PROGRESS_DATABASE
+from .repository_validator import REPOSITORY_CACHE
+from .scheduler import MAX_REPO_WORKERS
+from .work_queue import WORK_QUEUE_DATABASE
+
+# ------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------
+#   python -m github_downloader                      every repository of config/github_urls.csv
+#   python -m github_downloader --repos user/repo --endpoints issues pulls --output-format jsonl.gz
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(prog="python -m github_downloader",
+                                     description="Download the issues, pulls, commits and comments of GitHub repositories.")
+    parser.add_argument("--repos", nargs="+", metavar="USER/REPO",
+                        help="repositories to download, instead of the ones of --input-file")
+    parser.add_argument("--input-file", default=GITHUB_INPUT_URL,
+                        help=f"csv file with one repository url per row (default: {GITHUB_INPUT_URL})")
+    parser.add_argument("--endpoints", nargs="+", choices=GITHUB_MAIN_ENDPOINTS, default=GITHUB_MAIN_ENDPOINTS,
+                        help="endpoints to download (default: all)")
+    parser.add_argument("--repo-workers", type=int, default=MAX_REPO_WORKERS,
+                        help=f"worker processes, each downloads one endpoint of a repository (default: {MAX_REPO_WORKERS})")
+    parser.add_argument("--issue-workers", type=int, default=MAX_ISSUE_WORKERS,
+                        help=f"threads fetching the comments and events of the issues of a page (default: {MAX_ISSUE_WORKERS})")
+    parser.add_argument("--engine", choices=ENGINES, default="threads",
+                        help="worker processes and threads, or one asyncio process with many requests in flight "
+                             "(needs httpx, --repo-workers and --issue-workers are not used) (default: threads)")
+    parser.add_argument("--max-in-flight", type=int, default=ASYNC_MAX_IN_FLIGHT,
+                        help=f"requests in flight at the same time with --engine async (default: {ASYNC_MAX_IN_FLIGHT})")
+    parser.add_argument("--work-queue", nargs="?", const=WORK_QUEUE_DATABASE, metavar="FILE",
+                        help="download through a persistent work queue of page and issue tasks: a restart resumes at "
+                             f"the tasks that were not done, --repo-workers processes drain it together (default FILE: {WORK_QUEUE_DATABASE})")
+    parser.add_argument("--queue-priority", choices=QUEUE_PRIORITIES, default="newest-first",
+                        help="order of the pages of the work queue (default: newest-first)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="json",
+                        help="pretty json page files, compressed JSON Lines shards or 'dedup', every item stored once "
+                             "in an object store and pages of references (default: json)")
+    parser.add_argument("--data-directory", default=DATA_DIRECTORY, help=f"(default: {DATA_DIRECTORY})")
+    parser.add_argument("--credentials-file", default=CONFIG_FILE, help=f"(default: {CONFIG_FILE})")
+    parser.add_argument("--progress-database", default=PROGRESS_DATABASE, help=f"(default: {PROGRESS_DATABASE})")
+    parser.add_argument("--verification-json", default=VERIFICATION_JSON, help=f"(default: {VERIFICATION_JSON})")
+    parser.add_argument("--repository-cache", default=REPOSITORY_CACHE,
+                        help=f"result of the checks of the repositories of --input-file (default: {REPOSITORY_CACHE})")
+    parser.add_argument("--log-file", default=LOG_FILE, help=f"(default: {LOG_FILE})")
+    parser.add_argument("--api-url", help="GitHub API url (default: $GITHUB_API_URL or https://api.github.com)")
+    parser.add_argument("--bulk-issue-threads", action="store_true",
+                        help="fetch the issue comments and events with the repository-wide endpoints")
+    parser.add_argument("--graphql", action="store_true",
+                        help="fetch the issue comments with GraphQL, 100 issues per query (the issues and events still use REST)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch the issues and pulls updated since the last complete download")
+    parser.add_argument("--index-database", metavar="FILE",
+                        help="update this SQLite index of the downloaded items at the end of the run "
+                             "(query it with 'python -m github_downloader.local_index query')")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help="write request latencies, retries, rate limit waits and items per second to FILE "
+                             "at the end of the run, a Prometheus textfile if it ends with '.prom', otherwise json")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="dump cProfile stats of the run to FILE (read them with 'python -m pstats FILE')")
+    return parser
+
+
+def print_progress(user_repo_key, name, current_page, last_page_number, number_of_items):
+    print(f"{user_repo_key} {name}: {current_page} {last_page_number} {number_of_items}")
+
+
+def main(argv=None):
+    args = get_argument_parser().parse_args(argv)
+
+    # Create a custom logger
+    logging.basicConfig(filename=args.log_file, encoding='utf-8',
+                        level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    # The library only logs, its warnings (retries, rate limit waits, failed
+    # jobs) are shown on the console as well
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.WARNING)
+    console_handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(console_handler)
+    logging.info("------------------------------------NEW RUN------------------------------------")
+
+    config = DownloaderConfig(
+        credentials_file=args.credentials_file,
+        input_file=args.input_file,
+        data_directory=args.data_directory,
+        output_format=args.output_format,
+        progress_database=args.progress_database,
+        verification_json=args.verification_json,
+        repository_cache=args.repository_cache,
+        api_url=args.api_url,
+        endpoints=args.endpoints,
+        repo_workers=args.repo_workers,
+        issue_workers=args.issue_workers,
+        bulk_issue_threads=args.bulk_issue_threads,
+        graphql_issue_threads=args.graphql,
+        incremental_sync=args.incremental,
+        metrics_file=args.metrics_file,
+        profile_file=args.profile,
+        index_database=args.index_database,
+        engine=args.engine,
+        max_in_flight=args.max_in_flight,
+        work_queue=args.work_queue,
+        queue_priority=args.queue_priority,
+    )
+
+    # Only imported now, so '--help' and bad arguments do not load requests
+    from .downloader import Downloader
+    downloader = Downloader(config, progress_callback=print_progress)
+    # check if the token is valid
+    if not downloader.start():
+        print("Please check the token and try again.")
+
+    downloader.sync_all(args.repos)
+    downloader.close()
+
+    print("DONE")
+    logging.info("------------------------------------END------------------------------------")
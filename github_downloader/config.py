@@ -0,0 +1,127 @@
+import json
+import os
+
+from .endpoints import GITHUB_MAIN_ENDPOINTS
+from .output_writer import DATA_DIRECTORY
+from .progress_store import PROGRESS_DATABASE
+from .repository_validator import REPOSITORY_CACHE
+from .scheduler import MAX_REPO_WORKERS
+
+# ------------------------------------------------------------
+# DOWNLOADER CONFIGURATION
+# ------------------------------------------------------------
+# The defaults are the original layout, relative to the working directory
+CONFIG_FILE = "./config/credentials.json"  # this file has GITHUB TOKEN
+GITHUB_INPUT_URL = "./config/github_urls.csv"
+LOG_FILE = "./config/project.log"
+# Verification file of older versions, its progress is imported into
+# the progress store on the first run and it is rewritten at the end
+# of every run as a readable copy of the progress
+VERIFICATION_JSON = "./verification.json"
+
+# Both can be pointed at another server, e.g. benchmarks/mock_github.py
+GITHUB_BASE_URL = "https://api.github.com"
+# Host of the repository urls in GITHUB_INPUT_URL
+GITHUB_WEB_HOST = "github.com"
+
+# Number of issues whose comments/events are fetched at the same time
+MAX_ISSUE_WORKERS = 8
+INCREMENTAL_SYNC_ENDPOINTS = ["issues", "pulls"]
+ENGINES = ["threads", "async"]
+# Order of the page tasks of the work queue, see work_queue.get_page_priority
+QUEUE_PRIORITIES = ["newest-first", "oldest-first", "small-endpoints-first"]
+# Requests in flight at the same time with the "async" engine
+ASYNC_MAX_IN_FLIGHT = 256
+
+
+def read_tokens(credentials_file=CONFIG_FILE):
+    """
+    Return the tokens of a credentials file, "Bearer" holds one token or a
+    list of tokens.
+    """
+    with open(credentials_file, 'r') as json_file:
+        json_auth_data = json.load(json_file)
+
+    tokens = json_auth_data["github_auth"]["Bearer"]
+    if isinstance(tokens, str):
+        tokens = [tokens]
+    return tokens
+
+
+class DownloaderConfig:
+    """
+    This class holds the settings of a Downloader. Nothing is read until the
+    Downloader needs it, the tokens come from 'credentials_file' unless they
+    are given.
+
+    output_format         one of OUTPUT_FORMATS ("json", "jsonl.gz", "jsonl.zst")
+    repo_workers          worker processes, each downloads one endpoint of a repository
+    issue_workers         threads fetching the comments/events of the issues of a page
+    bulk_issue_threads    use '/issues/comments' and '/issues/events' (100 items of any
+                          issue per request) instead of two requests per issue
+    graphql_issue_threads fetch the comments of the issues of a page with one GraphQL query,
+                          only threads longer than one GraphQL page use REST. The issues
+                          pages and the events always use REST (a known limit: at most half
+                          of the per-issue requests are saved)
+    incremental_sync      once an endpoint is fully downloaded, later runs only ask for
+                          the items updated after the high-water mark (max 'updated_at')
+                          and merge them into the saved pages
+    repository_cache      json file with the result of the repository checks of the input
+                          file, None checks every repository on every run
+    metrics_file          write the request latencies, retries, rate limit waits and items per
+                          second there at the end of a run, a Prometheus textfile if it ends with
+                          '.prom', otherwise json. None (the default) records nothing
+    profile_file          dump cProfile stats of the run there, worker processes write one
+                          file per job next to it
+    index_database        update this SQLite index of the downloaded items (see local_index)
+                          at the end of every run, None (the default) does not index
+    engine                "threads" (worker processes and threads, the default) or "async",
+                          one process that keeps up to 'max_in_flight' requests in flight
+                          with asyncio (needs httpx, 'repo_workers' and 'issue_workers' are
+                          not used)
+    work_queue            SQLite file of a persistent work queue (see work_queue): pages and
+                          issue threads are tasks that finish in any order, a restart resumes
+                          at the task it stopped at and 'repo_workers' processes drain the
+                          queue together. None (the default) downloads job by job
+    queue_priority        order of the page tasks of the work queue, one of QUEUE_PRIORITIES
+    """
+
+    def __init__(self, tokens=None, credentials_file=CONFIG_FILE, input_file=GITHUB_INPUT_URL,
+                 data_directory=DATA_DIRECTORY, output_format="json", progress_database=PROGRESS_DATABASE,
+                 verification_json=VERIFICATION_JSON, repository_cache=REPOSITORY_CACHE, api_url=None, web_host=None,
+                 endpoints=GITHUB_MAIN_ENDPOINTS, repo_workers=MAX_REPO_WORKERS, issue_workers=MAX_ISSUE_WORKERS,
+                 http_pool_size=None, bulk_issue_threads=False, graphql_issue_threads=False, incremental_sync=False,
+                 incremental_sync_endpoints=INCREMENTAL_SYNC_ENDPOINTS, metrics_file=None, profile_file=None,
+                 index_database=None, engine="threads", max_in_flight=ASYNC_MAX_IN_FLIGHT,
+                 work_queue=None, queue_priority="newest-first"):
+        self.tokens = [tokens] if isinstance(tokens, str) else tokens
+        self.credentials_file = credentials_file
+        self.input_file = input_file
+        self.data_directory = data_directory
+        self.output_format = output_format
+        self.progress_database = progress_database
+        self.verification_json = verification_json
+        self.repository_cache = repository_cache
+        self.api_url = api_url or os.environ.get("GITHUB_API_URL", GITHUB_BASE_URL)
+        self.web_host = web_host or os.environ.get("GITHUB_WEB_HOST", GITHUB_WEB_HOST)
+        self.endpoints = list(endpoints)
+        self.repo_workers = repo_workers
+        self.issue_workers = issue_workers
+        # None uses HTTP_POOL_SIZE
+        self.http_pool_size = http_pool_size
+        self.bulk_issue_threads = bulk_issue_threads
+        self.graphql_issue_threads = graphql_issue_threads
+        self.incremental_sync = incremental_sync
+        self.incremental_sync_endpoints = list(incremental_sync_endpoints)
+        self.metrics_file = metrics_file
+        self.profile_file = profile_file
+        self.index_database = index_database
+        self.engine = engine
+        self.max_in_flight = max_in_flight
+        self.work_queue = work_queue
+        self.queue_priority = queue_priority
+
+    def get_tokens(self):
+        if self.tokens is None:
+            self.tokens = read_tokens(self.credentials_file)
+        return self.tokens
@@ -0,0 +1,1183 @@
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+
+from .config import DownloaderConfig
+from .endpoints import check_github_endpoints, get_endpoint_name, get_jobs, parse_repository, GITHUB_MAIN_ENDPOINTS
+from .graphql_engine import GraphQLIssueThreads
+from .http_client import DownloadError, GitHubClient, create_session, HTTP_POOL_SIZE, REQUEST_TIMEOUT_SECONDS
+from .local_index import LocalIndex
+from .metrics import Metrics, profile
+from .output_writer import create_output_writer, parse_page, get_page_location as get_output_page_location
+from .progress_store import ProgressStore
+from .rate_limit import TokenPool
+from .repository_validator import RepositoryCache, RepositoryValidator, read_repository_urls
+from .resume_planner import ResumePlan, ResumePlanner, get_contiguous_page_number
+from .retry_policy import RetryPolicy, classify_response, is_permanent_error, SUCCESS
+from .scheduler import run_jobs, run_workers
+from .validator_cache import load_validators, get_conditional_headers, save_validators, get_validator_location
+from .work_queue import (WorkQueue, get_page_priority, get_worker_id, read_result_file, remove_result_files,
+                         ENDPOINT_TASK, PAGE_TASK, ISSUE_TASK, QUEUE_POLL_SECONDS)
+
+# Items per page of the per-issue comments and events (GitHub's default is 30)
+ISSUE_ITEMS_PER_PAGE = 100
+ISSUE_REQUEST_TIMEOUT_SECONDS = 30
+# Bytes of a spooled issue thread kept in memory before it moves to disk
+ISSUE_SPOOL_MAX_BYTES = 64 * 1024
+# Number of items kept in memory per page before they are spooled to disk
+BULK_SPOOL_BATCH_SIZE = 500
+# Items per page of the endpoints and of the incremental sync
+ITEMS_PER_PAGE = 100
+
+# The Downloader of the worker processes, they are forked from the process
+# that set it so it does not have to be pickled
+WORKER_DOWNLOADER = None
+
+
+def download_endpoint_in_worker(user, repo, github_endpoint):
+    """
+    Run a job in a worker process and return the metrics it collected, the
+    main process adds them to its own.
+    """
+    profile_file = WORKER_DOWNLOADER.config.profile_file
+    with profile(profile_file and f"{profile_file}.{user}_{repo}_{github_endpoint}"):
+        WORKER_DOWNLOADER.download_endpoint(user, repo, github_endpoint)
+    return WORKER_DOWNLOADER.metrics.pop_snapshot()
+
+
+def drain_work_queue_in_worker():
+    profile_file = WORKER_DOWNLOADER.config.profile_file
+    with profile(profile_file and f"{profile_file}.{os.getpid()}"):
+        WORKER_DOWNLOADER.drain_work_queue()
+    return WORKER_DOWNLOADER.metrics.pop_snapshot()
+
+
+# Get the last page number from the response
+def get_last_page_num(response):
+    link_header = response.headers.get("Link")
+    logging.debug(f"Link header of '{response.url}': {link_header}")
+    if link_header:
+        # Split the "Link" header into individual links
+        links = link_header.split(',')
+        for link in links:
+            if 'rel="last"' in link:
+                # Extract the page number from the link
+                return int(link.split("page=")[-1].split(">")[0])
+    return 1
+
+
+# Get the url of the next page from the response, None on the last page
+def get_next_page_url(response):
+    link_header = response.headers.get("Link")
+    if link_header:
+        for link in link_header.split(','):
+            if 'rel="next"' in link:
+                return link.split(";")[0].strip().strip("<>")
+    return None
+
+
+# Describe a failed response for the log
+def get_failure_reason(response):
+    return "no response" if response is None else f"status {response.status_code}"
+
+
+# Headers of a page response that save_page reads
+STORED_PAGE_HEADERS = ('ETag', 'Last-Modified', 'Link')
+
+
+class StoredResponse:
+    """
+    This class is a page response kept in a result file of the work queue,
+    with what save_page reads from a response.
+    """
+
+    def __init__(self, stored_page):
+        self.url = stored_page['url']
+        self.headers = stored_page['headers']
+        # Any byte survives the round trip, the body is saved as it arrived
+        self.content = stored_page['body'].encode('utf-8', 'surrogateescape')
+
+
+def get_stored_page(url, response):
+    return {
+        'url': url,
+        'headers': {header: response.headers[header] for header in STORED_PAGE_HEADERS if header in response.headers},
+        'body': response.content.decode('utf-8', 'surrogateescape'),
+    }
+
+
+def create_spool():
+    return tempfile.SpooledTemporaryFile(max_size=ISSUE_SPOOL_MAX_BYTES, mode='w+')
+
+
+def spool_items(items):
+    spool = create_spool()
+    for item in items:
+        spool.write(json.dumps(item) + "\n")
+    spool.seek(0)
+    return spool
+
+
+def spool_items_by_page(items, issue_url_page, get_issue_url, spool_directory, name):
+    """
+    This function appends every item as a json line to the spool file of the
+    issues page its issue belongs to, so only a few items are held in memory.
+    """
+    buffers = {}
+    skipped = 0
+
+    def flush(page):
+        with open(os.path.join(spool_directory, f"{name}_{page}.jsonl"), 'a') as spool_file:
+            for item in buffers.pop(page):
+                spool_file.write(json.dumps(item) + "\n")
+
+    for item in items:
+        page = issue_url_page.get(get_issue_url(item))
+        if page is None:
+            skipped += 1
+            continue
+        buffers.setdefault(page, []).append(item)
+        if len(buffers[page]) >= BULK_SPOOL_BATCH_SIZE:
+            flush(page)
+    for page in list(buffers):
+        flush(page)
+
+    if skipped:
+        logging.info(f"Skipped {skipped} '{name}' items of issues that are not in the downloaded pages")
+
+
+def read_spooled_page(spool_directory, name, page, issue_urls, get_issue_url):
+    """
+    This function returns the spooled items of a page grouped in the order of
+    the issues, every issue thread sorted by id like the per-issue endpoints.
+    """
+    items_by_issue = {}
+    spool_location = os.path.join(spool_directory, f"{name}_{page}.jsonl")
+    if os.path.exists(spool_location):
+        with open(spool_location, 'r') as spool_file:
+            for line in spool_file:
+                item = json.loads(line)
+                items_by_issue.setdefault(get_issue_url(item), []).append(item)
+
+    page_items = []
+    for issue_url in issue_urls:
+        page_items.extend(sorted(items_by_issue.get(issue_url, []), key=lambda item: item['id']))
+    return page_items
+
+
+def get_bulk_event_issue_url(event):
+    return event['url']
+
+
+def get_bulk_comment_issue_url(comment):
+    return comment.get('issue_url')
+
+
+class Downloader:
+    """
+    This class downloads the issues, pulls, commits and comments of GitHub
+    repositories into the output directory of its DownloaderConfig.
+    Nothing is read or requested until a download starts: the session,
+    token pool, output writer and progress store are created on first use.
+
+    Every saved page is reported to the progress callbacks as
+    'callback(repo_key, name, current_page, last_page_number, number_of_items)',
+    in the process that saved it (a worker process with 'repo_workers' > 1).
+    """
+
+    def __init__(self, config=None, progress_callback=None):
+        self.config = config or DownloaderConfig()
+        self.progress_callbacks = [] if progress_callback is None else [progress_callback]
+        self.started = False
+        self.token_valid = None
+
+    def add_progress_callback(self, progress_callback):
+        self.progress_callbacks.append(progress_callback)
+
+    def report_progress(self, user_repo_key, name, current_page, last_page_number, number_of_items):
+        self.metrics.add("items", name, number_of_items or 0)
+        for progress_callback in self.progress_callbacks:
+            progress_callback(user_repo_key, name, current_page, last_page_number, number_of_items)
+
+    def record_bytes_written(self, user, repo, name, current_page):
+        # Bytes of the page in the output, as the writer stores it
+        if self.metrics.enabled:
+            self.metrics.add("bytes_written", name, self.output_writer.get_page_size(user, repo, name, current_page) or 0)
+
+    # ------------------------------------------------------------
+    # Shared objects, created on first use
+    # ------------------------------------------------------------
+
+    @cached_property
+    def session(self):
+        # One pooled session (keep-alive, gzip) for every request sent to GitHub
+        tokens = self.config.get_tokens()
+        github_headers = {'Authorization': f'Bearer {tokens[0]}'}
+        return create_session(github_headers, self.config.http_pool_size or HTTP_POOL_SIZE)
+
+    @cached_property
+    def metrics(self):
+        # Disabled unless the metrics are written somewhere
+        return Metrics(enabled=self.config.metrics_file is not None)
+
+    @cached_property
+    def retry_policy(self):
+        # Shared by the REST and GraphQL clients, so both see the open circuits
+        return RetryPolicy()
+
+    @cached_property
+    def token_pool(self):
+        # One rate limit budget per token, requests use the token with the most calls left
+        return TokenPool(self.config.get_tokens(), f"{self.config.api_url}/rate_limit", self.session)
+
+    @cached_property
+    def client(self):
+        # Every fetch goes through this client, it handles the tokens and the retries
+        return GitHubClient(self.session, self.token_pool, self.retry_policy, self.metrics)
+
+    @cached_property
+    def graphql_token_pool(self):
+        # GraphQL has its own (cost based) rate limit per token
+        return TokenPool(self.config.get_tokens(), f"{self.config.api_url}/rate_limit", self.session, category="graphql")
+
+    @cached_property
+    def graphql_client(self):
+        return GitHubClient(self.session, self.graphql_token_pool, self.retry_policy, self.metrics)
+
+    @cached_property
+    def graphql_issue_threads(self):
+        return GraphQLIssueThreads(self.graphql_client, f"{self.config.api_url}/graphql", self.config.api_url)
+
+    @cached_property
+    def repository_validator(self):
+        return RepositoryValidator(self.client, self.graphql_client, self.config.api_url, self.config.web_host,
+                                   RepositoryCache(self.config.repository_cache))
+
+    @cached_property
+    def output_writer(self):
+        return create_output_writer(self.config.output_format, self.config.data_directory)
+
+    @cached_property
+    def progress_store(self):
+        # Progress store to keep track of the data downloaded
+        # tracking with last page number and current page number
+        is_new_progress_store = not os.path.exists(self.config.progress_database)
+        progress_store = ProgressStore(self.config.progress_database)
+        if is_new_progress_store and os.path.exists(self.config.verification_json):
+            progress_store.import_verification_json(self.config.verification_json)
+        return progress_store
+
+    @cached_property
+    def local_index(self):
+        return LocalIndex(self.config.index_database, self.output_writer, self.config.data_directory)
+
+    @cached_property
+    def resume_planner(self):
+        return ResumePlanner(self.output_writer, self.progress_store)
+
+    @cached_property
+    def work_queue(self):
+        return WorkQueue(self.config.work_queue)
+
+    # ------------------------------------------------------------
+    # Check for valid GITHUB TOKEN
+    # ------------------------------------------------------------
+
+    def check_token_validity(self):
+        valid = False
+        for budget in self.token_pool.budgets:
+            response = self.client.get(f'{self.config.api_url}/user', headers=budget.headers, use_budget=False, max_retries=1)
+            if response is not None and response.status_code == 200:
+                user_info = response.json()
+                logging.info(f"Authenticated user: {user_info.get('login')}")
+                valid = True
+            else:
+                logging.warning("Token is invalid or unauthorized. Please check and try again.")
+        return valid
+
+    def start(self):
+        """
+        Check the tokens and read the rate limit of every token, once.
+        Returns False if no token is valid.
+        """
+        if self.started:
+            return self.token_valid
+        self.token_valid = self.check_token_validity()
+        # The only '/rate_limit' call, later calls read the response headers
+        logging.info(self.token_pool.refresh())
+        if self.config.graphql_issue_threads:
+            logging.info(self.graphql_token_pool.refresh())
+        self.started = True
+        return self.token_valid
+
+    # ------------------------------------------------------------
+    # OS RELATED FUNCTIONS
+    # ------------------------------------------------------------
+
+    # Create a directory for each repository
+    def create_directory(self, github_username, github_repository, endpoint):
+        directory_name = f"{self.config.data_directory}/{github_username}_{github_repository}/{endpoint}"
+        if not os.path.exists(directory_name):
+            os.makedirs(directory_name)
+            logging.info(f"Created directory: '{directory_name}'")
+        else:
+            logging.info(f"Directory already exists: '{directory_name}'")
+
+    # ------------------------------------------------------------
+    # Get the github urls
+    # ------------------------------------------------------------
+
+    def get_github_urls(self, github_username, github_repository, endpoint, category):
+        if category == "None":
+            url = f"{self.config.api_url}/repos/{github_username}/{github_repository}/{endpoint}?state=all&per_page={ITEMS_PER_PAGE}"
+        else:
+            url = f"{self.config.api_url}/repos/{github_username}/{github_repository}/{endpoint}/{category}?per_page={ITEMS_PER_PAGE}"
+        return url
+
+    # Get the location of a page file, with the "json" output format
+    # (the validators of a page are stored next to it in every format)
+    def get_page_location(self, github_username, github_repository, endpoint, category, current_page):
+        return get_output_page_location(self.config.data_directory, github_username, github_repository, get_endpoint_name(endpoint, category), current_page)
+
+    # Check if a page is saved, in any output format
+    def is_page_saved(self, github_username, github_repository, endpoint, category, current_page):
+        return self.output_writer.page_exists(github_username, github_repository, get_endpoint_name(endpoint, category), current_page)
+
+    # ------------------------------------------------------------
+    # Get the github api request
+    # ------------------------------------------------------------
+
+    def get_github_api_request(self, url, headers=None, timeout=REQUEST_TIMEOUT_SECONDS):
+        return self.client.get(url, timeout=timeout, headers=headers)
+
+    def get_github_page_request(self, url, location, page_saved):
+        """
+        This function sends a conditional request for a page that may already
+        be saved at 'location'. It returns the response (200 or 304) and the
+        stored validators of the page.
+        """
+        validators = load_validators(url, location, page_saved)
+        return self.get_github_api_request(url, headers=get_conditional_headers(validators)), validators
+
+    def get_first_page_request(self, github_username, github_repository, endpoint, category):
+        """
+        This function sends the (conditional) request of page 1 and returns
+        the response with the last page number of the endpoint.
+        """
+        url = self.get_github_urls(github_username, github_repository, endpoint, category) + "&page=1"
+        location = self.get_page_location(github_username, github_repository, endpoint, category, 1)
+        page_saved = self.is_page_saved(github_username, github_repository, endpoint, category, 1)
+        r, validators = self.get_github_page_request(url, location, page_saved)
+        if r is None or r.status_code != 304 or r.headers.get("Link") is not None:
+            return r, None if r is None else get_last_page_num(r)
+
+        # A 304 without a 'Link' header: a page 1 that was not full was the only
+        # page. A full one may have been followed by new pages since, while
+        # page 1 stayed the same, so it is requested again
+        number_of_items = validators.get('items')
+        if number_of_items is not None and number_of_items < ITEMS_PER_PAGE:
+            return r, validators.get('last_page_number') or 1
+        r = self.get_github_api_request(url)
+        return r, None if r is None else get_last_page_num(r)
+
+    def get_all_items(self, url, timeout=REQUEST_TIMEOUT_SECONDS):
+        """
+        This function yields every item of a paginated endpoint, following the
+        'next' links of the responses. Only one page is held in memory.
+        Raises DownloadError if a page fails, so a partial list is never saved.
+        """
+        while url is not None:
+            r = self.get_github_api_request(url, timeout=timeout)
+            if r is None or r.status_code != 200:
+                raise DownloadError(f"'{url}' got {get_failure_reason(r)}")
+            for item in r.json():
+                yield item
+            url = get_next_page_url(r)
+
+    # ------------------------------------------------------------
+    # Repositories of the input file
+    # ------------------------------------------------------------
+
+    def get_verified_and_non_verified_lists(self):
+        # Parsed and deduplicated locally, only the repositories missing from
+        # the repository cache are checked, in batches
+        return self.repository_validator.validate(read_repository_urls(self.config.input_file))
+
+    def check_if_file_exists(self, github_username, github_repository, current_page, last_page_number, endpoint, category):
+        # One listing of the saved pages instead of one check per page
+        missing_pages = self.resume_planner.get_missing_pages(github_username, github_repository, get_endpoint_name(endpoint, category), last_page_number, current_page)
+        if missing_pages:
+            logging.info(f"The page does not exist: '{self.get_page_location(github_username, github_repository, endpoint, category, missing_pages[0])}'")
+            return missing_pages[0]
+        return 0
+
+    # ------------------------------------------------------------
+    # -------------Get the verifiation values---------------------
+    # ------------------------------------------------------------
+
+    def get_verification_data_values(self, user_repo_key, endpoint, category, sub_category):
+        if category == "None":
+            return self.progress_store.get(user_repo_key, f"{endpoint}")
+        return self.progress_store.get(user_repo_key, f"{endpoint}_{category}")
+
+    # update the progress store with the default values of every endpoint
+    def update_verification_file_with_default_values(self, github_username, github_repository):
+        keys = []
+        for github_endpoint in GITHUB_MAIN_ENDPOINTS:
+            endpoint, category = check_github_endpoints(github_endpoint)
+            key = get_endpoint_name(endpoint, category)
+            keys.extend([key, f"{key}_last_page_number", f"{key}_curr_page_number"])
+
+        self.progress_store.set_defaults(f"{github_username}_{github_repository}", keys)
+
+    def update_verification_data(self, user_repo_key, temp_endpoint, temp_category, current_page, last_page_number, number_of_items_per_page):
+        if number_of_items_per_page is None:
+            number_of_items_per_page = 0
+
+        key = get_endpoint_name(temp_endpoint, temp_category)
+        with self.metrics.section("update_progress"):
+            self.progress_store.update_page_progress(user_repo_key, key, current_page, last_page_number, number_of_items_per_page)
+
+    def update_verification_value(self, user_repo_key, key, value):
+        self.progress_store.set(user_repo_key, key, value)
+
+    def prepare_repository(self, github_username, github_repository):
+        """
+        Create the directories of a repository and add it to the progress store.
+        """
+        is_known_repository = self.progress_store.has_repository(f"{github_username}_{github_repository}")
+        for github_endpoint in GITHUB_MAIN_ENDPOINTS:
+            self.create_directory(github_username, github_repository, github_endpoint)
+        self.update_verification_file_with_default_values(github_username, github_repository)
+
+        if is_known_repository:
+            logging.info(f"'{github_username}_{github_repository}' already exists in the PROGRESS STORE")
+        else:
+            logging.info(f"Added '{github_username}_{github_repository}' to the PROGRESS STORE")
+
+    # ------------------------------------------------------------
+    # Fetch the comments and events of an issue
+    # ------------------------------------------------------------
+
+    def get_issue_items(self, api_url):
+        """
+        This function yields every comment or event of an issue, page by page.
+        """
+        separator = "&" if "?" in api_url else "?"
+        yield from self.get_all_items(f"{api_url}{separator}per_page={ISSUE_ITEMS_PER_PAGE}", timeout=ISSUE_REQUEST_TIMEOUT_SECONDS)
+
+    def get_issue_events(self, issue_events_url, issue_url):
+        # Update the 'url' key in each event with the provided issue_url
+        for event in self.get_issue_items(issue_events_url):
+            if 'url' in event:
+                event['url'] = issue_url
+            yield event
+
+    def getCommentsByUrl(self, comments_url, comment_params=None):
+        logging.info(f"Fetching comments from URL: {comments_url}")
+        return list(self.get_issue_items(comments_url))
+
+    def getIssueEventsByUrl(self, issue_events_url, issue_url, issue_events_params=None):
+        logging.info(f"Fetching issue events from URL: {issue_events_url}")
+        return list(self.get_issue_events(issue_events_url, issue_url))
+
+    def getReqInfoPerIssue(self, comments_url, issue_events_url):
+        full_comments = self.getCommentsByUrl(comments_url)
+        issue_events = self.getIssueEventsByUrl(issue_events_url, issue_events_url.replace('/events', ''))
+        return full_comments, issue_events
+
+    # ------------------------------------------------------------
+    # Fetch the comments and events of a page of issues concurrently
+    # ------------------------------------------------------------
+
+    def get_req_info_per_issue_or_empty(self, each_issue):
+        comments_url = each_issue.get('comments_url', None)
+        events_url = each_issue.get('events_url', None)
+
+        # Only call getReqInfoPerIssue if both URLs are present
+        if comments_url is None or events_url is None:
+            return [], []
+        return self.getReqInfoPerIssue(comments_url, events_url)
+
+    def get_req_info_for_issues(self, issues_in_page):
+        """
+        This function fetches the comments and events of every issue in a page
+        with a bounded pool of threads. Every worker waits on the shared token
+        pool, and the results come back in the order of the issues so the
+        page files are always written in the same order.
+        """
+        if self.config.issue_workers <= 1:
+            return [self.get_req_info_per_issue_or_empty(each_issue) for each_issue in issues_in_page]
+
+        with ThreadPoolExecutor(max_workers=self.config.issue_workers) as executor:
+            return list(executor.map(self.get_req_info_per_issue_or_empty, issues_in_page))
+
+    def spool_issue_thread(self, each_issue, graphql_thread=(None, None)):
+        """
+        This function streams the comments and events of an issue into two
+        spool files (in memory while they are small), so a huge thread never
+        has to fit in memory. The comments or events already fetched with
+        GraphQL are used as they are, the others are fetched with REST.
+        """
+        comments_url = each_issue.get('comments_url', None)
+        events_url = each_issue.get('events_url', None)
+        if comments_url is None or events_url is None:
+            return spool_items([]), spool_items([])
+
+        comments, events = graphql_thread
+        if comments is None or events is None:
+            logging.info(f"Fetching comments and events of: {each_issue.get('url')}")
+        if comments is None:
+            comments = self.get_issue_items(comments_url)
+        if events is None:
+            events = self.get_issue_events(events_url, events_url.replace('/events', ''))
+        return spool_items(comments), spool_items(events)
+
+    def get_issue_threads(self, user, repo, issues_in_page):
+        """
+        This function fetches the comments and events of every issue in a page
+        with a bounded pool of threads (the comments with GraphQL first with
+        'graphql_issue_threads') and returns their spool files, in the order
+        of the issues.
+        """
+        graphql_threads = {}
+        if self.config.graphql_issue_threads:
+            graphql_threads = self.graphql_issue_threads.get_threads(user, repo, issues_in_page)
+        graphql_thread_per_issue = [graphql_threads.get(each_issue.get('number'), (None, None)) for each_issue in issues_in_page]
+
+        if self.config.issue_workers <= 1:
+            threads = list(map(self.spool_issue_thread, issues_in_page, graphql_thread_per_issue))
+        else:
+            with ThreadPoolExecutor(max_workers=self.config.issue_workers) as executor:
+                threads = list(executor.map(self.spool_issue_thread, issues_in_page, graphql_thread_per_issue))
+        return threads
+
+    def save_issue_threads(self, user, repo, current_page, issues_in_page):
+        """
+        This function streams the comments and events of every issue in a page,
+        in the order of the issues, into the 'issues_comments' and
+        'issues_events' pages. It returns the number of comments and events.
+        """
+        threads = self.get_issue_threads(user, repo, issues_in_page)
+        return self.write_issue_threads(user, repo, current_page, threads, spooled=True)
+
+    def write_issue_threads(self, user, repo, current_page, threads, spooled=False):
+        """
+        This function writes the (comments, events) of every issue of a page,
+        in the order of the issues, into the 'issues_comments' and
+        'issues_events' pages. The threads are lists of items, or spool files
+        of json lines with 'spooled'. It returns the number of comments and events.
+        """
+        number_of_items = []
+        for category, index in (("comments", 0), ("events", 1)):
+            with self.output_writer.open_page_stream(user, repo, f"issues_{category}", current_page) as page_stream:
+                for thread in threads:
+                    for item in thread[index]:
+                        page_stream.write_item(json.loads(item) if spooled else item)
+                    if spooled:
+                        thread[index].close()
+            number_of_items.append(page_stream.number_of_items)
+            self.metrics.add("items", f"issues_{category}", page_stream.number_of_items)
+            self.record_bytes_written(user, repo, f"issues_{category}", current_page)
+        return number_of_items
+
+    # ------------------------------------------------------------
+    # Fetch the comments and events of all issues with the bulk endpoints
+    # ------------------------------------------------------------
+
+    def get_issue_url_pages(self, user, repo, last_page_number):
+        """
+        This function maps every downloaded issue url to its page number and
+        returns the issue urls of each page in the order they were saved.
+        """
+        issue_url_page = {}
+        issue_urls_per_page = {}
+        for current_page in range(1, last_page_number + 1):
+            issues_in_page = self.output_writer.read_page(user, repo, "issues", current_page)
+            if issues_in_page is None:
+                logging.warning(f"The page does not exist: '{self.get_page_location(user, repo, 'issues', 'None', current_page)}'")
+                continue
+            issue_urls_per_page[current_page] = [each_issue['url'] for each_issue in issues_in_page]
+            for issue_url in issue_urls_per_page[current_page]:
+                issue_url_page[issue_url] = current_page
+        return issue_url_page, issue_urls_per_page
+
+    def get_bulk_events(self, user, repo):
+        url = self.get_github_urls(user, repo, "issues", "events")
+        for event in self.get_all_items(url):
+            issue = event.pop('issue', None)
+            if issue is None:
+                continue
+            # Same layout as getIssueEventsByUrl, 'url' points to the issue
+            event['url'] = issue['url']
+            yield event
+
+    def download_bulk_issue_threads(self, user, repo):
+        """
+        This function downloads the comments and events of all issues of a
+        repository with the repository-wide endpoints and regroups them into
+        the same 'issues_comments' and 'issues_events' page files as the
+        per-issue fetch.
+        """
+        last_page_number = self.get_verification_data_values(f"{user}_{repo}", "issues_last_page_number", "None", "None")
+        if not last_page_number:
+            logging.info(f"No issues downloaded for {user}_{repo}, skipping the bulk comments and events")
+            return
+
+        if self.check_if_file_exists(user, repo, 1, last_page_number, "issues", "comments") == 0 and \
+                self.check_if_file_exists(user, repo, 1, last_page_number, "issues", "events") == 0:
+            logging.info(f"All 'issues/comments' and 'issues/events' are already downloaded for {user}_{repo}")
+            return
+
+        issue_url_page, issue_urls_per_page = self.get_issue_url_pages(user, repo, last_page_number)
+
+        with tempfile.TemporaryDirectory() as spool_directory:
+            comments_url = self.get_github_urls(user, repo, "issues", "comments")
+            spool_items_by_page(self.get_all_items(comments_url), issue_url_page, get_bulk_comment_issue_url, spool_directory, "comments")
+            spool_items_by_page(self.get_bulk_events(user, repo), issue_url_page, get_bulk_event_issue_url, spool_directory, "events")
+
+            for current_page, issue_urls in issue_urls_per_page.items():
+                for category, get_issue_url in (("comments", get_bulk_comment_issue_url), ("events", get_bulk_event_issue_url)):
+                    page_items = read_spooled_page(spool_directory, category, current_page, issue_urls, get_issue_url)
+                    location = self.get_page_location(user, repo, "issues", category, current_page)
+                    is_new_page = not self.is_page_saved(user, repo, "issues", category, current_page)
+                    self.output_writer.write_page_items(user, repo, f"issues_{category}", current_page, page_items)
+                    self.record_bytes_written(user, repo, f"issues_{category}", current_page)
+                    logging.info(f"Saved '{len(page_items)}' items to '{location}'")
+                    # Pages saved by an earlier run are already counted
+                    if is_new_page:
+                        self.update_verification_data(f"{user}_{repo}", "issues", category, current_page, last_page_number, len(page_items))
+                    self.report_progress(f"{user}_{repo}", f"issues_{category}", current_page, last_page_number, len(page_items))
+
+    # ------------------------------------------------------------
+    # Check whether Data has Downloaded
+    # ------------------------------------------------------------
+
+    # Plan which pages of an endpoint are missing, with a single probe of page 1.
+    # Returns None if page 1 could not be downloaded, nothing is saved then
+    def get_resume_plan(self, github_username, github_repository, endpoint, category):
+        r, endpoint_last_page_number = self.get_first_page_request(github_username, github_repository, endpoint, category)
+        if r is None or classify_response(r) != SUCCESS:
+            # A permanent error skips the endpoint, a temporary one (or an open
+            # circuit) leaves it to the next run
+            logging.warning(f"Skipping '{get_endpoint_name(endpoint, category)}' for {github_username}_{github_repository}, page 1 got {get_failure_reason(r)}")
+            return None
+        # The progress counters of the main endpoints are trusted, the pages of
+        # the sub-endpoints are always listed
+        return self.resume_planner.plan(github_username, github_repository, get_endpoint_name(endpoint, category),
+                                        r, endpoint_last_page_number, trust_progress=category == "None")
+
+    # ------------------------------------------------------------
+    # Incremental sync of the items updated since the last run
+    # ------------------------------------------------------------
+
+    def get_high_water_mark(self, user_repo_key, endpoint):
+        return self.get_verification_data_values(user_repo_key, f"{endpoint}_high_water_mark", "None", "None")
+
+    def get_saved_pages(self, user, repo, endpoint, category="None"):
+        """
+        This function returns the items of every saved page of an endpoint,
+        as a dictionary of page number to list of items.
+        """
+        last_page_number = self.get_verification_data_values(f"{user}_{repo}", f"{endpoint}_last_page_number", "None", "None") or 0
+        saved_pages = {}
+        for current_page in range(1, last_page_number + 1):
+            page_items = self.output_writer.read_page(user, repo, get_endpoint_name(endpoint, category), current_page)
+            if page_items is not None:
+                saved_pages[current_page] = page_items
+        return saved_pages
+
+    def record_high_water_mark(self, user, repo, endpoint):
+        """
+        This function stores the max 'updated_at' of a fully downloaded endpoint
+        as the starting point of the next incremental sync.
+        """
+        user_repo_key = f"{user}_{repo}"
+        if self.get_high_water_mark(user_repo_key, endpoint) is not None:
+            return
+
+        high_water_mark = None
+        for page_items in self.get_saved_pages(user, repo, endpoint).values():
+            for item in page_items:
+                updated_at = item.get('updated_at')
+                if updated_at is not None and (high_water_mark is None or updated_at > high_water_mark):
+                    high_water_mark = updated_at
+
+        if high_water_mark is not None:
+            self.update_verification_value(user_repo_key, f"{endpoint}_high_water_mark", high_water_mark)
+            logging.info(f"High-water mark of '{endpoint}' for {user_repo_key}: {high_water_mark}")
+
+    def get_updated_items(self, user, repo, endpoint, high_water_mark):
+        """
+        This function yields the items of an endpoint updated since the
+        high-water mark, the items updated at the mark included (like 'since').
+        '/issues' supports 'since', '/pulls' is read newest first until an
+        item older than the mark shows up.
+        """
+        if endpoint == "issues":
+            url = f"{self.config.api_url}/repos/{user}/{repo}/issues?state=all&sort=updated&direction=asc&since={high_water_mark}&per_page={ITEMS_PER_PAGE}"
+            yield from self.get_all_items(url)
+        else:
+            url = f"{self.config.api_url}/repos/{user}/{repo}/{endpoint}?state=all&sort=updated&direction=desc&per_page={ITEMS_PER_PAGE}"
+            for item in self.get_all_items(url):
+                # ISO 8601 timestamps in UTC compare as strings
+                if item['updated_at'] < high_water_mark:
+                    return
+                yield item
+
+    def save_page_items(self, user, repo, endpoint, current_page, page_items):
+        # Same layout as the pages written from the responses
+        self.output_writer.write_page_items(user, repo, endpoint, current_page, page_items, sort_keys=True)
+        self.record_bytes_written(user, repo, endpoint, current_page)
+        # The page no longer matches the server page, drop its validators
+        validator_location = get_validator_location(self.get_page_location(user, repo, endpoint, "None", current_page))
+        if os.path.exists(validator_location):
+            os.remove(validator_location)
+
+    def merge_issue_threads(self, user, repo, current_page, issues_in_page, changed_issues):
+        """
+        This function fetches the comments and events of the changed issues of
+        a page again and rebuilds the 'issues_comments' and 'issues_events'
+        pages of the same page number, in the order of the issues of the page
+        like every other way of downloading the threads. The other issues keep
+        the items already saved.
+        """
+        threads = dict(zip((each_issue['url'] for each_issue in changed_issues), self.get_issue_threads(user, repo, changed_issues)))
+
+        for category, get_issue_url, index in (("comments", get_bulk_comment_issue_url, 0), ("events", get_bulk_event_issue_url, 1)):
+            saved_items_by_issue = {}
+            for item in self.output_writer.read_page(user, repo, f"issues_{category}", current_page) or []:
+                saved_items_by_issue.setdefault(get_issue_url(item), []).append(item)
+
+            with self.output_writer.open_page_stream(user, repo, f"issues_{category}", current_page) as page_stream:
+                for each_issue in issues_in_page:
+                    thread = threads.get(each_issue['url'])
+                    if thread is None:
+                        for item in saved_items_by_issue.get(each_issue['url'], []):
+                            page_stream.write_item(item)
+                        continue
+                    for item in thread[index]:
+                        page_stream.write_item(json.loads(item))
+                    thread[index].close()
+            self.record_bytes_written(user, repo, f"issues_{category}", current_page)
+
+    def sync_updated_items(self, user, repo, endpoint, high_water_mark):
+        """
+        This function merges the items updated since the high-water mark into the
+        saved pages. Known items are replaced in place, new items are appended to
+        the last page (and new pages after it), and the mark is moved forward.
+        Items saved with the same content are skipped, so only the pages that
+        changed are written again.
+        """
+        user_repo_key = f"{user}_{repo}"
+        updated_items = list(self.get_updated_items(user, repo, endpoint, high_water_mark))
+        logging.info(f"{len(updated_items)} '{endpoint}' updated since {high_water_mark} for {user_repo_key}")
+        if not updated_items:
+            return
+
+        saved_pages = self.get_saved_pages(user, repo, endpoint)
+        item_page = {}
+        for current_page, page_items in saved_pages.items():
+            for position, item in enumerate(page_items):
+                item_page[item['id']] = (current_page, position)
+
+        last_page_number = max(saved_pages) if saved_pages else 1
+        saved_pages.setdefault(last_page_number, [])
+        changed_items_per_page = {}
+        new_items = 0
+
+        for item in updated_items:
+            if item['id'] in item_page:
+                current_page, position = item_page[item['id']]
+                if saved_pages[current_page][position] == item:
+                    # The item at the mark is listed again on every run
+                    continue
+                saved_pages[current_page][position] = item
+            else:
+                if len(saved_pages[last_page_number]) >= ITEMS_PER_PAGE:
+                    last_page_number += 1
+                    saved_pages[last_page_number] = []
+                current_page = last_page_number
+                item_page[item['id']] = (current_page, len(saved_pages[current_page]))
+                saved_pages[current_page].append(item)
+                new_items += 1
+            changed_items_per_page.setdefault(current_page, []).append(item)
+            if item['updated_at'] > high_water_mark:
+                high_water_mark = item['updated_at']
+
+        if not changed_items_per_page:
+            logging.info(f"No '{endpoint}' changed since {high_water_mark} for {user_repo_key}")
+            return
+
+        for current_page, changed_items in sorted(changed_items_per_page.items()):
+            if endpoint == "issues":
+                # The threads are written first, so an issues page is only
+                # saved once the threads of its changed issues are
+                with self.metrics.section("issue_threads"):
+                    self.merge_issue_threads(user, repo, current_page, saved_pages[current_page], changed_items)
+            self.save_page_items(user, repo, endpoint, current_page, saved_pages[current_page])
+            self.report_progress(user_repo_key, endpoint, current_page, last_page_number, len(saved_pages[current_page]))
+
+        self.update_verification_data(user_repo_key, endpoint, "None", last_page_number, last_page_number, new_items)
+        self.update_verification_value(user_repo_key, f"{endpoint}_high_water_mark", high_water_mark)
+        logging.info(f"Merged {sum(map(len, changed_items_per_page.values()))} '{endpoint}' ({new_items} new) into {len(changed_items_per_page)} pages for {user_repo_key}")
+
+    # ------------------------------------------------------------
+    # Download one endpoint of a repository
+    # ------------------------------------------------------------
+
+    def save_page(self, user, repo, endpoint, category, current_page, url_by_page, r):
+        """
+        This function saves the response of a page with its validators and
+        returns its items, or None if the body is not valid json.
+        """
+        with self.metrics.section("save_page"):
+            location = self.get_page_location(user, repo, endpoint, category, current_page)
+            # Raw bytes, the writer only parses them once
+            name = get_endpoint_name(endpoint, category)
+            page_items = self.output_writer.write_raw_page(user, repo, name, current_page, r.content)
+            self.record_bytes_written(user, repo, name, current_page)
+            # The last page number of page 1 is used when a later 304 has no 'Link' header
+            save_validators(url_by_page, location, r, None if page_items is None else len(page_items),
+                            get_last_page_num(r) if current_page == 1 else None)
+        return page_items
+
+    def download_endpoint_pages(self, user, repo, endpoint, category, resume_plan):
+        url = self.get_github_urls(user, repo, endpoint, category)
+        last_page_number = resume_plan.last_page_number
+        missing_pages = resume_plan.missing_pages
+        failed_pages = []
+
+        # Download every missing page, gaps between saved pages included
+        for index, current_page in enumerate(missing_pages):
+            url_by_page = url + f"&page={current_page}"
+            location = self.get_page_location(user, repo, endpoint, category, current_page)
+            if current_page == 1 and resume_plan.first_page_response is not None:
+                # Page 1 is missing, so the probe was not conditional and is the page itself
+                r = resume_plan.first_page_response
+            else:
+                r = self.get_github_api_request(url_by_page)
+
+            if r is None or r.status_code != 200:
+                if is_permanent_error(r):
+                    logging.warning(f"Skipping the rest of '{get_endpoint_name(endpoint, category)}' for {user}_{repo}, '{url_by_page}' got {get_failure_reason(r)}")
+                    break
+                logging.warning(f"Could not download '{url_by_page}' ({get_failure_reason(r)}), it is downloaded on the next run")
+                failed_pages.append(current_page)
+                continue
+
+            if endpoint == 'issues' and not self.config.bulk_issue_threads:
+                # The issue threads are written first, so an issues page is
+                # only saved once all of its threads are
+                issues_in_page = parse_page(r.content, location)
+                if issues_in_page is not None:
+                    try:
+                        with self.metrics.section("issue_threads"):
+                            self.save_issue_threads(user, repo, current_page, issues_in_page)
+                    except DownloadError as e:
+                        logging.warning(f"Could not download the issue threads of '{url_by_page}' ({e}), it is downloaded on the next run")
+                        failed_pages.append(current_page)
+                        continue
+                    location = self.get_page_location(user, repo, endpoint, "events", current_page)
+
+            page_items = self.save_page(user, repo, endpoint, category, current_page, url_by_page, r)
+            number_of_items_per_page = None if page_items is None else len(page_items)
+
+            logging.info(f"Saved '{number_of_items_per_page}' items to '{location}'")
+            # The stored current page does not move past a failed page, so the
+            # next run downloads it. Still missing: the failed pages and the
+            # next pages of the plan
+            saved_page_number = get_contiguous_page_number(failed_pages[:1] + missing_pages[index + 1:index + 2], last_page_number)
+            self.update_verification_data(f"{user}_{repo}", endpoint, category, saved_page_number, last_page_number, number_of_items_per_page)
+            self.report_progress(f"{user}_{repo}", get_endpoint_name(endpoint, category), current_page, last_page_number, number_of_items_per_page)
+
+    def is_incremental(self, endpoint, category):
+        return self.config.incremental_sync and category == "None" and endpoint in self.config.incremental_sync_endpoints
+
+    def plan_endpoint(self, user, repo, endpoint, category):
+        """
+        This function starts the download of an endpoint, the same way for
+        every engine: an incremental endpoint with a high-water mark merges
+        the items updated since then, the others get a resume plan. It
+        returns the plan, complete when no page is missing, or None if the
+        endpoint is skipped.
+        """
+        high_water_mark = None
+        if self.is_incremental(endpoint, category):
+            high_water_mark = self.get_high_water_mark(f"{user}_{repo}", endpoint)
+        if high_water_mark is not None:
+            self.sync_updated_items(user, repo, endpoint, high_water_mark)
+            return ResumePlan(None, None, [])
+
+        resume_plan = self.get_resume_plan(user, repo, endpoint, category)
+        if resume_plan is not None and resume_plan.is_complete():
+            logging.info(f"All '{get_endpoint_name(endpoint, category)}' are already downloaded for {user}_{repo}")
+        return resume_plan
+
+    def finish_endpoint(self, user, repo, endpoint, category):
+        """
+        This function finishes an endpoint once its missing pages are
+        downloaded: the high-water mark of an incremental endpoint is only
+        recorded when every page is saved, then the bulk issue threads are
+        downloaded.
+        """
+        if self.is_incremental(endpoint, category) and self.get_high_water_mark(f"{user}_{repo}", endpoint) is None:
+            last_page_number = self.get_verification_data_values(f"{user}_{repo}", f"{endpoint}_last_page_number", "None", "None") or 0
+            if self.check_if_file_exists(user, repo, 1, last_page_number, endpoint, category) == 0:
+                self.record_high_water_mark(user, repo, endpoint)
+        if self.config.bulk_issue_threads and endpoint == "issues" and category == "None":
+            self.download_bulk_issue_threads(user, repo)
+
+    def download_endpoint(self, user, repo, github_endpoint):
+        """
+        This function downloads one endpoint of a repository, the unit of work
+        of the scheduler.
+        """
+        endpoint, category = check_github_endpoints(github_endpoint)
+        resume_plan = self.plan_endpoint(user, repo, endpoint, category)
+        if resume_plan is None:
+            return
+        if not resume_plan.is_complete():
+            self.download_endpoint_pages(user, repo, endpoint, category, resume_plan)
+        self.finish_endpoint(user, repo, endpoint, category)
+
+    # ------------------------------------------------------------
+    # Tasks of the work queue
+    # ------------------------------------------------------------
+
+    def run_endpoint_task(self, task, worker_id):
+        """
+        This function plans an endpoint like download_endpoint, with a page
+        task for every missing page. Once they are all done it finishes the
+        endpoint like download_endpoint.
+        """
+        user, repo = task.user, task.repo
+        endpoint, category = check_github_endpoints(task.github_endpoint)
+        if task.stage == "run":
+            # The probe of page 1 is not kept, the queue could outlive this process
+            resume_plan = self.plan_endpoint(user, repo, endpoint, category)
+            if resume_plan is None:
+                # Skipped like in download_endpoint, the next run plans it again
+                self.work_queue.complete(task, worker_id)
+                return
+            if not resume_plan.is_complete():
+                last_page_number = resume_plan.last_page_number
+                children = [{'kind': PAGE_TASK, 'page': current_page, 'last_page_number': last_page_number,
+                             'priority': get_page_priority(self.config.queue_priority, current_page, last_page_number)}
+                            for current_page in resume_plan.missing_pages]
+                self.work_queue.wait_for_children(task, worker_id, children)
+                return
+
+        # Every page task is done (or skipped)
+        self.finish_endpoint(user, repo, endpoint, category)
+        self.work_queue.complete(task, worker_id)
+
+    def run_page_task(self, task, worker_id):
+        """
+        This function saves a page. The comments and events of the issues of
+        an 'issues' page are fetched by one issue task per issue, the page
+        task writes them once they are all done. Like in the other engines,
+        an issues page is only saved once all of its threads are: until
+        then it is kept in a result file of the page task.
+        """
+        user, repo, current_page = task.user, task.repo, task.page
+        endpoint, category = check_github_endpoints(task.github_endpoint)
+        name = get_endpoint_name(endpoint, category)
+        if task.stage == "run":
+            if self.output_writer.page_exists(user, repo, name, current_page):
+                # Saved by an earlier attempt of this task, it is not fetched again
+                page_items = self.output_writer.read_page(user, repo, name, current_page)
+            else:
+                url_by_page = self.get_github_urls(user, repo, endpoint, category) + f"&page={current_page}"
+                r = self.get_github_api_request(url_by_page)
+                if is_permanent_error(r):
+                    # Nothing is saved and the progress does not move past this page
+                    logging.warning(f"Skipping page {current_page} of '{name}' for {user}_{repo}, it got {get_failure_reason(r)}")
+                    self.work_queue.complete(task, worker_id, skipped=True)
+                    return
+                if r is None or r.status_code != 200:
+                    self.work_queue.fail(task, worker_id, get_failure_reason(r))
+                    return
+                if endpoint == 'issues' and not self.config.bulk_issue_threads:
+                    issues_in_page = parse_page(r.content, self.get_page_location(user, repo, endpoint, category, current_page))
+                    if issues_in_page and not self.config.graphql_issue_threads:
+                        # Saved when the task finishes, after the threads of its issue tasks
+                        page_paths = [self.work_queue.spool_result(task, "page", [get_stored_page(url_by_page, r)])]
+                        children = [{'kind': ISSUE_TASK, 'page': current_page, 'position': position, 'priority': task.priority,
+                                     'data': {'comments_url': each_issue.get('comments_url'), 'events_url': each_issue.get('events_url')}}
+                                    for position, each_issue in enumerate(issues_in_page)]
+                        self.work_queue.wait_for_children(task, worker_id, children, page_paths)
+                        return
+                    if issues_in_page is not None:
+                        # The issue threads are written first, like in download_endpoint_pages
+                        with self.metrics.section("issue_threads"):
+                            self.save_issue_threads(user, repo, current_page, issues_in_page)
+                page_items = self.save_page(user, repo, endpoint, category, current_page, url_by_page, r)
+            page_paths = []
+        else:
+            # The result files are read one at a time, in the order of the issues
+            threads = [[read_result_file(path) for path in result_paths] for result_paths in self.work_queue.get_child_results(task)]
+            with self.metrics.section("issue_threads"):
+                self.write_issue_threads(user, repo, current_page, threads, spooled=True)
+            page_paths = task.result
+            stored_page, = (json.loads(line) for line in read_result_file(page_paths[0]))
+            page_items = self.save_page(user, repo, endpoint, category, current_page, stored_page['url'], StoredResponse(stored_page))
+        number_of_items_per_page = None if page_items is None else len(page_items)
+
+        if self.work_queue.complete(task, worker_id):
+            remove_result_files(page_paths)
+            logging.info(f"Saved '{number_of_items_per_page}' items of page {current_page} of '{name}' for {user}_{repo}")
+            # Pages finish in any order, the stored current page is the last
+            # page before the first one that is not done (a skipped page is not)
+            first_unfinished_page = self.work_queue.get_first_unfinished_page(task.parent_id)
+            saved_page_number = task.last_page_number if first_unfinished_page is None else first_unfinished_page - 1
+            self.update_verification_data(f"{user}_{repo}", endpoint, category, saved_page_number, task.last_page_number, number_of_items_per_page)
+            self.report_progress(f"{user}_{repo}", name, current_page, task.last_page_number, number_of_items_per_page)
+
+    def run_issue_task(self, task, worker_id):
+        """
+        This function streams the comments and events of an issue into two
+        result files of the queue, kept until the page task writes the
+        threads of all its issues.
+        """
+        comments_url = task.data.get('comments_url')
+        events_url = task.data.get('events_url')
+        if comments_url is None or events_url is None:
+            threads = ([], [])
+        else:
+            threads = (self.get_issue_items(comments_url), self.get_issue_events(events_url, events_url.replace('/events', '')))
+
+        result_paths = []
+        try:
+            for category, items in zip(("comments", "events"), threads):
+                result_paths.append(self.work_queue.spool_result(task, category, items))
+        except BaseException:
+            remove_result_files(result_paths)
+            raise
+        self.work_queue.complete(task, worker_id, result_paths)
+
+    def run_task(self, task, worker_id):
+        try:
+            if task.kind == ENDPOINT_TASK:
+                self.run_endpoint_task(task, worker_id)
+            elif task.kind == PAGE_TASK:
+                self.run_page_task(task, worker_id)
+            else:
+                self.run_issue_task(task, worker_id)
+        except Exception as e:
+            logging.exception(f"{task} failed")
+            self.work_queue.fail(task, worker_id, f"{type(e).__name__}: {e}")
+
+    def drain_work_queue(self):
+        """
+        This function runs the tasks of the work queue, 'issue_workers' at a
+        time, until none is left. Other processes can drain the same queue,
+        this one waits for the tasks they hold until the queue is empty.
+        """
+        worker_id = get_worker_id()
+        workers = max(self.config.issue_workers, 1)
+        work_queue = self.work_queue
+        running = set()
+        with work_queue.keep_leases(worker_id), ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # Read before leasing, so a task that finishes in between ends the wait at once
+                change_count = work_queue.get_change_count()
+                running = {future for future in running if not future.done()}
+                if len(running) < workers:
+                    for task in work_queue.lease(worker_id, workers - len(running)):
+                        future = executor.submit(self.run_task, task, worker_id)
+                        # Its slot is only free once run_task returned
+                        future.add_done_callback(work_queue.notify_change)
+                        running.add(future)
+
+                if len(running) < workers:
+                    wait_time_limit = work_queue.get_seconds_until_ready()
+                    if wait_time_limit is None and not running:
+                        break
+                    if wait_time_limit is not None:
+                        wait_time_limit = min(max(wait_time_limit, 0.1), QUEUE_POLL_SECONDS)
+                else:
+                    wait_time_limit = None
+                # Every task that finishes, here or in another forked worker, wakes this one
+                work_queue.wait_for_change(change_count, QUEUE_POLL_SECONDS if wait_time_limit is None else wait_time_limit)
+        logging.info(f"Work queue drained by '{worker_id}'")
+
+    def run_work_queue(self, jobs):
+        global WORKER_DOWNLOADER
+        self.work_queue.add_jobs(jobs)
+        if self.config.repo_workers <= 1:
+            self.drain_work_queue()
+            return
+
+        WORKER_DOWNLOADER = self
+        run_workers(drain_work_queue_in_worker, self.config.repo_workers,
+                    initializer=self.prepare_worker, result_callback=self.metrics.merge)
+
+    # ------------------------------------------------------------
+    # Download whole repositories
+    # ------------------------------------------------------------
+
+    def run_jobs(self, jobs):
+        global WORKER_DOWNLOADER
+        if self.config.work_queue is not None:
+            if self.config.engine == "async":
+                raise ValueError("The work queue is drained by the threads engine, not the async engine")
+            self.run_work_queue(jobs)
+            return
+
+        if self.config.engine == "async":
+            # Imported here, the async engine imports this module
+            from .async_engine import AsyncEngine
+            AsyncEngine(self, self.config.max_in_flight).run(jobs)
+            return
+
+        if self.config.repo_workers <= 1:
+            run_jobs(jobs, self.download_endpoint, self.token_pool, self.config.repo_workers)
+            return
+
+        WORKER_DOWNLOADER = self
+        run_jobs(jobs, download_endpoint_in_worker, self.token_pool, self.config.repo_workers,
+                 initializer=self.prepare_worker, result_callback=self.metrics.merge)
+
+    def prepare_worker(self):
+        # Forked workers must not share the connections of this process,
+        # nor report its metrics a second time
+        self.session.close()
+        self.metrics.reset()
+
+    def sync_all(self, repositories=None, endpoints=None):
+        """
+        Download the endpoints (default: the endpoints of the config) of the
+        repositories, by default the valid repositories of the input file.
+        A repository is 'user/repo', a github.com url or a (user, repo) pair.
+        """
+        with profile(self.config.profile_file):
+            self.start()
+            if repositories is None:
+                repositories = self.get_verified_and_non_verified_lists()[0]
+            repositories = [parse_repository(repository) for repository in repositories]
+
+            for user, repo in repositories:
+                self.prepare_repository(user, repo)
+
+            self.run_jobs(get_jobs(repositories, endpoints or self.config.endpoints))
+            with self.metrics.section("export_verification_json"):
+                self.progress_store.export_verification_json(self.config.verification_json)
+            if self.config.index_database is not None:
+                with self.metrics.section("update_index"):
+                    self.local_index.update(repositories)
+        self.metrics.write(self.config.metrics_file)
+
+    def sync(self, repo, endpoints=None):
+        """
+        Download the endpoints (default: the endpoints of the config) of one
+        repository, 'user/repo' or a (user, repo) pair.
+        """
+        self.sync_all([repo], endpoints)
+
+    def close(self):
+        if 'session' in self.__dict__:
+            self.session.close()
@@ -0,0 +1,66 @@
+# ------------------------------------------------------------
+# GITHUB ENDPOINTS
+# ------------------------------------------------------------
+GITHUB_MAIN_ENDPOINTS = [
+    "issues",
+    "pulls",
+    "comments",
+    "commits",
+    "issues_comments",
+    "issues_events",
+    "pulls_comments"
+]
+
+# Downloaded together with the pages of 'issues', not on their own
+ISSUE_THREAD_ENDPOINTS = ["issues_comments", "issues_events"]
+
+
+# Split an endpoint into the endpoint and its category ("None" if it has none)
+def check_github_endpoints(endpoint):
+    if endpoint == "issues_comments":
+        return "issues", "comments"
+    elif endpoint == "issues_events":
+        return "issues", "events"
+    elif endpoint == "pulls_comments":
+        return "pulls", "comments"
+    else:
+        return endpoint, "None"
+
+
+# Get the directory name of an endpoint ('issues', 'issues_comments', ...)
+def get_endpoint_name(endpoint, category):
+    if category == "None":
+        return f"{endpoint}"
+    return f"{endpoint}_{category}"
+
+
+def parse_repository(repository):
+    """
+    Return (user, repo) of 'user/repo', a github.com url or a (user, repo) pair.
+    """
+    if not isinstance(repository, str):
+        user, repo = repository
+        return user, repo
+
+    parts = repository.strip().rstrip("/").split("/")
+    if len(parts) < 2 or not parts[-2] or not parts[-1]:
+        raise ValueError(f"Not a repository: '{repository}', use 'user/repo'")
+    return parts[-2].lower(), parts[-1].lower()
+
+
+def get_jobs(repositories, endpoints=GITHUB_MAIN_ENDPOINTS):
+    """
+    This function returns one (user, repo, endpoint) job per endpoint of
+    every repository. The issue comments and events are downloaded with the
+    issues, so asking for them adds the 'issues' job instead.
+    """
+    job_endpoints = []
+    for github_endpoint in endpoints:
+        if github_endpoint in ISSUE_THREAD_ENDPOINTS:
+            github_endpoint = "issues"
+        if github_endpoint not in GITHUB_MAIN_ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{github_endpoint}', use one of {GITHUB_MAIN_ENDPOINTS}")
+        if github_endpoint not in job_endpoints:
+            job_endpoints.append(github_endpoint)
+
+    return [(user, repo, github_endpoint) for user, repo in repositories for github_endpoint in job_endpoints]
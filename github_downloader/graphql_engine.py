@@ -0,0 +1,190 @@
+import logging
+from urllib.parse import quote
+
+# ------------------------------------------------------------
+# GRAPHQL ISSUE COMMENTS
+# ------------------------------------------------------------
+# One GraphQL query returns the comments of up to GRAPHQL_ISSUES_PER_QUERY
+# issues (one alias per issue number), instead of one REST call per issue.
+# Threads longer than GRAPHQL_THREAD_PAGE_SIZE are left to the REST
+# endpoint, so the outputs stay complete. The events are always fetched
+# with REST: most GraphQL timeline events have no numeric id, and the
+# timeline does not have every type of the REST issue events. So are the
+# issues pages, so at most half of the per-issue requests are saved.
+GRAPHQL_ISSUES_PER_QUERY = 100
+# Comments asked per issue
+GRAPHQL_THREAD_PAGE_SIZE = 100
+GRAPHQL_REQUEST_TIMEOUT_SECONDS = 60
+# REST reaction names of the GraphQL reaction contents, in the REST order
+REACTION_NAMES = {
+    'THUMBS_UP': "+1", 'THUMBS_DOWN': "-1", 'LAUGH': "laugh", 'HOORAY': "hooray",
+    'CONFUSED': "confused", 'HEART': "heart", 'ROCKET': "rocket", 'EYES': "eyes",
+}
+
+
+def build_issue_threads_query(numbers, page_size=GRAPHQL_THREAD_PAGE_SIZE):
+    """
+    Return a query for the comments of the issues (or pull requests, which
+    the REST issue pages include) with these numbers.
+    """
+    aliases = "\n".join(
+        f"    i{number}: issueOrPullRequest(number: {number}) {{ ... on Issue {{ ...IssueThread }} ... on PullRequest {{ ...PullRequestThread }} }}"
+        for number in numbers
+    )
+    thread_fields = f"""
+  comments(first: {page_size}) {{
+    pageInfo {{ hasNextPage }}
+    nodes {{
+      id databaseId url body createdAt updatedAt authorAssociation
+      author {{ __typename login avatarUrl url ... on Node {{ id }} ... on User {{ databaseId isSiteAdmin }}
+               ... on Bot {{ databaseId }} ... on Organization {{ databaseId }} ... on Mannequin {{ databaseId }} }}
+      reactionGroups {{ content reactors {{ totalCount }} }}
+    }}
+  }}"""
+    return f"""query($owner: String!, $name: String!) {{
+  rateLimit {{ cost remaining }}
+  repository(owner: $owner, name: $name) {{
+{aliases}
+  }}
+}}
+fragment IssueThread on Issue {{{thread_fields}
+}}
+fragment PullRequestThread on PullRequest {{{thread_fields}
+}}"""
+
+
+def convert_user(actor, api_url):
+    """
+    Return a GraphQL actor as a REST user object, or None for a deleted
+    account. The API urls are built from the login the way REST builds them.
+    """
+    if actor is None:
+        return None
+    login = actor['login']
+    if actor['__typename'] == "Bot":
+        # REST names the bot accounts 'name[bot]'
+        login = f"{login}[bot]"
+    user_url = f"{api_url}/users/{quote(login, safe='')}"
+    return {
+        'login': login,
+        'id': actor.get('databaseId'),
+        'node_id': actor.get('id'),
+        'avatar_url': actor['avatarUrl'],
+        'gravatar_id': "",
+        'url': user_url,
+        'html_url': actor['url'],
+        'followers_url': f"{user_url}/followers",
+        'following_url': f"{user_url}/following{{/other_user}}",
+        'gists_url': f"{user_url}/gists{{/gist_id}}",
+        'starred_url': f"{user_url}/starred{{/owner}}{{/repo}}",
+        'subscriptions_url': f"{user_url}/subscriptions",
+        'organizations_url': f"{user_url}/orgs",
+        'repos_url': f"{user_url}/repos",
+        'events_url': f"{user_url}/events{{/privacy}}",
+        'received_events_url': f"{user_url}/received_events",
+        'type': actor['__typename'],
+        'site_admin': actor.get('isSiteAdmin', False),
+    }
+
+
+def convert_reactions(reaction_groups, comment_url):
+    counts = {content: 0 for content in REACTION_NAMES}
+    for reaction_group in reaction_groups or []:
+        if reaction_group['content'] in counts:
+            counts[reaction_group['content']] = reaction_group['reactors']['totalCount']
+    reactions = {'url': f"{comment_url}/reactions", 'total_count': sum(counts.values())}
+    reactions.update((REACTION_NAMES[content], count) for content, count in counts.items())
+    return reactions
+
+
+def convert_comment(node, issue_url, comments_url, api_url):
+    """
+    Return a GraphQL issue comment with the names (and the order) of the
+    REST fields. GraphQL has no 'performed_via_github_app', it is the only
+    REST field that is missing.
+    """
+    comment_url = f"{comments_url}/{node['databaseId']}"
+    return {
+        'url': comment_url,
+        'html_url': node['url'],
+        'issue_url': issue_url,
+        'id': node['databaseId'],
+        'node_id': node['id'],
+        'user': convert_user(node.get('author'), api_url),
+        'created_at': node['createdAt'],
+        'updated_at': node['updatedAt'],
+        'author_association': node['authorAssociation'],
+        'body': node['body'],
+        'reactions': convert_reactions(node.get('reactionGroups'), comment_url),
+    }
+
+
+class GraphQLIssueThreads:
+    """
+    This class fetches the comments of the issues of a page with GraphQL.
+    'client' is a GitHubClient whose budget is the 'graphql' rate limit of
+    the tokens.
+    """
+
+    def __init__(self, client, graphql_url, api_url, issues_per_query=GRAPHQL_ISSUES_PER_QUERY, page_size=GRAPHQL_THREAD_PAGE_SIZE):
+        self.client = client
+        self.graphql_url = graphql_url
+        self.api_url = api_url
+        self.issues_per_query = issues_per_query
+        self.page_size = page_size
+
+    def query(self, user, repo, numbers):
+        """
+        Return the 'repository' data of the query for these issue numbers,
+        or None if the query failed.
+        """
+        payload = {
+            'query': build_issue_threads_query(numbers, self.page_size),
+            'variables': {'owner': user, 'name': repo},
+        }
+        response = self.client.post(self.graphql_url, payload, timeout=GRAPHQL_REQUEST_TIMEOUT_SECONDS)
+        if response is None or response.status_code != 200:
+            logging.warning(f"GraphQL query of {len(numbers)} issues of {user}/{repo} failed: {None if response is None else response.status_code}")
+            return None
+
+        try:
+            result = response.json()
+        except ValueError:
+            logging.warning(f"GraphQL response for {user}/{repo} is not valid JSON")
+            return None
+        # Errors of single issues (e.g. deleted ones) come with the data of the others
+        for error in result.get('errors') or []:
+            logging.warning(f"GraphQL error for {user}/{repo}: {error.get('message')} at {error.get('path')}")
+
+        data = result.get('data') or {}
+        rate_limit = data.get('rateLimit') or {}
+        logging.info(f"GraphQL query of {len(numbers)} issues of {user}/{repo}: cost {rate_limit.get('cost')}, {rate_limit.get('remaining')} left")
+        return data.get('repository')
+
+    def get_threads(self, user, repo, issues):
+        """
+        Return {issue number: (comments, events)} for the issues of a page,
+        in the REST layout. The comments are None when the thread has more
+        comments than one GraphQL page, or the issue could not be queried,
+        and the events are always None: both are fetched with REST.
+        """
+        threads = {}
+        comments_url = f"{self.api_url}/repos/{user}/{repo}/issues/comments"
+        numbers = [each_issue['number'] for each_issue in issues if 'number' in each_issue]
+        issue_urls = {each_issue['number']: each_issue.get('url') for each_issue in issues if 'number' in each_issue}
+
+        for start in range(0, len(numbers), self.issues_per_query):
+            batch = numbers[start:start + self.issues_per_query]
+            repository = self.query(user, repo, batch) or {}
+            for number in batch:
+                issue = repository.get(f"i{number}")
+                if not issue:
+                    threads[number] = (None, None)
+                    continue
+
+                comments = issue['comments']
+                if comments['pageInfo']['hasNextPage']:
+                    threads[number] = (None, None)
+                else:
+                    threads[number] = ([convert_comment(node, issue_urls[number], comments_url, self.api_url) for node in comments['nodes']], None)
+        return threads
@@ -0,0 +1,117 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import Metrics
+from .retry_policy import RetryPolicy, RetryState
+
+# ------------------------------------------------------------
+# HTTP CLIENT
+# ------------------------------------------------------------
+# Number of connections kept open to the same host
+HTTP_POOL_SIZE = 16
+REQUEST_TIMEOUT_SECONDS = 10
+
+
+def create_session(headers, pool_size=HTTP_POOL_SIZE):
+    """
+    This function returns a requests Session that keeps up to 'pool_size'
+    connections alive per host and asks for gzip compressed responses.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers)
+    session.headers.update({
+        'Accept-Encoding': 'gzip',
+        'Connection': 'keep-alive',
+    })
+    return session
+
+
+class DownloadError(Exception):
+    """
+    Raised when a response a download needs did not arrive, so nothing
+    partial is saved.
+    """
+
+
+class GitHubClient:
+    """
+    This class sends every request to GitHub through one pooled session.
+    It takes a token from the shared token pool (or a single rate limit
+    budget) before a request, updates that token's budget from the response
+    headers and retries failed requests as the retry policy says.
+    """
+
+    def __init__(self, session, rate_limit_budget, retry_policy=None, metrics=None):
+        self.session = session
+        self.rate_limit_budget = rate_limit_budget
+        self.retry_policy = retry_policy or RetryPolicy()
+        # A disabled Metrics records nothing
+        self.metrics = metrics or Metrics(enabled=False)
+
+    def get(self, url, timeout=REQUEST_TIMEOUT_SECONDS, headers=None, use_budget=True, max_retries=None):
+        return self.request("GET", url, timeout, headers, use_budget, max_retries)
+
+    def post(self, url, json, timeout=REQUEST_TIMEOUT_SECONDS, headers=None, use_budget=True, max_retries=None):
+        return self.request("POST", url, timeout, headers, use_budget, max_retries, json=json)
+
+    def request(self, method, url, timeout=REQUEST_TIMEOUT_SECONDS, headers=None, use_budget=True, max_retries=None, json=None):
+        """
+        Send a request and return the response.
+        A 304 is only returned for conditional requests ('headers' with
+        'If-None-Match' or 'If-Modified-Since'). Permanent errors (404, 410,
+        422, ...) are returned at once, retryable ones are sent up to
+        'max_retries' times with jittered exponential backoff and rate
+        limited ones are sent again once the rate limit allows it. The last
+        response is returned if all attempts fail, or None if none arrived
+        or the circuit of the repository is open.
+        """
+        retry_state = RetryState(self.retry_policy, url, self.metrics, max_retries)
+        metrics = self.metrics
+        while retry_state.start_attempt():
+            request_start = time.perf_counter() if metrics.enabled else 0
+            response = None
+            budget = None
+            try:
+                request_headers = headers
+                if use_budget:
+                    # Picks the token with the most calls left, sleeps if all are exhausted
+                    budget = self.rate_limit_budget.wait_for_budget()
+                    if metrics.enabled:
+                        now = time.perf_counter()
+                        metrics.add("rate_limit_wait_seconds", budget.category, now - request_start)
+                        request_start = now
+                    if budget.headers:
+                        request_headers = {**budget.headers, **(headers or {})}
+                try:
+                    response = self.session.request(method, url, timeout=timeout, headers=request_headers, json=json)
+                except requests.exceptions.RequestException as e:
+                    metrics.observe_request(method, url, type(e).__name__, time.perf_counter() - request_start)
+                    raise
+                if metrics.enabled:
+                    metrics.observe_request(method, url, response.status_code, time.perf_counter() - request_start, len(response.content))
+                if use_budget:
+                    budget.update_from_headers(response.headers)
+                    if response.status_code == 304:
+                        # Conditional requests answered with 304 are free
+                        budget.refund()
+                logging.info(f"Status: {response.status_code} for {response.url}")
+                reason = f"Status {response.status_code}"
+            except requests.exceptions.ReadTimeout:
+                reason = "ReadTimeout occurred"
+            except requests.exceptions.ConnectTimeout:
+                reason = "Connection timed out"
+            except requests.exceptions.RequestException:
+                reason = "Request failed"
+
+            wait_time_limit = retry_state.record_attempt(response, reason, budget)
+            if wait_time_limit:
+                time.sleep(wait_time_limit)
+
+        # If all retries fail, this is the last response (which contains the error status)
+        return retry_state.response
@@ -0,0 +1,283 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from .endpoints import parse_repository
+from .output_writer import create_output_writer, DATA_DIRECTORY, OUTPUT_FORMATS
+
+# ------------------------------------------------------------
+# LOCAL INDEX
+# ------------------------------------------------------------
+# SQLite index of the downloaded items, so questions like "all comments on
+# issue #123" are one indexed lookup instead of loading every page. Only the
+# pages written since the last update are read again: a page is re-indexed
+# when its signature (file size and mtime, or shard offset) changes.
+#   python -m github_downloader.local_index update
+#   python -m github_downloader.local_index query --repo user/repo --name issues_comments --number 123
+INDEX_DATABASE = "./config/index.db"
+# Seconds to wait for another process that holds the write lock
+INDEX_DATABASE_TIMEOUT = 60
+
+ISSUE_NUMBER_URL = re.compile(r"/(?:issues|pulls)/(\d+)$")
+
+
+def get_item_number(item):
+    """
+    Return the issue (or pull request) number an item belongs to, or None
+    for commits and commit comments.
+    """
+    if isinstance(item.get('number'), int):
+        return item['number']
+    if isinstance(item.get('issue'), dict) and isinstance(item['issue'].get('number'), int):
+        return item['issue']['number']
+    # issue comments, pull request review comments and per-issue events
+    for key in ('issue_url', 'pull_request_url', 'url'):
+        match = ISSUE_NUMBER_URL.search(item.get(key) or "")
+        if match is not None:
+            return int(match.group(1))
+    return None
+
+
+def get_item_author(item):
+    for key in ('user', 'actor', 'author'):
+        if isinstance(item.get(key), dict) and item[key].get('login'):
+            return item[key]['login']
+    # commits without a GitHub account
+    commit_author = (item.get('commit') or {}).get('author') or {}
+    return commit_author.get('name')
+
+
+def get_item_updated_at(item):
+    if item.get('updated_at') or item.get('created_at'):
+        return item.get('updated_at') or item.get('created_at')
+    committer = (item.get('commit') or {}).get('committer') or {}
+    return committer.get('date')
+
+
+def get_item_id(item):
+    item_id = item.get('id', item.get('sha', item.get('node_id')))
+    return None if item_id is None else str(item_id)
+
+
+class LocalIndex:
+    """
+    This class indexes the pages saved by an output writer by repository,
+    endpoint name, issue number, author and updated_at, and answers queries
+    from the index. Connections are opened lazily per process and thread,
+    like the progress store.
+    """
+
+    def __init__(self, path=INDEX_DATABASE, output_writer=None, data_directory=DATA_DIRECTORY):
+        self.path = path
+        self.data_directory = data_directory
+        self.output_writer = output_writer or create_output_writer("json", data_directory)
+        self.local = threading.local()
+
+    def get_connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=INDEX_DATABASE_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "repo_key TEXT NOT NULL, name TEXT NOT NULL, page INTEGER NOT NULL, signature TEXT NOT NULL, "
+                "PRIMARY KEY (repo_key, name, page));"
+                "CREATE TABLE IF NOT EXISTS items ("
+                "repo_key TEXT NOT NULL, name TEXT NOT NULL, page INTEGER NOT NULL, position INTEGER NOT NULL, "
+                "item_id TEXT, number INTEGER, author TEXT, updated_at TEXT, data TEXT NOT NULL, "
+                "PRIMARY KEY (repo_key, name, page, position));"
+                "CREATE INDEX IF NOT EXISTS items_by_number ON items (repo_key, number, name);"
+                "CREATE INDEX IF NOT EXISTS items_by_author ON items (author, repo_key);"
+                "CREATE INDEX IF NOT EXISTS items_by_updated_at ON items (repo_key, updated_at);"
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    # ------------------------------------------------------------
+    # Update the index from the saved pages
+    # ------------------------------------------------------------
+
+    def get_saved_repositories(self):
+        """
+        Return the (user, repo) of every repository directory of the data
+        directory. GitHub user names have no '_', so the first one splits.
+        """
+        if not os.path.isdir(self.data_directory):
+            return []
+        return sorted(tuple(directory.split("_", 1)) for directory in os.listdir(self.data_directory)
+                      if "_" in directory and os.path.isdir(f"{self.data_directory}/{directory}"))
+
+    def get_saved_names(self, github_username, github_repository):
+        directory = f"{self.data_directory}/{github_username}_{github_repository}"
+        return sorted(name for name in os.listdir(directory) if os.path.isdir(f"{directory}/{name}"))
+
+    def update_page(self, connection, repo_key, name, page, signature, page_items):
+        rows = []
+        for position, item in enumerate(page_items or []):
+            if not isinstance(item, dict):
+                continue
+            rows.append((repo_key, name, page, position, get_item_id(item), get_item_number(item),
+                         get_item_author(item), get_item_updated_at(item), json.dumps(item)))
+
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM items WHERE repo_key = ? AND name = ? AND page = ?", (repo_key, name, page))
+            connection.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.execute("INSERT OR REPLACE INTO pages (repo_key, name, page, signature) VALUES (?, ?, ?, ?)",
+                               (repo_key, name, page, signature))
+
+    def update(self, repositories=None):
+        """
+        Index the pages of the repositories (default: every saved repository)
+        that are new or changed since the last update, and drop the pages
+        that are gone. Returns the number of pages indexed.
+        """
+        connection = self.get_connection()
+        if repositories is None:
+            repositories = self.get_saved_repositories()
+
+        indexed_pages = 0
+        for github_username, github_repository in repositories:
+            repo_key = f"{github_username}_{github_repository}"
+            if not os.path.isdir(f"{self.data_directory}/{repo_key}"):
+                continue
+            for name in self.get_saved_names(github_username, github_repository):
+                indexed_signatures = dict(connection.execute(
+                    "SELECT page, signature FROM pages WHERE repo_key = ? AND name = ?", (repo_key, name)
+                ).fetchall())
+                saved_pages = self.output_writer.list_pages(github_username, github_repository, name)
+
+                for page in sorted(saved_pages):
+                    signature = self.output_writer.get_page_signature(github_username, github_repository, name, page)
+                    if signature is None or indexed_signatures.get(page) == signature:
+                        continue
+                    try:
+                        page_items = self.output_writer.read_page(github_username, github_repository, name, page)
+                    except (OSError, ValueError) as e:
+                        logging.warning(f"Could not index page {page} of '{name}' of {repo_key}: {e}")
+                        continue
+                    self.update_page(connection, repo_key, name, page, signature, page_items)
+                    indexed_pages += 1
+
+                removed_pages = [(repo_key, name, page) for page in indexed_signatures if page not in saved_pages]
+                if removed_pages:
+                    with connection:
+                        connection.execute("BEGIN IMMEDIATE")
+                        connection.executemany("DELETE FROM items WHERE repo_key = ? AND name = ? AND page = ?", removed_pages)
+                        connection.executemany("DELETE FROM pages WHERE repo_key = ? AND name = ? AND page = ?", removed_pages)
+
+        logging.info(f"Indexed {indexed_pages} new or changed pages into '{self.path}'")
+        return indexed_pages
+
+    # ------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------
+
+    def find_items(self, repository=None, name=None, number=None, author=None, updated_since=None, updated_until=None, limit=None):
+        """
+        Return the items that match every given filter, in the order they
+        were downloaded. 'repository' is 'user/repo', a url or a (user, repo)
+        pair, 'name' an endpoint name ('issues', 'issues_comments', ...) and
+        'updated_since' / 'updated_until' ISO 8601 times ('2024-01-31' works).
+        """
+        conditions = []
+        parameters = []
+        if repository is not None:
+            conditions.append("repo_key = ?")
+            parameters.append("_".join(parse_repository(repository)))
+        for column, value in (("name", name), ("number", number), ("author", author)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if updated_since is not None:
+            conditions.append("updated_at >= ?")
+            parameters.append(updated_since)
+        if updated_until is not None:
+            conditions.append("updated_at <= ?")
+            parameters.append(updated_until)
+
+        query = "SELECT data FROM items"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY repo_key, name, page, position"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [json.loads(row[0]) for row in self.get_connection().execute(query, parameters)]
+
+    def get_issue(self, repository, number):
+        """
+        Return the issue (or pull request) with this number, or None.
+        """
+        for name in ("issues", "pulls"):
+            items = self.find_items(repository, name, number, limit=1)
+            if items:
+                return items[0]
+        return None
+
+    def get_comments(self, repository, number):
+        return self.find_items(repository, "issues_comments", number)
+
+    def get_events(self, repository, number):
+        return self.find_items(repository, "issues_events", number)
+
+    def count_items(self):
+        """
+        Return {(repo_key, name): number of items}.
+        """
+        rows = self.get_connection().execute("SELECT repo_key, name, COUNT(*) FROM items GROUP BY repo_key, name").fetchall()
+        return {(repo_key, name): count for repo_key, name, count in rows}
+
+
+# ------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(prog="python -m github_downloader.local_index",
+                                     description="Index the downloaded pages in SQLite and query them.")
+    parser.add_argument("--index-database", default=INDEX_DATABASE, help=f"(default: {INDEX_DATABASE})")
+    parser.add_argument("--data-directory", default=DATA_DIRECTORY, help=f"(default: {DATA_DIRECTORY})")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="json",
+                        help="format the pages were downloaded in (default: json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = commands.add_parser("update", help="index the new and changed pages")
+    update_parser.add_argument("--repos", nargs="+", metavar="USER/REPO", help="only these repositories")
+
+    query_parser = commands.add_parser("query", help="print the matching items, one json per line")
+    query_parser.add_argument("--repo", metavar="USER/REPO")
+    query_parser.add_argument("--name", help="endpoint name: issues, pulls, commits, comments, pulls_comments, issues_comments, issues_events")
+    query_parser.add_argument("--number", type=int, help="issue or pull request number")
+    query_parser.add_argument("--author", help="login of the author (actor of events)")
+    query_parser.add_argument("--since", help="updated at or after this ISO 8601 time")
+    query_parser.add_argument("--until", help="updated at or before this ISO 8601 time")
+    query_parser.add_argument("--limit", type=int)
+
+    commands.add_parser("stats", help="print the number of indexed items per repository and endpoint")
+    return parser
+
+
+def main(argv=None):
+    args = get_argument_parser().parse_args(argv)
+    output_writer = create_output_writer(args.output_format, args.data_directory)
+    local_index = LocalIndex(args.index_database, output_writer, args.data_directory)
+
+    if args.command == "update":
+        repositories = None if args.repos is None else [parse_repository(repository) for repository in args.repos]
+        print(f"Indexed {local_index.update(repositories)} pages")
+    elif args.command == "query":
+        for item in local_index.find_items(args.repo, args.name, args.number, args.author, args.since, args.until, args.limit):
+            print(json.dumps(item))
+    else:
+        for (repo_key, name), count in sorted(local_index.count_items().items()):
+            print(f"{repo_key} {name}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import contextlib
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+
+# ------------------------------------------------------------
+# METRICS
+# ------------------------------------------------------------
+# Request latency histograms per endpoint and status, bytes received per
+# endpoint and written to the output per endpoint name, retries, time spent waiting for the rate limit budget, time spent
+# in the save / progress sections and items saved per endpoint. Written at
+# the end of a run as a Prometheus textfile ('.prom') or a JSON summary.
+# A disabled Metrics returns before taking the lock or reading the clock.
+METRICS_PREFIX = "github_downloader"
+# Upper bounds of the latency buckets, the last bucket is +Inf
+LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REPOSITORY_PATH = re.compile(r"^/repos/[^/]+/[^/]+")
+NUMBER_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+DISABLED_SECTION = contextlib.nullcontext()
+
+
+def get_endpoint_label(url):
+    """
+    Return the path of a url with the repository and the numbers replaced,
+    '/repos/{owner}/{repo}/issues/{number}/comments', so every request to
+    the same endpoint shares one histogram.
+    """
+    path = url.split("?", 1)[0]
+    if "://" in path:
+        path = "/" + path.split("://", 1)[1].partition("/")[2]
+    path = REPOSITORY_PATH.sub("/repos/{owner}/{repo}", path)
+    return NUMBER_SEGMENT.sub("/{number}", path) or "/"
+
+
+def get_bucket_index(seconds):
+    for index, upper_bound in enumerate(LATENCY_BUCKETS_SECONDS):
+        if seconds <= upper_bound:
+            return index
+    return len(LATENCY_BUCKETS_SECONDS)
+
+
+def format_labels(labels):
+    return ",".join(f'{name}="{str(value)}"' for name, value in labels.items())
+
+
+class Metrics:
+    """
+    This class collects the metrics of one process, from any thread.
+    Worker processes send 'pop_snapshot()' back with the result of a job
+    and the main process adds it with 'merge()'.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # (method, endpoint, status) -> {'count', 'seconds', 'bytes_in', 'buckets'}
+        self.requests = {}
+        # (counter name, label) -> value
+        self.counters = {}
+        # section name -> [calls, seconds]
+        self.sections = {}
+        self.started_at = time.time()
+
+    def observe_request(self, method, url, status, seconds, bytes_in=0):
+        if not self.enabled:
+            return
+        key = (method, get_endpoint_label(url), str(status))
+        with self.lock:
+            request = self.requests.get(key)
+            if request is None:
+                request = self.requests[key] = {'count': 0, 'seconds': 0.0, 'bytes_in': 0,
+                                                'buckets': [0] * (len(LATENCY_BUCKETS_SECONDS) + 1)}
+            request['count'] += 1
+            request['seconds'] += seconds
+            request['bytes_in'] += bytes_in
+            request['buckets'][get_bucket_index(seconds)] += 1
+
+    def add(self, name, label, value=1):
+        """
+        Add 'value' to a counter: 'retries' (per endpoint), 'rate_limit_wait_seconds'
+        (per rate limit resource), 'items' and 'bytes_written' (per endpoint name)
+        or 'circuit_open_skips' (per repository).
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[(name, label)] = self.counters.get((name, label), 0) + value
+
+    def add_retry(self, url):
+        if self.enabled:
+            self.add("retries", get_endpoint_label(url))
+
+    def observe_section(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            section = self.sections.setdefault(name, [0, 0.0])
+            section[0] += 1
+            section[1] += seconds
+
+    @contextlib.contextmanager
+    def _timed_section(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_section(name, time.perf_counter() - start)
+
+    def section(self, name):
+        """
+        Return a context manager that adds its run time to the section 'name'.
+        """
+        if not self.enabled:
+            return DISABLED_SECTION
+        return self._timed_section(name)
+
+    # ------------------------------------------------------------
+    # Worker processes
+    # ------------------------------------------------------------
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': [
+                    {'method': method, 'endpoint': endpoint, 'status': status, **request, 'buckets': list(request['buckets'])}
+                    for (method, endpoint, status), request in self.requests.items()
+                ],
+                'counters': [{'name': name, 'label': label, 'value': value} for (name, label), value in self.counters.items()],
+                'sections': {name: list(section) for name, section in self.sections.items()},
+            }
+
+    def pop_snapshot(self):
+        """
+        Return the metrics collected since the last call and start again,
+        or None when disabled.
+        """
+        if not self.enabled:
+            return None
+        snapshot = self.snapshot()
+        with self.lock:
+            self.requests = {}
+            self.counters = {}
+            self.sections = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        if not self.enabled or snapshot is None:
+            return
+        with self.lock:
+            for request in snapshot['requests']:
+                key = (request['method'], request['endpoint'], request['status'])
+                current = self.requests.get(key)
+                if current is None:
+                    current = self.requests[key] = {'count': 0, 'seconds': 0.0, 'bytes_in': 0,
+                                                    'buckets': [0] * (len(LATENCY_BUCKETS_SECONDS) + 1)}
+                for field in ('count', 'seconds', 'bytes_in'):
+                    current[field] += request[field]
+                current['buckets'] = [a + b for a, b in zip(current['buckets'], request['buckets'])]
+            for counter in snapshot['counters']:
+                key = (counter['name'], counter['label'])
+                self.counters[key] = self.counters.get(key, 0) + counter['value']
+            for name, (calls, seconds) in snapshot['sections'].items():
+                section = self.sections.setdefault(name, [0, 0.0])
+                section[0] += calls
+                section[1] += seconds
+
+    # ------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------
+
+    def get_summary(self):
+        """
+        Return the metrics as a json serialisable dict, with the elapsed
+        time and the items saved per second of every endpoint name.
+        """
+        summary = self.snapshot()
+        elapsed_seconds = max(time.time() - self.started_at, 1e-9)
+        summary['elapsed_seconds'] = elapsed_seconds
+        summary['latency_buckets_seconds'] = list(LATENCY_BUCKETS_SECONDS)
+        summary['items_per_second'] = {
+            counter['label']: counter['value'] / elapsed_seconds
+            for counter in summary['counters'] if counter['name'] == 'items'
+        }
+        return summary
+
+    def get_prometheus_text(self):
+        summary = self.get_summary()
+        lines = [
+            f"# HELP {METRICS_PREFIX}_request_duration_seconds Latency of the GitHub API requests.",
+            f"# TYPE {METRICS_PREFIX}_request_duration_seconds histogram",
+        ]
+        for request in summary['requests']:
+            labels = {'method': request['method'], 'endpoint': request['endpoint'], 'status': request['status']}
+            cumulative_count = 0
+            for upper_bound, count in zip(list(LATENCY_BUCKETS_SECONDS) + ["+Inf"], request['buckets']):
+                cumulative_count += count
+                lines.append(f"{METRICS_PREFIX}_request_duration_seconds_bucket{{{format_labels({**labels, 'le': upper_bound})}}} {cumulative_count}")
+            lines.append(f"{METRICS_PREFIX}_request_duration_seconds_sum{{{format_labels(labels)}}} {request['seconds']}")
+            lines.append(f"{METRICS_PREFIX}_request_duration_seconds_count{{{format_labels(labels)}}} {request['count']}")
+
+        lines.append(f"# HELP {METRICS_PREFIX}_bytes_in_total Bytes of the response bodies.")
+        lines.append(f"# TYPE {METRICS_PREFIX}_bytes_in_total counter")
+        for request in summary['requests']:
+            labels = {'method': request['method'], 'endpoint': request['endpoint'], 'status': request['status']}
+            lines.append(f"{METRICS_PREFIX}_bytes_in_total{{{format_labels(labels)}}} {request['bytes_in']}")
+
+        label_names = {'retries': 'endpoint', 'rate_limit_wait_seconds': 'resource', 'items': 'name', 'bytes_written': 'name',
+                       'circuit_open_skips': 'repository'}
+        for name, label_name in label_names.items():
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name}_total counter")
+            for counter in summary['counters']:
+                if counter['name'] == name:
+                    lines.append(f"{METRICS_PREFIX}_{name}_total{{{format_labels({label_name: counter['label']})}}} {counter['value']}")
+
+        lines.append(f"# TYPE {METRICS_PREFIX}_section_seconds_total counter")
+        lines.append(f"# TYPE {METRICS_PREFIX}_section_calls_total counter")
+        for name, (calls, seconds) in summary['sections'].items():
+            lines.append(f"{METRICS_PREFIX}_section_seconds_total{{section=\"{name}\"}} {seconds}")
+            lines.append(f"{METRICS_PREFIX}_section_calls_total{{section=\"{name}\"}} {calls}")
+
+        lines.append(f"# TYPE {METRICS_PREFIX}_items_per_second gauge")
+        for name, items_per_second in summary['items_per_second'].items():
+            lines.append(f"{METRICS_PREFIX}_items_per_second{{name=\"{name}\"}} {items_per_second}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_elapsed_seconds gauge")
+        lines.append(f"{METRICS_PREFIX}_elapsed_seconds {summary['elapsed_seconds']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """
+        Write the metrics to 'path', a Prometheus textfile if it ends with
+        '.prom', otherwise a json summary. The file is replaced atomically so
+        a textfile collector never reads half of it.
+        """
+        if not self.enabled or not path:
+            return
+        if path.endswith(".prom"):
+            data = self.get_prometheus_text()
+        else:
+            data = json.dumps(self.get_summary(), indent=4)
+
+        temporary_location = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_location, 'w') as metrics_file:
+            metrics_file.write(data)
+        os.replace(temporary_location, path)
+
+
+@contextlib.contextmanager
+def profile(path):
+    """
+    Run the body under cProfile and dump the stats to 'path' (read them with
+    'python -m pstats path'). Does nothing if 'path' is None.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
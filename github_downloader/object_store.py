@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+from .output_writer import get_page_location, parse_page
+
+# ------------------------------------------------------------
+# CONTENT ADDRESSED OBJECT STORE
+# ------------------------------------------------------------
+# "dedup" output format: every item is stored once in a SQLite object store,
+# keyed by the sha256 of its canonical json, together with its GitHub
+# 'node_id'. The page files only hold [node_id, sha256] references, so an
+# unchanged item downloaded again (a re-sync, a page written twice, a thread
+# fetched by two modes) costs a reference and no object write.
+OBJECT_DATABASE_NAME = "objects.db"
+# Seconds to wait for another process that holds the write lock
+OBJECT_DATABASE_TIMEOUT = 60
+# Items buffered by a page stream before they are stored
+OBJECT_BATCH_SIZE = 500
+# Parameters per 'IN (...)' query, below SQLite's limit
+OBJECT_QUERY_BATCH_SIZE = 500
+REFERENCE_PAGE_EXTENSION = ".refs.json"
+
+
+def get_object_data(item):
+    # Canonical json, the same item always gives the same bytes
+    return json.dumps(item, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+class ObjectStore:
+    """
+    This class stores json objects by the sha256 of their canonical json.
+    Objects are zlib compressed and written once, storing an object that
+    is already there only costs a primary key lookup. Connections are
+    opened lazily per process and thread, like the progress store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def get_connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=OBJECT_DATABASE_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "sha256 TEXT PRIMARY KEY, node_id TEXT, data BLOB NOT NULL) WITHOUT ROWID"
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def put_many(self, items):
+        """
+        Store the items that are not stored yet and return their
+        [node_id, sha256] references, in order.
+        """
+        references = []
+        rows = {}
+        for item in items:
+            data = get_object_data(item)
+            sha256 = hashlib.sha256(data).hexdigest()
+            node_id = item.get('node_id') if isinstance(item, dict) else None
+            references.append([node_id, sha256])
+            rows[sha256] = (sha256, node_id, data)
+        if not rows:
+            return references
+
+        connection = self.get_connection()
+        stored = set()
+        sha256_list = list(rows)
+        for start in range(0, len(sha256_list), OBJECT_QUERY_BATCH_SIZE):
+            batch = sha256_list[start:start + OBJECT_QUERY_BATCH_SIZE]
+            stored.update(row[0] for row in connection.execute(
+                f"SELECT sha256 FROM objects WHERE sha256 IN ({','.join('?' * len(batch))})", batch
+            ))
+        new_rows = [(sha256, node_id, zlib.compress(data)) for sha256, node_id, data in rows.values() if sha256 not in stored]
+        if new_rows:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                # Another worker may have stored the same object in the meantime
+                connection.executemany("INSERT OR IGNORE INTO objects (sha256, node_id, data) VALUES (?, ?, ?)", new_rows)
+        return references
+
+    def get_many(self, sha256_list):
+        """
+        Return {sha256: object} for the stored objects of 'sha256_list'.
+        """
+        objects = {}
+        connection = self.get_connection()
+        sha256_list = list(set(sha256_list))
+        for start in range(0, len(sha256_list), OBJECT_QUERY_BATCH_SIZE):
+            batch = sha256_list[start:start + OBJECT_QUERY_BATCH_SIZE]
+            for sha256, data in connection.execute(
+                f"SELECT sha256, data FROM objects WHERE sha256 IN ({','.join('?' * len(batch))})", batch
+            ):
+                objects[sha256] = json.loads(zlib.decompress(data))
+        return objects
+
+    def count(self):
+        return self.get_connection().execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+
+class ReferencePageStream:
+    """
+    This class stores the items of a page in batches and writes the
+    references of the page when it is complete.
+    """
+
+    def __init__(self, writer, github_username, github_repository, name, current_page):
+        self.writer = writer
+        self.key = (github_username, github_repository, name, current_page)
+        self.number_of_items = 0
+        self.items = []
+        self.references = []
+
+    def __enter__(self):
+        return self
+
+    def write_item(self, item):
+        self.items.append(item)
+        self.number_of_items += 1
+        if len(self.items) >= OBJECT_BATCH_SIZE:
+            self.references.extend(self.writer.object_store.put_many(self.items))
+            self.items = []
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.references.extend(self.writer.object_store.put_many(self.items))
+            self.writer.write_references(*self.key, self.references)
+        return False
+
+
+class ContentAddressedWriter:
+    """
+    This class stores the items of every page in the object store
+    '{data_directory}/objects.db' and writes the page itself as a list of
+    references, './config/data/{user}_{repo}/{name}/{user}_{repo}_{name}_page_{page}.refs.json'.
+    """
+
+    def __init__(self, data_directory):
+        self.data_directory = data_directory
+        os.makedirs(data_directory, exist_ok=True)
+        self.object_store = ObjectStore(f"{data_directory}/{OBJECT_DATABASE_NAME}")
+
+    def get_location(self, github_username, github_repository, name, current_page):
+        location = get_page_location(self.data_directory, github_username, github_repository, name, current_page)
+        return os.path.splitext(location)[0] + REFERENCE_PAGE_EXTENSION
+
+    def page_exists(self, github_username, github_repository, name, current_page):
+        return os.path.exists(self.get_location(github_username, github_repository, name, current_page))
+
+    def list_pages(self, github_username, github_repository, name):
+        """
+        Return the set of saved page numbers, with one directory listing.
+        """
+        directory = os.path.dirname(self.get_location(github_username, github_repository, name, 0))
+        if not os.path.isdir(directory):
+            return set()
+
+        prefix = f"{github_username}_{github_repository}_{name}_page_"
+        pages = set()
+        for file_name in os.listdir(directory):
+            if file_name.startswith(prefix) and file_name.endswith(REFERENCE_PAGE_EXTENSION):
+                page = file_name[len(prefix):-len(REFERENCE_PAGE_EXTENSION)]
+                if page.isdigit():
+                    pages.add(int(page))
+        return pages
+
+    def get_page_signature(self, github_username, github_repository, name, current_page):
+        try:
+            stat_result = os.stat(self.get_location(github_username, github_repository, name, current_page))
+        except FileNotFoundError:
+            return None
+        return f"{stat_result.st_size}:{stat_result.st_mtime_ns}"
+
+    def get_page_size(self, github_username, github_repository, name, current_page):
+        # The references of the page, its objects are shared with the other pages
+        try:
+            return os.path.getsize(self.get_location(github_username, github_repository, name, current_page))
+        except FileNotFoundError:
+            return None
+
+    def write_references(self, github_username, github_repository, name, current_page, references):
+        location = self.get_location(github_username, github_repository, name, current_page)
+        data = json.dumps(references, separators=(',', ':'))
+        # An unchanged page is not written again
+        if os.path.exists(location):
+            with open(location, 'r') as reference_file:
+                if reference_file.read() == data:
+                    return
+        temporary_location = f"{location}.{os.getpid()}.tmp"
+        with open(temporary_location, 'w') as reference_file:
+            reference_file.write(data)
+        os.replace(temporary_location, location)
+
+    def write_raw_page(self, github_username, github_repository, name, current_page, data):
+        """
+        Store the items of a response and return them, or None if the body
+        is not valid json.
+        """
+        location = self.get_location(github_username, github_repository, name, current_page)
+        page_items = parse_page(data, location)
+        if page_items is None:
+            return None
+        self.write_page_items(github_username, github_repository, name, current_page, page_items)
+        return page_items
+
+    def write_page_items(self, github_username, github_repository, name, current_page, page_items, sort_keys=False):
+        # Objects are always stored with sorted keys
+        references = self.object_store.put_many(page_items)
+        self.write_references(github_username, github_repository, name, current_page, references)
+
+    def open_page_stream(self, github_username, github_repository, name, current_page, sort_keys=False):
+        """
+        Return a context manager to write the items of a page one at a time.
+        """
+        return ReferencePageStream(self, github_username, github_repository, name, current_page)
+
+    def read_page(self, github_username, github_repository, name, current_page):
+        location = self.get_location(github_username, github_repository, name, current_page)
+        if not os.path.exists(location):
+            return None
+        with open(location, 'r') as reference_file:
+            references = json.load(reference_file)
+        objects = self.object_store.get_many(sha256 for node_id, sha256 in references)
+        return [objects[sha256] for node_id, sha256 in references]
@@ -0,0 +1,390 @@
+import fcntl
+import gzip
+import json
+import logging
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ------------------------------------------------------------
+# OUTPUT WRITERS
+# ------------------------------------------------------------
+# "json"       one pretty printed file per page (the original layout)
+# "jsonl.gz"   raw response bodies appended to gzip JSON Lines shards
+# "jsonl.zst"  the same with zstandard (needs the 'zstandard' package)
+# "dedup"      every item stored once in a content addressed object store,
+#              the page files only reference them (see object_store)
+OUTPUT_FORMATS = ["json", "jsonl.gz", "jsonl.zst", "dedup"]
+DATA_DIRECTORY = "./config/data"
+# Start a new shard once the current one is larger than this
+SHARD_MAX_BYTES = 64 * 1024 * 1024
+
+
+def get_page_location(data_directory, github_username, github_repository, name, current_page):
+    return f"{data_directory}/{github_username}_{github_repository}/{name}/{github_username}_{github_repository}_{name}_page_{current_page}.json"
+
+
+def parse_page(data, location):
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        logging.warning(f"Error: Provided data for '{location}' is not valid JSON.")
+        return None
+
+
+def write_json_page(location, page_items, sort_keys):
+    """
+    This function writes a page to a temporary file and moves it into place,
+    so a crash never leaves a truncated page that looks saved.
+    """
+    temporary_location = f"{location}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_location, 'w') as json_file:
+            json.dump(page_items, json_file, indent=4, sort_keys=sort_keys)
+    except BaseException:
+        os.remove(temporary_location)
+        raise
+    os.replace(temporary_location, location)
+
+
+class PrettyJsonPageStream:
+    """
+    This class writes the items of a page one at a time, in the same layout
+    as 'json.dump(items, indent=4)'. The page is written to a temporary file
+    and only moved into place when it is complete.
+    """
+
+    def __init__(self, location, sort_keys=False):
+        self.location = location
+        self.temporary_location = f"{location}.{os.getpid()}.tmp"
+        self.sort_keys = sort_keys
+        self.number_of_items = 0
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.temporary_location, 'w')
+        self.file.write("[")
+        return self
+
+    def write_item(self, item):
+        separator = "\n" if self.number_of_items == 0 else ",\n"
+        lines = json.dumps(item, indent=4, sort_keys=self.sort_keys).split("\n")
+        self.file.write(separator + "\n".join("    " + line for line in lines))
+        self.number_of_items += 1
+
+    def __exit__(self, exception_type, exception, traceback):
+        if self.number_of_items:
+            self.file.write("\n")
+        self.file.write("]")
+        self.file.close()
+        if exception_type is None:
+            os.replace(self.temporary_location, self.location)
+        else:
+            os.remove(self.temporary_location)
+        return False
+
+
+class PrettyJsonWriter:
+    """
+    This class writes every page to its own pretty printed json file,
+    './config/data/{user}_{repo}/{name}/{user}_{repo}_{name}_page_{page}.json'.
+    """
+
+    def __init__(self, data_directory=DATA_DIRECTORY):
+        self.data_directory = data_directory
+
+    def get_location(self, github_username, github_repository, name, current_page):
+        return get_page_location(self.data_directory, github_username, github_repository, name, current_page)
+
+    def page_exists(self, github_username, github_repository, name, current_page):
+        return os.path.exists(self.get_location(github_username, github_repository, name, current_page))
+
+    def list_pages(self, github_username, github_repository, name):
+        """
+        Return the set of saved page numbers, with one directory listing.
+        """
+        directory = os.path.dirname(self.get_location(github_username, github_repository, name, 0))
+        if not os.path.isdir(directory):
+            return set()
+
+        prefix = f"{github_username}_{github_repository}_{name}_page_"
+        pages = set()
+        for file_name in os.listdir(directory):
+            if file_name.startswith(prefix) and file_name.endswith(".json"):
+                page = file_name[len(prefix):-len(".json")]
+                if page.isdigit():
+                    pages.add(int(page))
+        return pages
+
+    def get_page_signature(self, github_username, github_repository, name, current_page):
+        """
+        Return a string that changes whenever the page is written again, or
+        None if it is not saved.
+        """
+        try:
+            stat_result = os.stat(self.get_location(github_username, github_repository, name, current_page))
+        except FileNotFoundError:
+            return None
+        return f"{stat_result.st_size}:{stat_result.st_mtime_ns}"
+
+    def get_page_size(self, github_username, github_repository, name, current_page):
+        """
+        Return the number of bytes the page takes on disk, or None if it is
+        not saved.
+        """
+        try:
+            return os.path.getsize(self.get_location(github_username, github_repository, name, current_page))
+        except FileNotFoundError:
+            return None
+
+    def write_raw_page(self, github_username, github_repository, name, current_page, data):
+        """
+        Write the body of a response and return its items, or None if the
+        body is not valid json.
+        """
+        location = self.get_location(github_username, github_repository, name, current_page)
+        page_items = parse_page(data, location)
+        if page_items is None:
+            return None
+
+        write_json_page(location, page_items, sort_keys=True)
+        return page_items
+
+    def write_page_items(self, github_username, github_repository, name, current_page, page_items, sort_keys=False):
+        write_json_page(self.get_location(github_username, github_repository, name, current_page), page_items, sort_keys)
+
+    def open_page_stream(self, github_username, github_repository, name, current_page, sort_keys=False):
+        """
+        Return a context manager to write the items of a page one at a time.
+        """
+        location = self.get_location(github_username, github_repository, name, current_page)
+        return PrettyJsonPageStream(location, sort_keys)
+
+    def read_page(self, github_username, github_repository, name, current_page):
+        location = self.get_location(github_username, github_repository, name, current_page)
+        if not os.path.exists(location):
+            return None
+        with open(location, 'r') as json_file:
+            return json.load(json_file)
+
+
+def lock_shard(shard_file):
+    """
+    Lock a shard opened for appending until it is closed, and return the
+    offset the next write goes to. Pages of the same endpoint can be written
+    by several threads or worker processes at once (see work_queue).
+    """
+    fcntl.flock(shard_file, fcntl.LOCK_EX)
+    return shard_file.seek(0, os.SEEK_END)
+
+
+class JsonLinesPageStream:
+    """
+    This class compresses the items of a page one at a time straight into
+    a new member (gzip) or frame (zstd) at the end of a shard, and adds the
+    page to the index when it is complete.
+    """
+
+    def __init__(self, writer, github_username, github_repository, name, current_page, sort_keys=False):
+        self.writer = writer
+        self.key = (github_username, github_repository, name, current_page)
+        self.sort_keys = sort_keys
+        self.number_of_items = 0
+        self.shard_name = writer.get_shard_name(github_username, github_repository, name)
+        self.shard_location = f"{writer.get_directory(github_username, github_repository, name)}/{self.shard_name}"
+        self.file = None
+        self.offset = 0
+        self.compressor = None
+
+    def __enter__(self):
+        self.file = open(self.shard_location, 'ab')
+        self.offset = lock_shard(self.file)
+        if self.writer.compression == "zst":
+            self.compressor = zstandard.ZstdCompressor().compressobj()
+        else:
+            # wbits=31 writes a gzip member
+            self.compressor = zlib.compressobj(wbits=31)
+        self.file.write(self.compressor.compress(b"["))
+        return self
+
+    def write_item(self, item):
+        separator = b"" if self.number_of_items == 0 else b","
+        data = json.dumps(item, separators=(',', ':'), sort_keys=self.sort_keys).encode('utf-8')
+        self.file.write(self.compressor.compress(separator + data))
+        self.number_of_items += 1
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.file.write(self.compressor.compress(b"]\n"))
+        self.file.write(self.compressor.flush())
+        length = self.file.tell() - self.offset
+        self.file.close()
+        if exception_type is None:
+            # A member without an index entry is never read
+            self.writer.add_index_entry(*self.key, self.shard_name, self.offset, length, self.number_of_items)
+        return False
+
+
+class JsonLinesShardWriter:
+    """
+    This class appends every page as one line (the json array of the page)
+    to compressed shards, './config/data/{user}_{repo}/{name}/{user}_{repo}_{name}_{shard}.jsonl.gz'.
+    Raw response bodies are written as they came, only their newlines are
+    removed. Every page is its own compressed member (gzip) or frame (zstd),
+    so it can be read back on its own with the offsets of the page index
+    '{user}_{repo}_{name}_index.jsonl'. A page written again is appended and
+    the last index line of a page wins.
+    """
+
+    def __init__(self, data_directory=DATA_DIRECTORY, compression="gz"):
+        if compression == "zst" and zstandard is None:
+            raise ImportError("The 'jsonl.zst' output format needs the 'zstandard' package")
+        self.data_directory = data_directory
+        self.compression = compression
+        # (user, repo, name) -> (size of the index file when read, {page: entry})
+        self.indexes = {}
+
+    def get_directory(self, github_username, github_repository, name):
+        return f"{self.data_directory}/{github_username}_{github_repository}/{name}"
+
+    def get_index_location(self, github_username, github_repository, name):
+        directory = self.get_directory(github_username, github_repository, name)
+        return f"{directory}/{github_username}_{github_repository}_{name}_index.jsonl"
+
+    def get_index(self, github_username, github_repository, name):
+        """
+        Return the page index of an endpoint, reading only the lines
+        appended since it was last read.
+        """
+        key = (github_username, github_repository, name)
+        index_location = self.get_index_location(github_username, github_repository, name)
+        index_size, index = self.indexes.get(key, (0, {}))
+        if not os.path.exists(index_location):
+            return index
+
+        current_size = os.path.getsize(index_location)
+        if current_size != index_size:
+            with open(index_location, 'r') as index_file:
+                index_file.seek(index_size)
+                for line in index_file:
+                    entry = json.loads(line)
+                    index[entry['page']] = entry
+            self.indexes[key] = (current_size, index)
+        return index
+
+    def get_shard_name(self, github_username, github_repository, name):
+        directory = self.get_directory(github_username, github_repository, name)
+        shard_number = 1
+        while True:
+            shard_name = f"{github_username}_{github_repository}_{name}_{shard_number:04d}.jsonl.{self.compression}"
+            shard_location = f"{directory}/{shard_name}"
+            if not os.path.exists(shard_location) or os.path.getsize(shard_location) < SHARD_MAX_BYTES:
+                return shard_name
+            shard_number += 1
+
+    def compress(self, line):
+        if self.compression == "zst":
+            return zstandard.ZstdCompressor().compress(line)
+        return gzip.compress(line)
+
+    def decompress(self, data):
+        if self.compression == "zst":
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def append_page(self, github_username, github_repository, name, current_page, line, number_of_items):
+        directory = self.get_directory(github_username, github_repository, name)
+        shard_name = self.get_shard_name(github_username, github_repository, name)
+        member = self.compress(line + b"\n")
+
+        with open(f"{directory}/{shard_name}", 'ab') as shard_file:
+            offset = lock_shard(shard_file)
+            shard_file.write(member)
+
+        self.add_index_entry(github_username, github_repository, name, current_page, shard_name, offset, len(member), number_of_items)
+
+    def add_index_entry(self, github_username, github_repository, name, current_page, shard_name, offset, length, number_of_items):
+        entry = {
+            'page': current_page,
+            'shard': shard_name,
+            'offset': offset,
+            'length': length,
+            'items': number_of_items,
+        }
+        with open(self.get_index_location(github_username, github_repository, name), 'a') as index_file:
+            index_file.write(json.dumps(entry) + "\n")
+
+    def page_exists(self, github_username, github_repository, name, current_page):
+        return current_page in self.get_index(github_username, github_repository, name)
+
+    def list_pages(self, github_username, github_repository, name):
+        return set(self.get_index(github_username, github_repository, name))
+
+    def get_page_signature(self, github_username, github_repository, name, current_page):
+        entry = self.get_index(github_username, github_repository, name).get(current_page)
+        if entry is None:
+            return None
+        # A page written again is appended somewhere else
+        return f"{entry['shard']}:{entry['offset']}:{entry['length']}"
+
+    def get_page_size(self, github_username, github_repository, name, current_page):
+        # The compressed member of the page
+        entry = self.get_index(github_username, github_repository, name).get(current_page)
+        return None if entry is None else entry['length']
+
+    def write_raw_page(self, github_username, github_repository, name, current_page, data):
+        """
+        Append the body of a response as it came and return its items, or
+        None if the body is not valid json. The body is only parsed for the
+        number of items (json.loads runs in C, the pretty dump is skipped).
+        """
+        location = self.get_directory(github_username, github_repository, name)
+        page_items = parse_page(data, location)
+        if page_items is None:
+            return None
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        # Newlines can only be whitespace between json tokens,
+        # inside strings they are escaped
+        line = data.replace(b"\r", b"").replace(b"\n", b"")
+        self.append_page(github_username, github_repository, name, current_page, line, len(page_items))
+        return page_items
+
+    def write_page_items(self, github_username, github_repository, name, current_page, page_items, sort_keys=False):
+        line = json.dumps(page_items, separators=(',', ':'), sort_keys=sort_keys).encode('utf-8')
+        self.append_page(github_username, github_repository, name, current_page, line, len(page_items))
+
+    def open_page_stream(self, github_username, github_repository, name, current_page, sort_keys=False):
+        """
+        Return a context manager to write the items of a page one at a time.
+        """
+        return JsonLinesPageStream(self, github_username, github_repository, name, current_page, sort_keys)
+
+    def read_page(self, github_username, github_repository, name, current_page):
+        entry = self.get_index(github_username, github_repository, name).get(current_page)
+        if entry is None:
+            return None
+
+        directory = self.get_directory(github_username, github_repository, name)
+        with open(f"{directory}/{entry['shard']}", 'rb') as shard_file:
+            shard_file.seek(entry['offset'])
+            member = shard_file.read(entry['length'])
+        return json.loads(self.decompress(member))
+
+
+def create_output_writer(output_format, data_directory=DATA_DIRECTORY):
+    if output_format == "json":
+        return PrettyJsonWriter(data_directory)
+    if output_format == "jsonl.gz":
+        return JsonLinesShardWriter(data_directory, "gz")
+    if output_format == "jsonl.zst":
+        return JsonLinesShardWriter(data_directory, "zst")
+    if output_format == "dedup":
+        # object_store builds on this module
+        from .object_store import ContentAddressedWriter
+        return ContentAddressedWriter(data_directory)
+    raise ValueError(f"Unknown output format '{output_format}', use one of {OUTPUT_FORMATS}")
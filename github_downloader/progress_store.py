@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+# ------------------------------------------------------------
+# PROGRESS STORE
+# ------------------------------------------------------------
+# SQLite database that keeps the download progress of every repository
+# (the same counters as verification.json). Every update is one small
+# atomic transaction, and WAL mode lets several worker processes read and
+# write it at the same time.
+PROGRESS_DATABASE = "./progress.db"
+# Seconds to wait for another process that holds the write lock
+PROGRESS_DATABASE_TIMEOUT = 60
+
+
+class ProgressStore:
+    """
+    This class stores one value per (repository, key), where the keys are the
+    ones of verification.json ('issues', 'issues_last_page_number',
+    'issues_curr_page_number', ...). Connections are opened lazily per
+    process and thread, so a store can be shared with forked workers.
+    """
+
+    def __init__(self, path=PROGRESS_DATABASE):
+        self.path = path
+        self.local = threading.local()
+
+    def get_connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=PROGRESS_DATABASE_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS progress ("
+                "repo_key TEXT NOT NULL, key TEXT NOT NULL, value, "
+                "PRIMARY KEY (repo_key, key))"
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def get(self, repo_key, key):
+        row = self.get_connection().execute(
+            "SELECT value FROM progress WHERE repo_key = ? AND key = ?", (repo_key, key)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def get_repository(self, repo_key):
+        rows = self.get_connection().execute(
+            "SELECT key, value FROM progress WHERE repo_key = ?", (repo_key,)
+        ).fetchall()
+        return dict(rows)
+
+    def has_repository(self, repo_key):
+        row = self.get_connection().execute(
+            "SELECT 1 FROM progress WHERE repo_key = ? LIMIT 1", (repo_key,)
+        ).fetchone()
+        return row is not None
+
+    def set(self, repo_key, key, value):
+        self.get_connection().execute(
+            "INSERT OR REPLACE INTO progress (repo_key, key, value) VALUES (?, ?, ?)", (repo_key, key, value)
+        )
+
+    def set_defaults(self, repo_key, keys, value=0):
+        """
+        Add the keys that do not exist yet with a default value.
+        """
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR IGNORE INTO progress (repo_key, key, value) VALUES (?, ?, ?)",
+                [(repo_key, key, value) for key in keys]
+            )
+
+    def update_page_progress(self, repo_key, key, current_page, last_page_number, number_of_items):
+        """
+        Add the items of a page to the counter 'key' and store the current and
+        last page numbers, all in one transaction.
+        """
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT INTO progress (repo_key, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (repo_key, key) DO UPDATE SET value = value + excluded.value",
+                (repo_key, key, number_of_items)
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO progress (repo_key, key, value) VALUES (?, ?, ?)",
+                [(repo_key, f"{key}_last_page_number", last_page_number),
+                 (repo_key, f"{key}_curr_page_number", current_page)]
+            )
+
+    def import_verification_json(self, location):
+        """
+        Copy the progress of an existing verification.json into the store.
+        Keys that are already in the store are kept, so importing twice is safe.
+        """
+        if not os.path.exists(location):
+            return 0
+
+        try:
+            with open(location, 'r') as json_file:
+                verification_data = json.load(json_file)
+        except json.JSONDecodeError:
+            logging.warning(f"Could not import '{location}', it is not valid JSON")
+            return 0
+
+        rows = [(repo_key, key, value)
+                for repo_key, values in verification_data.items()
+                for key, value in values.items()]
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("INSERT OR IGNORE INTO progress (repo_key, key, value) VALUES (?, ?, ?)", rows)
+        logging.info(f"Imported {len(rows)} values of {len(verification_data)} repositories from '{location}'")
+        return len(rows)
+
+    def export_verification_json(self, location):
+        """
+        Write the whole store in the verification.json format.
+        """
+        verification_data = {}
+        for repo_key, key, value in self.get_connection().execute(
+                "SELECT repo_key, key, value FROM progress ORDER BY repo_key, rowid"):
+            verification_data.setdefault(repo_key, {})[key] = value
+
+        temporary_location = f"{location}.tmp"
+        with open(temporary_location, 'w') as json_file:
+            json.dump(verification_data, json_file, indent=4)
+        os.replace(temporary_location, location)
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+
+import requests
+
+# ------------------------------------------------------------
+# GITHUB RATE LIMIT BUDGET
+# ------------------------------------------------------------
+# Stop sending requests when only this many calls are left
+RATE_LIMIT_THRESHOLD = 10
+# Extra seconds to wait after the reset time before sending again
+RATE_LIMIT_RESET_MARGIN_SECONDS = 50
+# How long to trust a failed '/rate_limit' call before asking again
+RATE_LIMIT_REFRESH_BACKOFF_SECONDS = 60
+
+
+class RateLimitBudget:
+    """
+    This class keeps a local copy of the GitHub rate limit budget.
+    It is updated from the 'X-RateLimit-*' and 'Retry-After' headers of every
+    data response, so '/rate_limit' is only asked at startup or after a reset.
+    There is one instance per token, shared by every code path (and thread)
+    that sends requests with that token.
+    """
+
+    def __init__(self, rate_limit_url, session, category="core", token=None):
+        self.rate_limit_url = rate_limit_url
+        self.session = session
+        self.category = category
+        # Sent with every request that uses this budget, None keeps the session headers
+        self.headers = {'Authorization': f'Bearer {token}'} if token else None
+        self.limit = None
+        self.remaining = None
+        self.reset_time = 0
+        self.retry_after_until = 0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Ask '/rate_limit' for the current budget and return the json data
+        of the category, or None if the call failed. The request is sent
+        without holding the lock, so the other users of the budget never
+        wait for it.
+        """
+        try:
+            response = self.session.get(self.rate_limit_url, headers=self.headers, timeout=10)
+            response.raise_for_status()
+            category_data = response.json()['resources'][self.category]
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logging.warning(f"Error checking rate limit: {e}")
+            with self.lock:
+                # Allow one request through, its headers will correct the budget
+                if self.remaining is None or self.remaining <= RATE_LIMIT_THRESHOLD:
+                    self.remaining = RATE_LIMIT_THRESHOLD + 1
+                self.reset_time = time.time() + RATE_LIMIT_REFRESH_BACKOFF_SECONDS
+            return None
+
+        with self.lock:
+            self.limit = category_data['limit']
+            self.remaining = category_data['remaining']
+            self.reset_time = category_data['reset']
+        logging.info(f"Rate limit '{self.category}': {category_data['remaining']}/{category_data['limit']}, reset at {category_data['reset']}")
+        return category_data
+
+    def needs_refresh(self):
+        # Unknown, or the window of the local copy is over
+        return self.remaining is None or time.time() >= self.reset_time
+
+    def update_from_headers(self, headers):
+        """
+        Update the budget from the headers of a response.
+        Responses can arrive out of order, so inside one reset window
+        the lowest remaining value wins.
+        """
+        resource = headers.get('X-RateLimit-Resource')
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_time = headers.get('X-RateLimit-Reset')
+        limit = headers.get('X-RateLimit-Limit')
+        retry_after = headers.get('Retry-After')
+
+        with self.lock:
+            if retry_after is not None:
+                try:
+                    self.retry_after_until = max(self.retry_after_until, time.time() + int(retry_after))
+                except ValueError:
+                    logging.warning(f"Could not parse 'Retry-After' header: '{retry_after}'")
+
+            if resource is not None and resource != self.category:
+                return
+            if remaining is None or reset_time is None:
+                return
+
+            try:
+                remaining = int(remaining)
+                reset_time = int(reset_time)
+            except ValueError:
+                logging.warning(f"Could not parse rate limit headers: remaining='{remaining}', reset='{reset_time}'")
+                return
+
+            if limit is not None and limit.isdigit():
+                self.limit = int(limit)
+
+            if self.remaining is None or reset_time > self.reset_time:
+                self.remaining = remaining
+                self.reset_time = reset_time
+            elif reset_time == self.reset_time:
+                self.remaining = min(self.remaining, remaining)
+
+    def pause(self, seconds):
+        """
+        Do not use this token for 'seconds', e.g. after a secondary rate limit.
+        """
+        with self.lock:
+            self.retry_after_until = max(self.retry_after_until, time.time() + seconds)
+
+    def refund(self):
+        """
+        Give back the call reserved for a request that was not counted by GitHub.
+        """
+        with self.lock:
+            if self.remaining is not None:
+                self.remaining += 1
+
+    def try_reserve(self):
+        """
+        Reserve one call from the budget if possible, after asking
+        '/rate_limit' if the budget needs a refresh. Returns 0 on success,
+        otherwise the number of seconds to wait.
+        """
+        if self.needs_refresh():
+            self.refresh()
+        with self.lock:
+            now = time.time()
+            if self.retry_after_until > now:
+                return self.retry_after_until - now
+            if self.remaining <= RATE_LIMIT_THRESHOLD:
+                return max(self.reset_time - now + RATE_LIMIT_RESET_MARGIN_SECONDS, 1)
+            self.remaining -= 1
+            return 0
+
+    def wait_for_budget(self):
+        """
+        Block until a request can be sent, then reserve one call from the budget.
+        """
+        while True:
+            wait_time_limit = self.try_reserve()
+            if wait_time_limit == 0:
+                return self
+
+            logging.warning(f"Rate limit budget exhausted ({self.remaining} left), sleeping for {int(wait_time_limit)} seconds")
+            time.sleep(wait_time_limit)
+
+
+class TokenPool:
+    """
+    This class holds one RateLimitBudget per token. Every request is sent
+    with the token that has the most calls left, and the pool only sleeps
+    when every token is exhausted.
+    """
+
+    def __init__(self, tokens, rate_limit_url, session, category="core"):
+        self.budgets = [RateLimitBudget(rate_limit_url, session, category, token) for token in tokens]
+
+    def refresh(self):
+        return [budget.refresh() for budget in self.budgets]
+
+    def needs_refresh(self):
+        return any(budget.needs_refresh() for budget in self.budgets)
+
+    def try_reserve(self):
+        """
+        Reserve one call from the token with the most calls left. Returns
+        (budget, 0) on success, otherwise (None, the number of seconds until
+        a token can send again). It only blocks if 'needs_refresh()'.
+        """
+        # Unknown budgets first, they need a '/rate_limit' call anyway
+        budgets = sorted(self.budgets, key=lambda budget: float('inf') if budget.remaining is None else budget.remaining, reverse=True)
+
+        wait_time_limit = None
+        for budget in budgets:
+            wait_time = budget.try_reserve()
+            if wait_time == 0:
+                return budget, 0
+            if wait_time_limit is None or wait_time < wait_time_limit:
+                wait_time_limit = wait_time
+        return None, wait_time_limit
+
+    def wait_for_budget(self):
+        """
+        Block until one of the tokens can send a request, reserve one call
+        from its budget and return that budget.
+        """
+        while True:
+            budget, wait_time_limit = self.try_reserve()
+            if budget is not None:
+                return budget
+
+            logging.warning(f"All {len(self.budgets)} tokens are exhausted, sleeping for {int(wait_time_limit)} seconds")
+            time.sleep(wait_time_limit)
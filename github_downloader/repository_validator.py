@@ -0,0 +1,237 @@
+import csv
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# ------------------------------------------------------------
+# REPOSITORY URL VALIDATION
+# ------------------------------------------------------------
+# The urls of the input file are parsed and deduplicated locally, then the
+# repositories that are not in the cache are checked in batches: one
+# GraphQL query per REPOSITORY_BATCH_SIZE repositories, or concurrent HEAD
+# requests to '/repos/{owner}/{repo}' if the query fails.
+REPOSITORY_CACHE = "./config/repository_cache.json"
+# How long a checked repository is trusted before it is checked again
+REPOSITORY_CACHE_SECONDS = 7 * 24 * 3600
+REPOSITORY_BATCH_SIZE = 100
+MAX_HEAD_WORKERS = 8
+
+# GitHub user/organization and repository names
+OWNER_PATTERN = re.compile(r"^[a-z0-9](?:[a-z0-9-]{0,38})$")
+REPOSITORY_PATTERN = re.compile(r"^[a-z0-9._-]{1,100}$")
+
+
+def parse_repository_url(url, web_host="github.com"):
+    """
+    Return the lowercase (owner, repo) of a repository url on 'web_host',
+    or None if it is not one. 'www.', a missing scheme, '.git', a trailing
+    slash and deeper paths ('/issues', '/tree/main', ...) are accepted.
+    """
+    url = url.strip()
+    if not url:
+        return None
+    if "://" not in url:
+        url = f"https://{url}"
+
+    parsed_url = urlparse(url.lower())
+    host = parsed_url.netloc
+    if host.startswith("www."):
+        host = host[len("www."):]
+    if host != web_host.lower():
+        return None
+
+    parts = [part for part in parsed_url.path.split("/") if part]
+    if len(parts) < 2:
+        return None
+    owner, repo = parts[0], parts[1]
+    if repo.endswith(".git"):
+        repo = repo[:-len(".git")]
+    if not OWNER_PATTERN.match(owner) or not REPOSITORY_PATTERN.match(repo) or repo in (".", ".."):
+        return None
+    return owner, repo
+
+
+def read_repository_urls(input_file):
+    urls = []
+    with open(f'{input_file}', 'r') as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        # skip the first row
+        next(csv_reader, None)
+        for row in csv_reader:
+            urls.extend(item for item in row if item.strip())
+    return urls
+
+
+class RepositoryCache:
+    """
+    This class keeps the result of every repository check in a json file,
+    {"owner/repo": {"exists": true, "checked_at": 1700000000}}.
+    """
+
+    def __init__(self, path=REPOSITORY_CACHE, max_age_seconds=REPOSITORY_CACHE_SECONDS):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.entries = None
+
+    def load(self):
+        if self.entries is not None:
+            return self.entries
+        self.entries = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as json_file:
+                    self.entries = json.load(json_file)
+            except (OSError, json.JSONDecodeError):
+                logging.warning(f"Could not read the repository cache '{self.path}', checking every repository again")
+        return self.entries
+
+    def get(self, owner, repo):
+        """
+        Return True or False if the repository was checked recently, otherwise None.
+        """
+        entry = self.load().get(f"{owner}/{repo}")
+        if entry is None or time.time() - entry['checked_at'] > self.max_age_seconds:
+            return None
+        return entry['exists']
+
+    def set(self, owner, repo, exists):
+        self.load()[f"{owner}/{repo}"] = {'exists': exists, 'checked_at': int(time.time())}
+
+    def save(self):
+        if not self.path or self.entries is None:
+            return
+        temporary_location = f"{self.path}.tmp"
+        with open(temporary_location, 'w') as json_file:
+            json.dump(self.entries, json_file, indent=4, sort_keys=True)
+        os.replace(temporary_location, self.path)
+
+
+def build_repositories_query(repositories):
+    aliases = "\n".join(
+        f"  r{index}: repository(owner: {json.dumps(owner)}, name: {json.dumps(repo)}) {{ nameWithOwner }}"
+        for index, (owner, repo) in enumerate(repositories)
+    )
+    return f"query {{\n{aliases}\n}}"
+
+
+class RepositoryValidator:
+    """
+    This class turns the urls of the input file into the list of existing
+    repositories. 'client' sends the REST requests and 'graphql_client' the
+    GraphQL ones (with the 'graphql' rate limit budget).
+    """
+
+    def __init__(self, client, graphql_client, api_url, web_host="github.com", cache=None,
+                 batch_size=REPOSITORY_BATCH_SIZE, head_workers=MAX_HEAD_WORKERS):
+        self.client = client
+        self.graphql_client = graphql_client
+        self.api_url = api_url
+        self.web_host = web_host
+        self.cache = cache or RepositoryCache(None)
+        self.batch_size = batch_size
+        self.head_workers = head_workers
+
+    def check_with_graphql(self, repositories):
+        """
+        Return {(owner, repo): True/False} for the repositories GraphQL could
+        answer, or None if the query failed.
+        """
+        response = self.graphql_client.post(f"{self.api_url}/graphql", {'query': build_repositories_query(repositories)}, max_retries=1)
+        if response is None or response.status_code != 200:
+            logging.warning(f"GraphQL check of {len(repositories)} repositories failed: {None if response is None else response.status_code}")
+            return None
+        try:
+            result = response.json()
+        except ValueError:
+            return None
+
+        data = result.get('data') or {}
+        not_found = set()
+        for error in result.get('errors') or []:
+            if error.get('type') == 'NOT_FOUND' and error.get('path'):
+                not_found.add(error['path'][0])
+
+        exists = {}
+        for index, repository in enumerate(repositories):
+            alias = f"r{index}"
+            if data.get(alias):
+                exists[repository] = True
+            elif alias in not_found:
+                exists[repository] = False
+        return exists
+
+    def check_with_head(self, repository):
+        """
+        Return True/False for a repository, or None if it could not be checked.
+        """
+        owner, repo = repository
+        response = self.client.request("HEAD", f"{self.api_url}/repos/{owner}/{repo}", max_retries=1)
+        if response is None:
+            return None
+        if response.status_code == 200:
+            return True
+        if response.status_code in (404, 410, 451):
+            return False
+        return None
+
+    def check_repositories(self, repositories):
+        """
+        Return {(owner, repo): True/False/None} for the repositories, in
+        batches. None means the repository could not be checked.
+        """
+        exists = {}
+        for start in range(0, len(repositories), self.batch_size):
+            batch = repositories[start:start + self.batch_size]
+            exists.update(self.check_with_graphql(batch) or {})
+            unchecked = [repository for repository in batch if repository not in exists]
+            if unchecked:
+                with ThreadPoolExecutor(max_workers=self.head_workers) as executor:
+                    exists.update(zip(unchecked, executor.map(self.check_with_head, unchecked)))
+        return exists
+
+    def validate(self, urls):
+        """
+        Return the [owner, repo] of the repositories of 'urls', each
+        repository once in the order of the urls, and the urls that are not
+        valid or whose repository does not exist. A repository that could
+        not be checked is kept, its download finds out whether it exists.
+        """
+        repositories = []
+        seen_repositories = set()
+        unverified_list = []
+        for url in urls:
+            repository = parse_repository_url(url, self.web_host)
+            if repository is None:
+                logging.warning(f"INVALID URL: '{url}'")
+                unverified_list.append(url)
+            elif repository in seen_repositories:
+                logging.info(f"DUPLICATE URL: '{url}'")
+            else:
+                seen_repositories.add(repository)
+                repositories.append(repository)
+
+        exists = {repository: self.cache.get(*repository) for repository in repositories}
+        unchecked = [repository for repository, repository_exists in exists.items() if repository_exists is None]
+        logging.info(f"{len(repositories)} repositories, {len(repositories) - len(unchecked)} of them cached, checking {len(unchecked)}")
+        for repository, repository_exists in self.check_repositories(unchecked).items():
+            exists[repository] = repository_exists
+            if repository_exists is not None:
+                self.cache.set(*repository, repository_exists)
+        self.cache.save()
+
+        verified_list = []
+        for repository in repositories:
+            if exists[repository] is False:
+                logging.warning(f"INVALID URL: '{repository[0]}/{repository[1]}' does not exist")
+                unverified_list.append(f"{repository[0]}/{repository[1]}")
+                continue
+            if exists[repository] is None:
+                logging.warning(f"UNCHECKED URL: '{repository[0]}/{repository[1]}' could not be checked, downloading it anyway")
+            else:
+                logging.info(f"VALID URL: '{repository[0]}/{repository[1]}'")
+            verified_list.append(list(repository))
+        return verified_list, unverified_list
@@ -0,0 +1,75 @@
+import logging
+
+# ------------------------------------------------------------
+# RESUME PLANNER
+# ------------------------------------------------------------
+# Works out which pages of an endpoint still have to be downloaded from
+# one listing of the saved pages and the progress store, instead of
+# checking every page file on its own.
+
+
+class ResumePlan:
+    """
+    This class holds the pages of an endpoint that are missing, and the
+    response of the page 1 probe that found the last page number, so
+    page 1 does not have to be requested again.
+    """
+
+    def __init__(self, first_page_response, last_page_number, missing_pages):
+        self.first_page_response = first_page_response
+        self.last_page_number = last_page_number
+        self.missing_pages = missing_pages
+
+    def is_complete(self):
+        return not self.missing_pages
+
+
+def get_missing_pages(saved_pages, last_page_number, first_page=1):
+    """
+    Return every page from 'first_page' to 'last_page_number' that is not
+    in 'saved_pages', including the gaps between saved pages.
+    """
+    return [page for page in range(first_page, last_page_number + 1) if page not in saved_pages]
+
+
+def get_contiguous_page_number(missing_pages, last_page_number):
+    """
+    Return the page before the first of 'missing_pages' (or the last page
+    if none is missing). It is the current page stored in the progress
+    store: every page up to it is saved, so a plan that trusts it never
+    skips a page that failed.
+    """
+    return min(missing_pages, default=last_page_number + 1) - 1
+
+
+class ResumePlanner:
+    """
+    This class plans the download of an endpoint from the page numbers
+    listed by the output writer and the counters of the progress store.
+    """
+
+    def __init__(self, output_writer, progress_store):
+        self.output_writer = output_writer
+        self.progress_store = progress_store
+
+    def get_missing_pages(self, github_username, github_repository, name, last_page_number, first_page=1):
+        saved_pages = self.output_writer.list_pages(github_username, github_repository, name)
+        return get_missing_pages(saved_pages, last_page_number, first_page)
+
+    def plan(self, github_username, github_repository, name, first_page_response, last_page_number, trust_progress=False):
+        """
+        Return the ResumePlan of an endpoint. With 'trust_progress', an
+        endpoint whose stored current page reached the last page is complete
+        without listing its pages (the stored current page only moves over
+        contiguous saved pages, see get_contiguous_page_number).
+        """
+        user_repo_key = f"{github_username}_{github_repository}"
+        current_page_number = self.progress_store.get(user_repo_key, f"{name}_curr_page_number")
+        if trust_progress and current_page_number is not None and current_page_number >= last_page_number:
+            logging.info(f"{name}_curr_page_number ({current_page_number}) == {name}_last_page_number ({last_page_number}) for {user_repo_key}")
+            return ResumePlan(first_page_response, last_page_number, [])
+
+        missing_pages = self.get_missing_pages(github_username, github_repository, name, last_page_number)
+        if missing_pages:
+            logging.info(f"{len(missing_pages)} of {last_page_number} '{name}' pages are missing for {user_repo_key}, first: {missing_pages[0]}")
+        return ResumePlan(first_page_response, last_page_number, missing_pages)
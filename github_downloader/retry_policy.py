@@ -0,0 +1,261 @@
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+
+# ------------------------------------------------------------
+# RETRY POLICY
+# ------------------------------------------------------------
+# Every response is classified before it is retried:
+#   permanent     404, 410, 422, ... asking again gives the same answer
+#   retryable     5xx, 408, timeouts, retried with jittered exponential backoff
+#   rate limited  403/429 with 'Retry-After', 'X-RateLimit-Remaining: 0' or a
+#                 secondary rate limit message, retried after the wait GitHub asks for
+# A circuit breaker per repository stops sending requests for a while once
+# a repository keeps failing, so one broken repository does not hold up the
+# workers that download the others.
+SUCCESS = "success"
+PERMANENT = "permanent"
+RETRYABLE = "retryable"
+RATE_LIMITED = "rate_limited"
+
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1
+BACKOFF_MAX_SECONDS = 60
+# Rate limited attempts do not count as retries, but only this many are made
+MAX_RATE_LIMITED_RETRIES = 10
+# GitHub asks to wait at least a minute after a secondary rate limit without 'Retry-After'
+SECONDARY_RATE_LIMIT_WAIT_SECONDS = 60
+# Consecutive failed attempts of a repository that open its circuit
+CIRCUIT_BREAKER_THRESHOLD = 8
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = 120
+
+RETRYABLE_STATUS_CODES = {202, 408, 500, 502, 503, 504}
+REPOSITORY_URL = re.compile(r"/repos/([^/?]+)/([^/?]+)")
+
+
+def get_retry_after_seconds(response):
+    """
+    Return the seconds of the 'Retry-After' header (a number or an HTTP
+    date), or None if there is none.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    if retry_after.strip().isdigit():
+        return int(retry_after)
+    try:
+        return max(email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        logging.warning(f"Could not parse 'Retry-After' header: '{retry_after}'")
+        return None
+
+
+def is_rate_limited(response):
+    if response.status_code not in (403, 429):
+        return False
+    if response.status_code == 429 or 'Retry-After' in response.headers:
+        return True
+    if response.headers.get('X-RateLimit-Remaining') == "0":
+        return True
+    # Secondary rate limits come with a 403 and a message, the headers look normal
+    return "rate limit" in response.text.lower()
+
+
+def classify_response(response):
+    """
+    Return SUCCESS, PERMANENT, RETRYABLE or RATE_LIMITED for a response.
+    """
+    status_code = response.status_code
+    if status_code == 200 or status_code == 304:
+        return SUCCESS
+    if is_rate_limited(response):
+        return RATE_LIMITED
+    if status_code in RETRYABLE_STATUS_CODES or status_code >= 500:
+        return RETRYABLE
+    return PERMANENT
+
+
+def is_permanent_error(response):
+    """
+    Return True for an error response that asking again will not change
+    (404, 410, 422, ...).
+    """
+    return response is not None and classify_response(response) == PERMANENT
+
+
+def get_repository_key(url):
+    match = REPOSITORY_URL.search(url)
+    return None if match is None else f"{match.group(1).lower()}/{match.group(2).lower()}"
+
+
+class CircuitBreaker:
+    """
+    This class counts the consecutive failed attempts of every repository.
+    After 'threshold' of them the circuit of the repository opens and its
+    requests fail at once for 'cooldown_seconds'. Then one request is let
+    through: a success closes the circuit, a failure opens it again.
+    """
+
+    def __init__(self, threshold=CIRCUIT_BREAKER_THRESHOLD, cooldown_seconds=CIRCUIT_BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown_seconds = cooldown_seconds
+        # repository -> number of consecutive failures
+        self.failures = {}
+        # repository -> time until which the circuit is open
+        self.open_until = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        if key is None:
+            return True
+        with self.lock:
+            open_until = self.open_until.get(key)
+            if open_until is None:
+                return True
+            if time.time() < open_until:
+                return False
+            # Half open: let this request through, the others wait for its outcome
+            self.open_until[key] = time.time() + self.cooldown_seconds
+            return True
+
+    def record_success(self, key):
+        if key is None:
+            return
+        with self.lock:
+            self.failures.pop(key, None)
+            if self.open_until.pop(key, None) is not None:
+                logging.info(f"Circuit of '{key}' closed")
+
+    def record_failure(self, key):
+        if key is None:
+            return
+        with self.lock:
+            failures = self.failures.get(key, 0) + 1
+            self.failures[key] = failures
+            if failures >= self.threshold:
+                self.open_until[key] = time.time() + self.cooldown_seconds
+                logging.warning(f"'{key}' failed {failures} times in a row, not sending its requests for {self.cooldown_seconds} seconds")
+
+
+class RetryPolicy:
+    """
+    This class decides whether and when a request is sent again.
+    """
+
+    def __init__(self, max_retries=MAX_RETRIES, backoff_base_seconds=BACKOFF_BASE_SECONDS,
+                 backoff_max_seconds=BACKOFF_MAX_SECONDS, max_rate_limited_retries=MAX_RATE_LIMITED_RETRIES,
+                 circuit_breaker=None):
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.max_rate_limited_retries = max_rate_limited_retries
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def get_backoff_seconds(self, attempt):
+        """
+        Full jitter: a random wait between 0 and base * 2^attempt (capped),
+        so the workers that failed together do not retry together.
+        """
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+
+    def get_rate_limit_wait_seconds(self, response):
+        """
+        Return how long to wait after a rate limited response: 'Retry-After',
+        else until 'X-RateLimit-Reset' for an exhausted primary limit, else
+        the secondary rate limit default.
+        """
+        retry_after = get_retry_after_seconds(response)
+        if retry_after is not None:
+            return retry_after
+        reset_time = response.headers.get('X-RateLimit-Reset')
+        if response.headers.get('X-RateLimit-Remaining') == "0" and reset_time is not None and reset_time.isdigit():
+            return max(int(reset_time) - time.time(), 1)
+        return SECONDARY_RATE_LIMIT_WAIT_SECONDS
+
+
+class RetryState:
+    """
+    This class makes the decisions of the retry loop of one request, so
+    GitHubClient and AsyncGitHubClient only send the attempts and wait as
+    it says: 'start_attempt()' tells whether an attempt may be sent and
+    'record_attempt()' what to do after it.
+    """
+
+    def __init__(self, retry_policy, url, metrics, max_retries=None):
+        self.retry_policy = retry_policy
+        self.url = url
+        self.metrics = metrics
+        self.max_retries = retry_policy.max_retries if max_retries is None else max_retries
+        self.repository_key = get_repository_key(url)
+        self.attempt = 0
+        self.rate_limited_attempts = 0
+        # The last response that arrived, the result of the request
+        self.response = None
+        self.finished = False
+
+    def start_attempt(self):
+        """
+        Return True if another attempt may be sent, False once the request
+        is finished, out of retries or its repository's circuit is open.
+        """
+        if self.finished or self.attempt >= self.max_retries:
+            return False
+        if not self.retry_policy.circuit_breaker.allow(self.repository_key):
+            logging.warning(f"Circuit of '{self.repository_key}' is open, skipping {self.url}")
+            self.metrics.add("circuit_open_skips", self.repository_key)
+            return False
+        if self.attempt > 0:
+            self.metrics.add_retry(self.url)
+        return True
+
+    def record_attempt(self, response, reason, budget=None):
+        """
+        Record the response of an attempt (None if none arrived, 'reason'
+        says why) and return how many seconds to wait before the next one,
+        or None when the request is finished. A rate limited attempt pauses
+        the token of 'budget' and the next one is sent at once with another
+        token; without a budget the next one waits.
+        """
+        retry_policy = self.retry_policy
+        circuit_breaker = retry_policy.circuit_breaker
+        if response is not None:
+            self.response = response
+        outcome = RETRYABLE if response is None else classify_response(response)
+
+        if outcome == SUCCESS or outcome == PERMANENT:
+            # A permanent error still means the repository answers
+            circuit_breaker.record_success(self.repository_key)
+            if outcome == PERMANENT:
+                logging.warning(f"Status: {response.status_code} for {self.url} is permanent, not retrying")
+            self.finished = True
+            return None
+
+        if outcome == RATE_LIMITED:
+            self.rate_limited_attempts += 1
+            if self.rate_limited_attempts > retry_policy.max_rate_limited_retries:
+                self.finished = True
+                return None
+            wait_time_limit = retry_policy.get_rate_limit_wait_seconds(response)
+            if budget is not None:
+                # Only this token waits, the next attempt takes another one if it can
+                budget.pause(wait_time_limit)
+                logging.warning(f"Rate limited ({reason}) for {self.url}, token paused for {int(wait_time_limit)} seconds")
+                return 0
+            self.log_retry(f"Rate limited ({reason})", wait_time_limit)
+            self.metrics.add("rate_limit_wait_seconds", "unbudgeted", wait_time_limit)
+            return wait_time_limit
+
+        circuit_breaker.record_failure(self.repository_key)
+        self.attempt += 1
+        if self.attempt >= self.max_retries:
+            self.finished = True
+            return None
+        wait_time_limit = retry_policy.get_backoff_seconds(self.attempt - 1)
+        self.log_retry(reason, wait_time_limit)
+        return wait_time_limit
+
+    def log_retry(self, reason, wait_time_limit):
+        logging.warning(f"{reason}. Retrying in {wait_time_limit:.1f} seconds... (Attempt {self.attempt + 1}/{self.max_retries})")
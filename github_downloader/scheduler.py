@@ -0,0 +1,124 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+# ------------------------------------------------------------
+# MULTI REPOSITORY SCHEDULER
+# ------------------------------------------------------------
+# Number of worker processes, 1 runs every job in this process
+MAX_REPO_WORKERS = 1
+# Do not start a new job while all tokens together have fewer calls left
+SCHEDULER_MIN_BUDGET = 100
+# Extra seconds to wait after the earliest reset time
+SCHEDULER_RESET_MARGIN_SECONDS = 50
+
+
+def order_jobs_fairly(jobs):
+    """
+    This function interleaves the (user, repo, endpoint) jobs of the
+    repositories round-robin, so one huge repository does not hold up all
+    the small ones behind it.
+    """
+    jobs_per_repo = {}
+    for job in jobs:
+        jobs_per_repo.setdefault((job[0], job[1]), []).append(job)
+
+    ordered_jobs = []
+    round_number = 0
+    while len(ordered_jobs) < len(jobs):
+        for repo_jobs in jobs_per_repo.values():
+            if round_number < len(repo_jobs):
+                ordered_jobs.append(repo_jobs[round_number])
+        round_number += 1
+    return ordered_jobs
+
+
+def wait_for_dispatch_budget(token_pool, min_budget=SCHEDULER_MIN_BUDGET):
+    """
+    This function blocks until the tokens together have at least
+    'min_budget' calls left. The workers spend the budget in their own
+    processes, so it is read again from '/rate_limit' (which is free).
+    """
+    while True:
+        token_pool.refresh()
+        remaining = sum(budget.remaining or 0 for budget in token_pool.budgets)
+        if remaining >= min_budget:
+            return
+
+        wait_time_limit = min(budget.reset_time for budget in token_pool.budgets) - time.time() + SCHEDULER_RESET_MARGIN_SECONDS
+        wait_time_limit = max(wait_time_limit, 1)
+        logging.warning(f"Only {remaining} calls left on all tokens, not starting new jobs for {int(wait_time_limit)} seconds")
+        time.sleep(wait_time_limit)
+
+
+def run_job(job_function, job):
+    try:
+        return job, True, job_function(*job)
+    except Exception:
+        logging.exception(f"Job {job} failed")
+        return job, False, None
+
+
+def report_job_result(job, succeeded, result, result_callback=None):
+    if result_callback is not None and result is not None:
+        result_callback(result)
+    # A failed job was logged with its traceback by run_job
+    if succeeded:
+        logging.info(f"Finished job {job}")
+
+
+def report_finished_jobs(futures, result_callback=None):
+    for future in futures:
+        report_job_result(*future.result(), result_callback)
+
+
+def run_jobs(jobs, job_function, token_pool, workers=MAX_REPO_WORKERS, initializer=None, result_callback=None):
+    """
+    This function runs 'job_function(user, repo, endpoint)' for every job.
+    With more than one worker the jobs are spread over worker processes,
+    at most 'workers' at a time, and a new job is only started when the
+    tokens have budget left. 'initializer' runs once in every worker.
+    'result_callback' gets the return value of every job that returned one,
+    in this process.
+    """
+    jobs = order_jobs_fairly(jobs)
+
+    if workers <= 1:
+        for job in jobs:
+            report_job_result(*run_job(job_function, job), result_callback)
+        return
+
+    # Workers are forked so they share the loaded configuration
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer) as executor:
+        pending = set()
+        for job in jobs:
+            while len(pending) >= workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                report_finished_jobs(finished, result_callback)
+            wait_for_dispatch_budget(token_pool)
+            logging.info(f"Starting job {job}")
+            pending.add(executor.submit(run_job, job_function, job))
+
+        finished, pending = wait(pending)
+        report_finished_jobs(finished, result_callback)
+
+
+def run_workers(worker_function, workers, initializer=None, result_callback=None):
+    """
+    This function runs 'worker_function()' once in each of 'workers' worker
+    processes, e.g. to drain a work queue together. 'result_callback' gets
+    the return value of every worker that returned one, in this process.
+    """
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer) as executor:
+        futures = [executor.submit(worker_function) for _ in range(workers)]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                logging.exception("Worker failed")
+                continue
+            if result_callback is not None and result is not None:
+                result_callback(result)
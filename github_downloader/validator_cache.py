@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+
+# ------------------------------------------------------------
+# RESPONSE VALIDATOR CACHE
+# ------------------------------------------------------------
+# The ETag / Last-Modified of every saved page is stored next to the
+# page file ('<page>.etag'), so later runs can send conditional requests.
+# GitHub answers '304 Not Modified' for unchanged pages and 304s do not
+# count against the rate limit.
+
+VALIDATOR_FILE_EXTENSION = ".etag"
+
+
+def get_validator_location(location):
+    return os.path.splitext(location)[0] + VALIDATOR_FILE_EXTENSION
+
+
+def load_validators(url, location, page_saved):
+    """
+    This function returns the stored validators of the page saved at
+    'location' if they were stored for the same url and the page is
+    still saved, otherwise an empty dictionary.
+    """
+    validator_location = get_validator_location(location)
+    if not page_saved or not os.path.exists(validator_location):
+        return {}
+
+    try:
+        with open(validator_location, 'r') as json_file:
+            validators = json.load(json_file)
+    except (OSError, json.JSONDecodeError):
+        logging.warning(f"Could not read the validators: '{validator_location}'")
+        return {}
+
+    if validators.get('url') != url:
+        return {}
+    return validators
+
+
+def get_conditional_headers(validators):
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    elif validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def save_validators(url, location, response, number_of_items, last_page_number=None):
+    """
+    This function stores the validators of a response next to the page
+    file, together with the number of items of the page and, for page 1,
+    the last page number of the endpoint.
+    """
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag is None and last_modified is None:
+        return
+
+    validators = {
+        'url': url,
+        'etag': etag,
+        'last_modified': last_modified,
+        'items': number_of_items,
+        'last_page_number': last_page_number,
+    }
+    with open(get_validator_location(location), 'w') as json_file:
+        json.dump(validators, json_file)
@@ -0,0 +1,493 @@
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# ------------------------------------------------------------
+# PERSISTENT WORK QUEUE
+# ------------------------------------------------------------
+# SQLite queue of the work of a download, so a crash or a restart resumes at
+# the task it stopped at instead of the start of a page:
+#   endpoint  probe page 1 and add a page task for every missing page
+#   page      download and save one page, for 'issues' keep the page in a
+#             result file and add an issue task per issue
+#   issue     fetch the comments and events of one issue into result files
+# A task with children waits until they are all done, then it is leased
+# again to finish: the issue threads of a page are written in the order of
+# the issues, then the page itself, the endpoint records its high-water
+# mark. The results are files next to the database, the queue only stores
+# their paths and deletes them once the parent is done. Tasks are leased
+# for a while, a worker that dies loses its leases and another worker (or
+# the next run) takes the tasks over. Several processes can drain the same queue.
+#   python -m github_downloader.work_queue stats
+WORK_QUEUE_DATABASE = "./config/work_queue.db"
+# Seconds to wait for another process that holds the write lock
+WORK_QUEUE_DATABASE_TIMEOUT = 60
+# A lease is renewed every third of this while the worker is alive
+LEASE_SECONDS = 300
+# Attempts of a task before it is marked failed, failed tasks are retried on the next run
+MAX_TASK_ATTEMPTS = 5
+TASK_RETRY_BASE_SECONDS = 5
+TASK_RETRY_MAX_SECONDS = 300
+# Longest sleep of a worker that waits for the tasks leased by other workers.
+# The workers forked from the process that created the queue are woken as
+# soon as a task finishes, only other processes wait this long
+QUEUE_POLL_SECONDS = 5
+
+ENDPOINT_TASK = "endpoint"
+PAGE_TASK = "page"
+ISSUE_TASK = "issue"
+# Endpoint tasks first, they plan the pages the priorities are about, then the
+# issues of the pages that were started, then new pages
+TASK_RANKS = {ENDPOINT_TASK: 0, ISSUE_TASK: 1, PAGE_TASK: 2}
+
+PENDING = "pending"
+LEASED = "leased"
+WAITING = "waiting"
+DONE = "done"
+# A page that got a permanent error: its endpoint can finish, but the
+# stored current page does not move past it
+SKIPPED = "skipped"
+FAILED = "failed"
+
+TASK_COLUMNS = ("task_id", "parent_id", "kind", "stage", "user", "repo", "github_endpoint", "page", "position",
+                "last_page_number", "priority", "data", "attempts", "result")
+
+
+def get_page_priority(queue_priority, current_page, last_page_number):
+    """
+    Return the priority of a page task, lower runs first. GitHub lists the
+    newest items first, so page 1 is the newest page. With
+    "small-endpoints-first" the pages of the endpoints with the fewest
+    pages run first, each endpoint newest first.
+    """
+    if queue_priority == "oldest-first":
+        return last_page_number - current_page
+    if queue_priority == "small-endpoints-first":
+        return last_page_number
+    return current_page
+
+
+def get_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_dead_local_worker(worker_id):
+    """
+    Return True if 'worker_id' is a process of this host that is not running.
+    """
+    host, _, pid = worker_id.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class Task:
+    """
+    This class is one leased row of the queue.
+    """
+
+    def __init__(self, row):
+        for column, value in zip(TASK_COLUMNS, row):
+            setattr(self, column, value)
+        self.data = None if self.data is None else json.loads(self.data)
+        # The result files the task kept for itself while it waited for its children
+        self.result = None if self.result is None else json.loads(self.result)
+
+    def __repr__(self):
+        return f"Task({self.kind} {self.stage} {self.user}/{self.repo} {self.github_endpoint} page {self.page} #{self.position})"
+
+
+def read_result_file(path):
+    """
+    This function yields the json lines of a result file, the file is only
+    open while they are read.
+    """
+    with open(path, 'r') as result_file:
+        yield from result_file
+
+
+def remove_result_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class QueueChanges:
+    """
+    This class wakes the workers that wait for the queue when a task
+    finishes. It is shared with the worker processes forked after it was
+    created, a counter of the changes tells a waiter whether it missed one.
+    Unlike multiprocessing.Condition, notify() never waits for the woken
+    workers to run, so the threads that finish tasks are not held up.
+    """
+
+    def __init__(self):
+        self.lock = multiprocessing.Lock()
+        self.wakeups = multiprocessing.Semaphore(0)
+        # The number of changes and the number of waiting workers
+        self.counters = multiprocessing.RawArray('Q', 2)
+
+    def get_count(self):
+        return self.counters[0]
+
+    def notify(self):
+        with self.lock:
+            self.counters[0] += 1
+            waiters = self.counters[1]
+            self.counters[1] = 0
+        for _ in range(waiters):
+            self.wakeups.release()
+
+    def wait(self, count, timeout):
+        """
+        Wait until the queue changed after 'count' was read, or 'timeout'.
+        """
+        with self.lock:
+            if self.counters[0] != count:
+                return
+            self.counters[1] += 1
+        if not self.wakeups.acquire(timeout=timeout):
+            with self.lock:
+                if self.counters[0] == count:
+                    # No notify() counted this worker, it stops waiting
+                    self.counters[1] -= 1
+            # Otherwise its wake up is left for the next waiter, which only
+            # checks the queue once more
+
+
+class WorkQueue:
+    """
+    This class stores the tasks of the queue. Every change is one small
+    transaction, so the queue is consistent whenever a worker stops.
+    Connections are opened lazily per process and thread, like the progress
+    store. The results of the tasks are files of 'result_directory'.
+    """
+
+    def __init__(self, path=WORK_QUEUE_DATABASE, lease_seconds=LEASE_SECONDS, result_directory=None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.result_directory = result_directory or f"{os.path.splitext(path)[0]}_results"
+        self.local = threading.local()
+        self.changes = QueueChanges()
+
+    def get_connection(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=WORK_QUEUE_DATABASE_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "task_id INTEGER PRIMARY KEY, parent_id INTEGER, kind TEXT NOT NULL, stage TEXT NOT NULL DEFAULT 'run', "
+                "user TEXT NOT NULL, repo TEXT NOT NULL, github_endpoint TEXT NOT NULL, "
+                "page INTEGER NOT NULL DEFAULT 0, position INTEGER NOT NULL DEFAULT 0, last_page_number INTEGER, "
+                "rank INTEGER NOT NULL, priority INTEGER NOT NULL DEFAULT 0, data TEXT, "
+                "state TEXT NOT NULL DEFAULT 'pending', lease_owner TEXT, lease_expires REAL, "
+                "available_at REAL NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, "
+                "UNIQUE (kind, user, repo, github_endpoint, page, position))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS tasks_order ON tasks (state, rank, priority, page, position, task_id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS tasks_parent ON tasks (parent_id, state)")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def add_jobs(self, jobs):
+        """
+        Add an endpoint task for every (user, repo, endpoint) job. The tasks
+        of an unfinished earlier run are kept, so it resumes where it
+        stopped. A job that was done is planned again (its pages are saved,
+        only new pages are downloaded), and failed tasks get new attempts.
+        """
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for user, repo, github_endpoint in jobs:
+                row = connection.execute(
+                    "SELECT task_id, state FROM tasks WHERE kind = ? AND user = ? AND repo = ? AND github_endpoint = ? AND page = 0 AND position = 0",
+                    (ENDPOINT_TASK, user, repo, github_endpoint)
+                ).fetchone()
+                if row is None:
+                    connection.execute(
+                        "INSERT INTO tasks (kind, user, repo, github_endpoint, rank) VALUES (?, ?, ?, ?, ?)",
+                        (ENDPOINT_TASK, user, repo, github_endpoint, TASK_RANKS[ENDPOINT_TASK])
+                    )
+                elif row[1] == DONE:
+                    self._delete_children(connection, row[0])
+                    connection.execute(
+                        "UPDATE tasks SET state = ?, stage = 'run', attempts = 0, available_at = 0 WHERE task_id = ?", (PENDING, row[0])
+                    )
+            connection.execute("UPDATE tasks SET state = ?, attempts = 0, available_at = 0 WHERE state = ?", (PENDING, FAILED))
+            # The leases of a run that crashed on this host do not have to expire first
+            for worker_id, in connection.execute("SELECT DISTINCT lease_owner FROM tasks WHERE state = ?", (LEASED,)).fetchall():
+                if is_dead_local_worker(worker_id):
+                    connection.execute("UPDATE tasks SET state = ?, lease_owner = NULL WHERE state = ? AND lease_owner = ?",
+                                       (PENDING, LEASED, worker_id))
+                    logging.info(f"Released the leases of the stopped worker '{worker_id}'")
+        self.changes.notify()
+
+    def _delete_children(self, connection, task_id):
+        page_task_ids = [row[0] for row in connection.execute("SELECT task_id FROM tasks WHERE parent_id = ?", (task_id,))]
+        for page_task_id in page_task_ids:
+            connection.execute("DELETE FROM tasks WHERE parent_id = ?", (page_task_id,))
+        connection.execute("DELETE FROM tasks WHERE parent_id = ?", (task_id,))
+
+    def lease(self, worker_id, limit=1):
+        """
+        Lease up to 'limit' tasks that are ready, the tasks of expired
+        leases included, in the order of their rank and priority.
+        """
+        now = time.time()
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            expired = connection.execute(
+                "UPDATE tasks SET state = ?, lease_owner = NULL WHERE state = ? AND lease_expires < ?", (PENDING, LEASED, now)
+            ).rowcount
+            if expired:
+                logging.warning(f"{expired} leases of the work queue expired, their tasks are run again")
+            rows = connection.execute(
+                f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE state = ? AND available_at <= ? "
+                "ORDER BY rank, priority, page, position, task_id LIMIT ?", (PENDING, now, limit)
+            ).fetchall()
+            connection.executemany(
+                "UPDATE tasks SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE task_id = ?",
+                [(LEASED, worker_id, now + self.lease_seconds, row[0]) for row in rows]
+            )
+        tasks = [Task(row) for row in rows]
+        for task in tasks:
+            task.attempts += 1
+        return tasks
+
+    def renew_leases(self, worker_id):
+        self.get_connection().execute(
+            "UPDATE tasks SET lease_expires = ? WHERE state = ? AND lease_owner = ?", (time.time() + self.lease_seconds, LEASED, worker_id)
+        )
+
+    @contextlib.contextmanager
+    def keep_leases(self, worker_id):
+        """
+        Renew the leases of 'worker_id' from a background thread while the
+        body runs, so a long task (a huge issue thread, the bulk download)
+        is not taken over by another worker.
+        """
+        stopped = threading.Event()
+
+        def renew():
+            while not stopped.wait(self.lease_seconds / 3):
+                self.renew_leases(worker_id)
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def spool_result(self, task, name, items):
+        """
+        Write 'items' as json lines to a new result file of a task and return
+        its path, complete() stores it. Every lease of a task is a new
+        attempt, so a worker that lost its lease never writes into the file
+        of the worker that took the task over.
+        """
+        os.makedirs(self.result_directory, exist_ok=True)
+        path = os.path.join(self.result_directory, f"{task.task_id}_{task.attempts}_{os.getpid()}_{name}.jsonl")
+        try:
+            with open(path, 'w') as result_file:
+                for item in items:
+                    result_file.write(json.dumps(item) + "\n")
+        except BaseException:
+            remove_result_files([path])
+            raise
+        return path
+
+    def complete(self, task, worker_id, result_paths=None, skipped=False):
+        """
+        Mark a leased task done (or SKIPPED) and store the paths of its
+        result files. When it is the last child of its parent, the parent is
+        queued again to finish. Returns False if the lease was lost to
+        another worker, its result files are deleted then.
+        """
+        result = None if result_paths is None else json.dumps(result_paths)
+        connection = self.get_connection()
+        try:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                completed = connection.execute(
+                    "UPDATE tasks SET state = ?, lease_owner = NULL, result = ? WHERE task_id = ? AND state = ? AND lease_owner = ?",
+                    (SKIPPED if skipped else DONE, result, task.task_id, LEASED, worker_id)
+                ).rowcount
+                if not completed:
+                    logging.warning(f"Lost the lease of {task}, its result is dropped")
+                    remove_result_files(result_paths or [])
+                    return False
+                # The results of the children are written, they are not needed anymore
+                child_results = connection.execute(
+                    "SELECT result FROM tasks WHERE parent_id = ? AND result IS NOT NULL", (task.task_id,)
+                ).fetchall()
+                connection.execute("UPDATE tasks SET result = NULL WHERE parent_id = ?", (task.task_id,))
+                if task.parent_id is not None:
+                    unfinished_child = connection.execute(
+                        "SELECT 1 FROM tasks WHERE parent_id = ? AND state NOT IN (?, ?) LIMIT 1", (task.parent_id, DONE, SKIPPED)
+                    ).fetchone()
+                    if unfinished_child is None:
+                        connection.execute(
+                            "UPDATE tasks SET state = ?, stage = 'finish', attempts = 0, available_at = 0 WHERE task_id = ? AND state = ?",
+                            (PENDING, task.parent_id, WAITING)
+                        )
+        finally:
+            self.changes.notify()
+        for child_result, in child_results:
+            remove_result_files(json.loads(child_result))
+        return True
+
+    def wait_for_children(self, task, worker_id, children, result_paths=None):
+        """
+        Add the children of a leased task and let it wait for them, in one
+        transaction. 'children' are dicts with the kind, page, position,
+        last_page_number, priority and data of every child. A task added
+        again (by a task that was run twice) is kept as it is. The paths of
+        the result files of the task are stored too, the task reads them
+        from 'Task.result' when it finishes.
+        """
+        if not children:
+            return self.complete(task, worker_id, result_paths)
+
+        result = None if result_paths is None else json.dumps(result_paths)
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            waiting = connection.execute(
+                "UPDATE tasks SET state = ?, lease_owner = NULL, result = ? WHERE task_id = ? AND state = ? AND lease_owner = ?",
+                (WAITING, result, task.task_id, LEASED, worker_id)
+            ).rowcount
+            if not waiting:
+                logging.warning(f"Lost the lease of {task}, its children are dropped")
+                remove_result_files(result_paths or [])
+                return False
+            connection.executemany(
+                "INSERT OR IGNORE INTO tasks (parent_id, kind, user, repo, github_endpoint, page, position, last_page_number, rank, priority, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(task.task_id, child['kind'], task.user, task.repo, task.github_endpoint, child['page'], child.get('position', 0),
+                  child.get('last_page_number'), TASK_RANKS[child['kind']], child.get('priority', 0),
+                  None if child.get('data') is None else json.dumps(child['data']))
+                 for child in children]
+            )
+        self.changes.notify()
+        return True
+
+    def fail(self, task, worker_id, reason):
+        """
+        Give a leased task back, to be run again after a backoff, or mark it
+        failed after MAX_TASK_ATTEMPTS attempts.
+        """
+        if task.attempts >= MAX_TASK_ATTEMPTS:
+            state, available_at = FAILED, 0
+            logging.warning(f"{task} failed {task.attempts} times ({reason}), it is retried on the next run")
+        else:
+            state = PENDING
+            available_at = time.time() + min(TASK_RETRY_MAX_SECONDS, TASK_RETRY_BASE_SECONDS * 2 ** (task.attempts - 1))
+            logging.warning(f"{task} failed ({reason}), attempt {task.attempts}/{MAX_TASK_ATTEMPTS}")
+        self.get_connection().execute(
+            "UPDATE tasks SET state = ?, lease_owner = NULL, available_at = ? WHERE task_id = ? AND state = ? AND lease_owner = ?",
+            (state, available_at, task.task_id, LEASED, worker_id)
+        )
+        self.changes.notify()
+
+    def get_child_results(self, task):
+        """
+        Return the paths of the result files of the children of a task, in
+        the order of their position.
+        """
+        rows = self.get_connection().execute(
+            "SELECT result FROM tasks WHERE parent_id = ? ORDER BY position", (task.task_id,)
+        ).fetchall()
+        return [None if result is None else json.loads(result) for result, in rows]
+
+    def get_change_count(self):
+        return self.changes.get_count()
+
+    def notify_change(self, *args):
+        self.changes.notify()
+
+    def wait_for_change(self, change_count, timeout):
+        """
+        Wait until a task finished or was added after 'get_change_count()'
+        returned 'change_count', at most 'timeout' seconds.
+        """
+        self.changes.wait(change_count, timeout)
+
+    def get_first_unfinished_page(self, parent_id):
+        row = self.get_connection().execute(
+            "SELECT MIN(page) FROM tasks WHERE parent_id = ? AND state != ?", (parent_id, DONE)
+        ).fetchone()
+        return row[0]
+
+    def get_seconds_until_ready(self):
+        """
+        Return how long until a task can be leased (0 if one can now), or
+        None when no task is pending or leased: the queue is drained, only
+        done tasks and the ones that wait for failed tasks are left.
+        """
+        now = time.time()
+        row = self.get_connection().execute(
+            "SELECT MIN(CASE WHEN state = ? THEN available_at ELSE lease_expires END) FROM tasks WHERE state IN (?, ?)",
+            (PENDING, PENDING, LEASED)
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(row[0] - now, 0)
+
+    def count_tasks(self):
+        """
+        Return {(kind, state): number of tasks}.
+        """
+        rows = self.get_connection().execute("SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state").fetchall()
+        return {(kind, state): count for kind, state, count in rows}
+
+
+# ------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(prog="python -m github_downloader.work_queue",
+                                     description="Show the tasks of a work queue.")
+    parser.add_argument("--work-queue", default=WORK_QUEUE_DATABASE, help=f"(default: {WORK_QUEUE_DATABASE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="print the number of tasks per kind and state")
+    commands.add_parser("failed", help="print the failed tasks")
+    return parser
+
+
+def main(argv=None):
+    args = get_argument_parser().parse_args(argv)
+    work_queue = WorkQueue(args.work_queue)
+
+    if args.command == "stats":
+        for (kind, state), count in sorted(work_queue.count_tasks().items()):
+            print(f"{kind} {state}: {count}")
+    else:
+        for row in work_queue.get_connection().execute(
+                f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE state = ? ORDER BY task_id", (FAILED,)):
+            print(Task(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import unittest
+
+from github_downloader.graphql_engine import GraphQLIssueThreads, build_issue_threads_query
+
+API_URL = "https://api.github.com"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeClient:
+
+    def __init__(self, repository, status_code=200):
+        self.repository = repository
+        self.status_code = status_code
+        self.queries = []
+
+    def post(self, url, json, timeout=None):
+        self.queries.append(json['query'])
+        return FakeResponse(self.status_code, {'data': {'repository': self.repository}})
+
+
+def make_comment_node(database_id, author=None):
+    return {'id': f"IC_{database_id}", 'databaseId': database_id, 'url': f"https://github.com/user/repo/issues/1#issuecomment-{database_id}",
+            'body': "body", 'createdAt': "2024-01-01T00:00:00Z", 'updatedAt': "2024-01-02T00:00:00Z", 'authorAssociation': "NONE",
+            'author': author or {'__typename': "User", 'login': "octocat", 'avatarUrl': "https://avatars.githubusercontent.com/u/583231?v=4",
+                                 'url': "https://github.com/octocat", 'id': "MDQ6VXNlcjU4MzIzMQ==", 'databaseId': 583231, 'isSiteAdmin': False},
+            'reactionGroups': [{'content': "THUMBS_UP", 'reactors': {'totalCount': 2}}, {'content': "EYES", 'reactors': {'totalCount': 1}}]}
+
+
+def make_issue(number):
+    return {'number': number, 'url': f"{API_URL}/repos/user/repo/issues/{number}"}
+
+
+class GraphQLIssueThreadsTest(unittest.TestCase):
+
+    def test_comments_in_the_rest_layout_and_events_from_rest(self):
+        client = FakeClient({'i1': {'comments': {'pageInfo': {'hasNextPage': False}, 'nodes': [make_comment_node(7)]}}})
+        threads = GraphQLIssueThreads(client, f"{API_URL}/graphql", API_URL).get_threads("user", "repo", [make_issue(1)])
+        comments, events = threads[1]
+        self.assertIsNone(events)
+        self.assertEqual(comments, [{
+            'url': f"{API_URL}/repos/user/repo/issues/comments/7",
+            'html_url': "https://github.com/user/repo/issues/1#issuecomment-7",
+            'issue_url': f"{API_URL}/repos/user/repo/issues/1",
+            'id': 7,
+            'node_id': "IC_7",
+            'user': {
+                'login': "octocat",
+                'id': 583231,
+                'node_id': "MDQ6VXNlcjU4MzIzMQ==",
+                'avatar_url': "https://avatars.githubusercontent.com/u/583231?v=4",
+                'gravatar_id': "",
+                'url': f"{API_URL}/users/octocat",
+                'html_url': "https://github.com/octocat",
+                'followers_url': f"{API_URL}/users/octocat/followers",
+                'following_url': f"{API_URL}/users/octocat/following{{/other_user}}",
+                'gists_url': f"{API_URL}/users/octocat/gists{{/gist_id}}",
+                'starred_url': f"{API_URL}/users/octocat/starred{{/owner}}{{/repo}}",
+                'subscriptions_url': f"{API_URL}/users/octocat/subscriptions",
+                'organizations_url': f"{API_URL}/users/octocat/orgs",
+                'repos_url': f"{API_URL}/users/octocat/repos",
+                'events_url': f"{API_URL}/users/octocat/events{{/privacy}}",
+                'received_events_url': f"{API_URL}/users/octocat/received_events",
+                'type': "User",
+                'site_admin': False,
+            },
+            'created_at': "2024-01-01T00:00:00Z",
+            'updated_at': "2024-01-02T00:00:00Z",
+            'author_association': "NONE",
+            'body': "body",
+            'reactions': {
+                'url': f"{API_URL}/repos/user/repo/issues/comments/7/reactions",
+                'total_count': 3, '+1': 2, '-1': 0, 'laugh': 0, 'hooray': 0, 'confused': 0, 'heart': 0, 'rocket': 0, 'eyes': 1,
+            },
+        }])
+        self.assertNotIn("timelineItems", client.queries[0])
+
+    def test_bot_and_deleted_authors(self):
+        bot = {'__typename': "Bot", 'login': "dependabot", 'avatarUrl': "https://avatars.githubusercontent.com/in/29110?v=4",
+               'url': "https://github.com/apps/dependabot", 'id': "MDM6Qm90NDk2OTkzMzM=", 'databaseId': 49699333}
+        nodes = [make_comment_node(7, bot), {**make_comment_node(8), 'author': None}]
+        client = FakeClient({'i1': {'comments': {'pageInfo': {'hasNextPage': False}, 'nodes': nodes}}})
+        (comments, _), = GraphQLIssueThreads(client, f"{API_URL}/graphql", API_URL).get_threads("user", "repo", [make_issue(1)]).values()
+        user = comments[0]['user']
+        self.assertEqual((user['login'], user['type'], user['site_admin']), ("dependabot[bot]", "Bot", False))
+        self.assertEqual(user['url'], f"{API_URL}/users/dependabot%5Bbot%5D")
+        self.assertIsNone(comments[1]['user'])
+
+    def test_long_and_missing_threads_are_left_to_rest(self):
+        client = FakeClient({'i1': {'comments': {'pageInfo': {'hasNextPage': True}, 'nodes': [make_comment_node(7)]}}, 'i2': None})
+        threads = GraphQLIssueThreads(client, f"{API_URL}/graphql", API_URL).get_threads("user", "repo", [make_issue(1), make_issue(2)])
+        self.assertEqual(threads, {1: (None, None), 2: (None, None)})
+
+    def test_failed_query_is_left_to_rest(self):
+        client = FakeClient(None, status_code=502)
+        threads = GraphQLIssueThreads(client, f"{API_URL}/graphql", API_URL).get_threads("user", "repo", [make_issue(1)])
+        self.assertEqual(threads, {1: (None, None)})
+
+    def test_one_query_per_batch(self):
+        client = FakeClient({})
+        GraphQLIssueThreads(client, f"{API_URL}/graphql", API_URL, issues_per_query=2).get_threads("user", "repo", [make_issue(number) for number in range(1, 6)])
+        self.assertEqual(len(client.queries), 3)
+        self.assertIn("i5: issueOrPullRequest(number: 5)", build_issue_threads_query([5]))
+
+
+if __name__ == "__main__":
+    unittest.main()
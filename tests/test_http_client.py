@@ -0,0 +1,66 @@
+import unittest
+
+from github_downloader.http_client import GitHubClient
+from github_downloader.retry_policy import CircuitBreaker, RetryPolicy
+
+URL = "https://api.github.com/repos/user/repo/issues?page=1"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None, text=""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+        self.url = URL
+
+
+class FakeSession:
+    """
+    Answers the requests with the given status codes, in turn.
+    """
+
+    def __init__(self, *status_codes):
+        self.status_codes = list(status_codes)
+        self.requests = 0
+
+    def request(self, method, url, timeout=None, headers=None, json=None):
+        self.requests += 1
+        return FakeResponse(self.status_codes.pop(0))
+
+
+def create_client(session, threshold=100):
+    retry_policy = RetryPolicy(max_retries=3, backoff_base_seconds=0, circuit_breaker=CircuitBreaker(threshold=threshold))
+    return GitHubClient(session, None, retry_policy)
+
+
+class GitHubClientTest(unittest.TestCase):
+
+    def test_permanent_error_is_not_retried(self):
+        session = FakeSession(404, 200)
+        response = create_client(session).get(URL, use_budget=False)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(session.requests, 1)
+
+    def test_retryable_error_is_retried(self):
+        session = FakeSession(502, 500, 200)
+        response = create_client(session).get(URL, use_budget=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.requests, 3)
+
+    def test_last_error_is_returned_when_retries_run_out(self):
+        session = FakeSession(502, 502, 502, 200)
+        response = create_client(session).get(URL, use_budget=False)
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(session.requests, 3)
+
+    def test_open_circuit_returns_none(self):
+        session = FakeSession(502, 502, 200)
+        client = create_client(session, threshold=2)
+        self.assertEqual(client.get(URL, use_budget=False, max_retries=2).status_code, 502)
+        self.assertIsNone(client.get(URL, use_budget=False))
+        self.assertEqual(session.requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
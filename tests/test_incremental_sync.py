@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from github_downloader.config import DownloaderConfig
+from github_downloader.downloader import Downloader
+from github_downloader.metrics import Metrics
+
+API_URL = "https://api.github.com"
+ISSUES_URL = f"{API_URL}/repos/user/repo/issues"
+HIGH_WATER_MARK = "2024-01-02T00:00:00Z"
+
+
+class FakeResponse:
+
+    def __init__(self, items):
+        self.status_code = 200
+        self.headers = {}
+        self.items = items
+
+    def json(self):
+        return self.items
+
+
+class FakeClient:
+    """
+    Answers every GET with the items of the first url prefix it starts with.
+    """
+
+    def __init__(self, items_by_url):
+        self.items_by_url = items_by_url
+        self.requests = []
+
+    def get(self, url, timeout=None, headers=None):
+        self.requests.append(url)
+        for url_prefix, items in self.items_by_url.items():
+            if url.startswith(url_prefix):
+                return FakeResponse(items)
+        raise AssertionError(f"Unexpected request: {url}")
+
+
+def make_issue(number, updated_at):
+    url = f"{ISSUES_URL}/{number}"
+    return {'id': number, 'number': number, 'url': url, 'comments_url': f"{url}/comments",
+            'events_url': f"{url}/events", 'updated_at': updated_at}
+
+
+def make_comment(number, index, body="comment"):
+    return {'id': number * 100 + index, 'issue_url': f"{ISSUES_URL}/{number}", 'body': body}
+
+
+def make_event(number, index):
+    return {'id': number * 100 + index, 'url': f"{ISSUES_URL}/{number}", 'event': "labeled"}
+
+
+class IncrementalSyncTest(unittest.TestCase):
+    """
+    Issue 1 was updated before the high-water mark, issue 2 at the mark.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        config = DownloaderConfig(tokens=["token"], data_directory=os.path.join(directory, "data"),
+                                  progress_database=os.path.join(directory, "progress.db"),
+                                  verification_json=os.path.join(directory, "verification.json"), repository_cache=None,
+                                  api_url=API_URL, issue_workers=1, incremental_sync=True)
+        self.downloader = Downloader(config)
+        self.downloader.prepare_repository("user", "repo")
+
+        output_writer = self.downloader.output_writer
+        self.issues = [make_issue(1, "2024-01-01T00:00:00Z"), make_issue(2, HIGH_WATER_MARK)]
+        output_writer.write_page_items("user", "repo", "issues", 1, self.issues, sort_keys=True)
+        output_writer.write_page_items("user", "repo", "issues_comments", 1, [make_comment(1, 0), make_comment(2, 0)])
+        output_writer.write_page_items("user", "repo", "issues_events", 1, [make_event(1, 0), make_event(2, 0)])
+        self.downloader.update_verification_data("user_repo", "issues", "None", 1, 1, 2)
+        self.downloader.update_verification_value("user_repo", "issues_high_water_mark", HIGH_WATER_MARK)
+
+    def sync(self, items_by_url):
+        client = FakeClient(items_by_url)
+        self.downloader.__dict__['client'] = client
+        self.downloader.sync_updated_items("user", "repo", "issues", HIGH_WATER_MARK)
+        return client
+
+    def read_page(self, name):
+        return self.downloader.output_writer.read_page("user", "repo", name, 1)
+
+    def test_unchanged_item_at_the_mark_is_skipped(self):
+        signatures = [self.downloader.output_writer.get_page_signature("user", "repo", name, 1)
+                      for name in ("issues", "issues_comments", "issues_events")]
+        client = self.sync({f"{ISSUES_URL}?": [make_issue(2, HIGH_WATER_MARK)]})
+
+        # Only the updated issues are listed, no thread is fetched and no page is written
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual([self.downloader.output_writer.get_page_signature("user", "repo", name, 1)
+                          for name in ("issues", "issues_comments", "issues_events")], signatures)
+
+    def test_changed_thread_keeps_the_order_of_the_issues(self):
+        updated_issue = make_issue(1, "2024-01-03T00:00:00Z")
+        self.sync({
+            f"{ISSUES_URL}?": [make_issue(2, HIGH_WATER_MARK), updated_issue],
+            f"{ISSUES_URL}/1/comments": [make_comment(1, 0, "edited"), make_comment(1, 1)],
+            f"{ISSUES_URL}/1/events": [make_event(1, 0), make_event(1, 1)],
+        })
+
+        self.assertEqual(self.read_page("issues"), [updated_issue, self.issues[1]])
+        # The thread of issue 1 is replaced where it was, before the one of issue 2
+        self.assertEqual(self.read_page("issues_comments"), [make_comment(1, 0, "edited"), make_comment(1, 1), make_comment(2, 0)])
+        self.assertEqual(self.read_page("issues_events"), [make_event(1, 0), make_event(1, 1), make_event(2, 0)])
+        self.assertEqual(self.downloader.get_high_water_mark("user_repo", "issues"), "2024-01-03T00:00:00Z")
+
+    def test_bytes_written_are_counted_per_page(self):
+        metrics = self.downloader.__dict__['metrics'] = Metrics()
+        self.sync({
+            f"{ISSUES_URL}?": [make_issue(1, "2024-01-03T00:00:00Z")],
+            f"{ISSUES_URL}/1/comments": [make_comment(1, 0, "edited")],
+            f"{ISSUES_URL}/1/events": [make_event(1, 0)],
+        })
+
+        for name in ("issues", "issues_comments", "issues_events"):
+            location = self.downloader.output_writer.get_location("user", "repo", name, 1)
+            self.assertEqual(metrics.counters[("bytes_written", name)], os.path.getsize(location), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from github_downloader.output_writer import PrettyJsonWriter
+
+
+class PrettyJsonWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_writer = PrettyJsonWriter(directory.name)
+        os.makedirs(os.path.dirname(self.output_writer.get_location("user", "repo", "issues", 1)))
+
+    def test_interrupted_write_keeps_the_saved_page(self):
+        self.output_writer.write_page_items("user", "repo", "issues", 1, [{'id': 1}])
+        with mock.patch("github_downloader.output_writer.json.dump", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.output_writer.write_raw_page("user", "repo", "issues", 1, b'[{"id": 2}]')
+
+        self.assertEqual(self.output_writer.read_page("user", "repo", "issues", 1), [{'id': 1}])
+        # The temporary file is not left behind
+        location = self.output_writer.get_location("user", "repo", "issues", 1)
+        self.assertEqual(os.listdir(os.path.dirname(location)), [os.path.basename(location)])
+
+
+if __name__ == "__main__":
+    unittest.main()
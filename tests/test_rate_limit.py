@@ -0,0 +1,164 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from github_downloader.http_client import GitHubClient
+from github_downloader.rate_limit import (RateLimitBudget, TokenPool, RATE_LIMIT_REFRESH_BACKOFF_SECONDS, RATE_LIMIT_RESET_MARGIN_SECONDS,
+                                          RATE_LIMIT_THRESHOLD)
+
+RATE_LIMIT_URL = "https://api.github.com/rate_limit"
+URL = "https://api.github.com/repos/user/repo/issues?page=1"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.url = URL
+        self.content = b""
+        self.text = ""
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"Status {self.status_code}")
+
+
+class FakeSession:
+    """
+    Answers '/rate_limit' with the budget of the token of the request, or
+    with 'status_code' if there is none. Every other request gets 'response'.
+    """
+
+    def __init__(self, rate_limits=None, status_code=200, response=None):
+        self.rate_limits = rate_limits or {}
+        self.status_code = status_code
+        self.response = response
+        self.rate_limit_requests = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.rate_limit_requests += 1
+        rate_limit = self.rate_limits.get(headers['Authorization'].split()[-1])
+        if rate_limit is None:
+            return FakeResponse(self.status_code)
+        remaining, reset_time = rate_limit
+        return FakeResponse(200, body={'resources': {'core': {'limit': 5000, 'remaining': remaining, 'reset': reset_time}}})
+
+    def request(self, method, url, timeout=None, headers=None, json=None):
+        return self.response
+
+
+class RateLimitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("github_downloader.rate_limit.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("github_downloader.rate_limit.time.sleep", side_effect=self.sleep)
+        self.sleep_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RateLimitBudgetTest(RateLimitTestCase):
+
+    def test_reserve_spends_the_budget_until_the_threshold(self):
+        budget = RateLimitBudget(RATE_LIMIT_URL, FakeSession({'a': (RATE_LIMIT_THRESHOLD + 2, 2000)}), token='a')
+        self.assertEqual(budget.try_reserve(), 0)
+        self.assertEqual(budget.try_reserve(), 0)
+        self.assertEqual(budget.remaining, RATE_LIMIT_THRESHOLD)
+        # Exhausted: wait until the reset, plus the margin
+        self.assertEqual(budget.try_reserve(), 1000 + RATE_LIMIT_RESET_MARGIN_SECONDS)
+
+    def test_rate_limit_is_only_asked_after_a_reset(self):
+        session = FakeSession({'a': (100, 2000)})
+        budget = RateLimitBudget(RATE_LIMIT_URL, session, token='a')
+        budget.try_reserve()
+        budget.try_reserve()
+        self.assertEqual(session.rate_limit_requests, 1)
+
+        self.now = 2000
+        session.rate_limits['a'] = (5000, 5600)
+        budget.try_reserve()
+        self.assertEqual(session.rate_limit_requests, 2)
+        self.assertEqual(budget.remaining, 4999)
+
+    def test_failed_refresh_lets_one_request_through(self):
+        budget = RateLimitBudget(RATE_LIMIT_URL, FakeSession(status_code=500), token='a')
+        self.assertEqual(budget.try_reserve(), 0)
+        self.assertEqual(budget.remaining, RATE_LIMIT_THRESHOLD)
+        self.assertEqual(budget.reset_time, self.now + RATE_LIMIT_REFRESH_BACKOFF_SECONDS)
+
+    def test_lowest_remaining_of_a_window_wins(self):
+        budget = RateLimitBudget(RATE_LIMIT_URL, FakeSession(), token='a')
+        budget.update_from_headers({'X-RateLimit-Remaining': "50", 'X-RateLimit-Reset': "2000"})
+        # A response of the same window that arrives late
+        budget.update_from_headers({'X-RateLimit-Remaining': "60", 'X-RateLimit-Reset': "2000"})
+        self.assertEqual(budget.remaining, 50)
+        # A new window replaces it
+        budget.update_from_headers({'X-RateLimit-Remaining': "4999", 'X-RateLimit-Reset': "5600"})
+        self.assertEqual((budget.remaining, budget.reset_time), (4999, 5600))
+
+    def test_headers_of_another_resource_are_ignored(self):
+        budget = RateLimitBudget(RATE_LIMIT_URL, FakeSession(), token='a')
+        budget.update_from_headers({'X-RateLimit-Resource': "graphql", 'X-RateLimit-Remaining': "1", 'X-RateLimit-Reset': "2000"})
+        self.assertIsNone(budget.remaining)
+
+    def test_retry_after_pauses_the_budget(self):
+        budget = RateLimitBudget(RATE_LIMIT_URL, FakeSession({'a': (100, 2000)}), token='a')
+        budget.update_from_headers({'Retry-After': "30"})
+        self.assertEqual(budget.try_reserve(), 30)
+
+    def test_not_modified_response_is_refunded(self):
+        headers = {'X-RateLimit-Remaining': "100", 'X-RateLimit-Reset': "2000"}
+        session = FakeSession({'a': (100, 2000)}, response=FakeResponse(304, headers))
+        token_pool = TokenPool(['a'], RATE_LIMIT_URL, session)
+        client = GitHubClient(session, token_pool)
+        self.assertEqual(client.get(URL, headers={'If-None-Match': '"etag"'}).status_code, 304)
+        self.assertEqual(token_pool.budgets[0].remaining, 100)
+
+
+class TokenPoolTest(RateLimitTestCase):
+
+    def create_token_pool(self, rate_limits):
+        return TokenPool(list(rate_limits), RATE_LIMIT_URL, FakeSession(rate_limits))
+
+    def test_token_with_the_most_calls_left_is_used(self):
+        token_pool = self.create_token_pool({'a': (100, 2000), 'b': (300, 2000), 'c': (200, 2000)})
+        token_pool.refresh()
+        self.assertEqual(token_pool.wait_for_budget().headers, {'Authorization': "Bearer b"})
+        self.assertEqual([budget.remaining for budget in token_pool.budgets], [100, 299, 200])
+
+    def test_exhausted_token_is_skipped_without_sleeping(self):
+        token_pool = self.create_token_pool({'a': (RATE_LIMIT_THRESHOLD, 2000), 'b': (RATE_LIMIT_THRESHOLD + 1, 2000)})
+        token_pool.refresh()
+        self.assertEqual(token_pool.wait_for_budget().headers, {'Authorization': "Bearer b"})
+        self.sleep_mock.assert_not_called()
+
+    def test_paused_token_is_skipped(self):
+        token_pool = self.create_token_pool({'a': (300, 2000), 'b': (100, 2000)})
+        token_pool.refresh()
+        token_pool.budgets[0].pause(60)
+        self.assertEqual(token_pool.wait_for_budget().headers, {'Authorization': "Bearer b"})
+
+    def test_sleeps_until_the_first_token_resets_when_all_are_exhausted(self):
+        token_pool = self.create_token_pool({'a': (RATE_LIMIT_THRESHOLD, 3000), 'b': (RATE_LIMIT_THRESHOLD, 2000)})
+        token_pool.refresh()
+        self.assertEqual(token_pool.try_reserve(), (None, 1000 + RATE_LIMIT_RESET_MARGIN_SECONDS))
+
+        # After the sleep, the budget of 'b' is read again
+        token_pool.budgets[0].session.rate_limits['b'] = (5000, 5600)
+        self.assertEqual(token_pool.wait_for_budget().headers, {'Authorization': "Bearer b"})
+        self.sleep_mock.assert_called_once_with(1000 + RATE_LIMIT_RESET_MARGIN_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from github_downloader.repository_validator import RepositoryValidator, parse_repository_url
+
+API_URL = "https://api.github.com"
+
+
+class FakeResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeClient:
+    """
+    Fails every GraphQL query and answers the HEAD requests with the status
+    code of the repository, None for no response.
+    """
+
+    def __init__(self, status_codes):
+        self.status_codes = status_codes
+        self.head_requests = []
+
+    def post(self, url, json, max_retries=None):
+        return None
+
+    def request(self, method, url, max_retries=None):
+        repository = url[len(f"{API_URL}/repos/"):]
+        self.head_requests.append(repository)
+        status_code = self.status_codes[repository]
+        return None if status_code is None else FakeResponse(status_code)
+
+
+class ParseRepositoryUrlTest(unittest.TestCase):
+
+    def test_normalised(self):
+        for url in ("https://github.com/User/Repo", "github.com/user/repo.git", "https://www.github.com/user/repo/issues/1",
+                    "http://github.com/user/repo/"):
+            self.assertEqual(parse_repository_url(url), ("user", "repo"), url)
+
+    def test_not_a_repository(self):
+        for url in ("", "https://gitlab.com/user/repo", "https://github.com/user", "https://github.com/-user/repo"):
+            self.assertIsNone(parse_repository_url(url), url)
+
+
+class RepositoryValidatorTest(unittest.TestCase):
+
+    def test_only_confirmed_missing_repositories_are_dropped(self):
+        client = FakeClient({"user/found": 200, "user/missing": 404, "user/unchecked": None, "user/error": 500})
+        validator = RepositoryValidator(client, client, API_URL)
+        verified_list, unverified_list = validator.validate([
+            "https://github.com/user/found", "https://github.com/user/missing",
+            "https://github.com/user/unchecked", "https://github.com/user/error", "not a url",
+        ])
+        self.assertEqual(verified_list, [["user", "found"], ["user", "unchecked"], ["user", "error"]])
+        self.assertEqual(unverified_list, ["not a url", "user/missing"])
+
+    def test_duplicates_are_checked_once(self):
+        client = FakeClient({"user/repo": 200, "user/other": 200})
+        validator = RepositoryValidator(client, client, API_URL)
+        verified_list, unverified_list = validator.validate([
+            "https://github.com/user/repo", "https://github.com/User/Repo.git", "https://github.com/user/other",
+            "github.com/user/repo/issues",
+        ])
+        self.assertEqual(verified_list, [["user", "repo"], ["user", "other"]])
+        self.assertEqual(sorted(client.head_requests), ["user/other", "user/repo"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from github_downloader.progress_store import ProgressStore
+from github_downloader.resume_planner import ResumePlanner, get_contiguous_page_number, get_missing_pages
+
+
+class FakeOutputWriter:
+
+    def __init__(self, saved_pages):
+        self.saved_pages = saved_pages
+
+    def list_pages(self, github_username, github_repository, name):
+        return set(self.saved_pages)
+
+
+class ContiguousPageNumberTest(unittest.TestCase):
+
+    def test_stops_before_the_first_missing_page(self):
+        self.assertEqual(get_contiguous_page_number([2, 5], 6), 1)
+        self.assertEqual(get_contiguous_page_number([5, 2], 6), 1)
+
+    def test_last_page_when_nothing_is_missing(self):
+        self.assertEqual(get_contiguous_page_number([], 6), 6)
+
+    def test_missing_pages_include_gaps(self):
+        self.assertEqual(get_missing_pages({1, 3}, 4), [2, 4])
+
+
+class ResumePlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.progress_store = ProgressStore(os.path.join(directory.name, "progress.db"))
+
+    def test_trusted_progress_is_complete(self):
+        self.progress_store.update_page_progress("user_repo", "commits", 3, 3, 100)
+        planner = ResumePlanner(FakeOutputWriter([1, 3]), self.progress_store)
+        self.assertTrue(planner.plan("user", "repo", "commits", None, 3, trust_progress=True).is_complete())
+
+    def test_gap_behind_the_stored_page_is_planned(self):
+        # Page 2 failed, so the stored current page stayed at 1
+        self.progress_store.update_page_progress("user_repo", "commits", get_contiguous_page_number([2], 3), 3, 200)
+        planner = ResumePlanner(FakeOutputWriter([1, 3]), self.progress_store)
+        self.assertEqual(planner.plan("user", "repo", "commits", None, 3, trust_progress=True).missing_pages, [2])
+
+    def test_untrusted_progress_lists_the_pages(self):
+        self.progress_store.update_page_progress("user_repo", "issues_comments", 3, 3, 100)
+        planner = ResumePlanner(FakeOutputWriter([1, 3]), self.progress_store)
+        self.assertEqual(planner.plan("user", "repo", "issues_comments", None, 3).missing_pages, [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import unittest
+from unittest import mock
+
+from github_downloader.metrics import Metrics
+from github_downloader.retry_policy import (CircuitBreaker, RetryPolicy, RetryState, classify_response, get_repository_key,
+                                            is_permanent_error, SUCCESS, PERMANENT, RETRYABLE, RATE_LIMITED)
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, headers=None, text=""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+
+class ClassifyResponseTest(unittest.TestCase):
+
+    def test_success(self):
+        self.assertEqual(classify_response(FakeResponse(200)), SUCCESS)
+        self.assertEqual(classify_response(FakeResponse(304)), SUCCESS)
+
+    def test_permanent(self):
+        for status_code in (400, 401, 404, 410, 422):
+            self.assertEqual(classify_response(FakeResponse(status_code)), PERMANENT, status_code)
+
+    def test_retryable(self):
+        for status_code in (202, 408, 500, 502, 503, 504, 599):
+            self.assertEqual(classify_response(FakeResponse(status_code)), RETRYABLE, status_code)
+
+    def test_rate_limited(self):
+        self.assertEqual(classify_response(FakeResponse(429)), RATE_LIMITED)
+        self.assertEqual(classify_response(FakeResponse(403, {'Retry-After': "30"})), RATE_LIMITED)
+        self.assertEqual(classify_response(FakeResponse(403, {'X-RateLimit-Remaining': "0"})), RATE_LIMITED)
+        self.assertEqual(classify_response(FakeResponse(403, text="You have exceeded a secondary rate limit")), RATE_LIMITED)
+
+    def test_forbidden_without_rate_limit_is_permanent(self):
+        self.assertEqual(classify_response(FakeResponse(403, {'X-RateLimit-Remaining': "4999"}, "Resource not accessible")), PERMANENT)
+
+    def test_is_permanent_error(self):
+        self.assertTrue(is_permanent_error(FakeResponse(404)))
+        self.assertFalse(is_permanent_error(FakeResponse(502)))
+        self.assertFalse(is_permanent_error(FakeResponse(200)))
+        self.assertFalse(is_permanent_error(None))
+
+
+class RepositoryKeyTest(unittest.TestCase):
+
+    def test_get_repository_key(self):
+        self.assertEqual(get_repository_key("https://api.github.com/repos/User/Repo/issues?page=2"), "user/repo")
+        self.assertIsNone(get_repository_key("https://api.github.com/graphql"))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("github_downloader.retry_policy.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.circuit_breaker = CircuitBreaker(threshold=3, cooldown_seconds=60)
+
+    def fail(self, key, times):
+        for _ in range(times):
+            self.circuit_breaker.record_failure(key)
+
+    def test_opens_after_threshold(self):
+        self.fail("user/repo", 2)
+        self.assertTrue(self.circuit_breaker.allow("user/repo"))
+        self.fail("user/repo", 1)
+        self.assertFalse(self.circuit_breaker.allow("user/repo"))
+        # The other repositories are not held up
+        self.assertTrue(self.circuit_breaker.allow("user/other"))
+
+    def test_success_resets_the_failures(self):
+        self.fail("user/repo", 2)
+        self.circuit_breaker.record_success("user/repo")
+        self.fail("user/repo", 2)
+        self.assertTrue(self.circuit_breaker.allow("user/repo"))
+
+    def test_half_open_after_cooldown(self):
+        self.fail("user/repo", 3)
+        self.now += 61
+        # One request is let through, the others wait for its outcome
+        self.assertTrue(self.circuit_breaker.allow("user/repo"))
+        self.assertFalse(self.circuit_breaker.allow("user/repo"))
+
+    def test_half_open_success_closes(self):
+        self.fail("user/repo", 3)
+        self.now += 61
+        self.assertTrue(self.circuit_breaker.allow("user/repo"))
+        self.circuit_breaker.record_success("user/repo")
+        self.assertTrue(self.circuit_breaker.allow("user/repo"))
+        self.assertTrue(self.circuit_breaker.allow("user/repo"))
+
+    def test_half_open_failure_opens_again(self):
+        self.fail("user/repo", 3)
+        self.now += 61
+        self.assertTrue(self.circuit_breaker.allow("user/repo"))
+        self.fail("user/repo", 1)
+        self.now += 30
+        self.assertFalse(self.circuit_breaker.allow("user/repo"))
+
+    def test_requests_without_repository_are_always_allowed(self):
+        self.fail(None, 10)
+        self.assertTrue(self.circuit_breaker.allow(None))
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_backoff_is_capped(self):
+        retry_policy = RetryPolicy(backoff_base_seconds=1, backoff_max_seconds=10)
+        for attempt in range(10):
+            self.assertLessEqual(retry_policy.get_backoff_seconds(attempt), min(10, 2 ** attempt))
+
+    def test_rate_limit_wait(self):
+        retry_policy = RetryPolicy()
+        self.assertEqual(retry_policy.get_rate_limit_wait_seconds(FakeResponse(429, {'Retry-After': "7"})), 7)
+        with mock.patch("github_downloader.retry_policy.time.time", return_value=1000.0):
+            response = FakeResponse(403, {'X-RateLimit-Remaining': "0", 'X-RateLimit-Reset': "1100"})
+            self.assertEqual(retry_policy.get_rate_limit_wait_seconds(response), 100)
+
+
+class FakeBudget:
+
+    def __init__(self):
+        self.paused_seconds = None
+
+    def pause(self, seconds):
+        self.paused_seconds = seconds
+
+
+class RetryStateTest(unittest.TestCase):
+
+    def create_retry_state(self, max_retries=3):
+        retry_policy = RetryPolicy(max_retries=max_retries, backoff_base_seconds=0.01)
+        return RetryState(retry_policy, "https://api.github.com/repos/user/repo/issues", Metrics(enabled=False))
+
+    def test_success_finishes(self):
+        retry_state = self.create_retry_state()
+        self.assertTrue(retry_state.start_attempt())
+        self.assertIsNone(retry_state.record_attempt(FakeResponse(200), "Status 200"))
+        self.assertFalse(retry_state.start_attempt())
+        self.assertEqual(retry_state.response.status_code, 200)
+
+    def test_retries_keep_the_last_response(self):
+        retry_state = self.create_retry_state(max_retries=2)
+        self.assertTrue(retry_state.start_attempt())
+        self.assertIsNotNone(retry_state.record_attempt(FakeResponse(502), "Status 502"))
+        self.assertTrue(retry_state.start_attempt())
+        # A timeout has no response, the 502 stays the result
+        self.assertIsNone(retry_state.record_attempt(None, "ReadTimeout occurred"))
+        self.assertFalse(retry_state.start_attempt())
+        self.assertEqual(retry_state.response.status_code, 502)
+
+    def test_rate_limited_pauses_the_token(self):
+        retry_state = self.create_retry_state(max_retries=1)
+        budget = FakeBudget()
+        self.assertTrue(retry_state.start_attempt())
+        self.assertEqual(retry_state.record_attempt(FakeResponse(429, {'Retry-After': "7"}), "Status 429", budget), 0)
+        self.assertEqual(budget.paused_seconds, 7)
+        # Not counted as a retry
+        self.assertTrue(retry_state.start_attempt())
+
+    def test_rate_limited_without_budget_waits(self):
+        retry_state = self.create_retry_state()
+        self.assertTrue(retry_state.start_attempt())
+        self.assertEqual(retry_state.record_attempt(FakeResponse(429, {'Retry-After': "7"}), "Status 429"), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
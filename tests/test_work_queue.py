@@ -0,0 +1,266 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from github_downloader.config import DownloaderConfig
+from github_downloader.downloader import Downloader
+from github_downloader.work_queue import (WorkQueue, read_result_file, DONE, FAILED, ISSUE_TASK, LEASED, MAX_TASK_ATTEMPTS,
+                                          PAGE_TASK, PENDING, SKIPPED, TASK_RETRY_BASE_SECONDS, WAITING)
+
+JOB = ("user", "repo", "commits")
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.now = 1000.0
+        patcher = mock.patch("github_downloader.work_queue.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.work_queue = WorkQueue(os.path.join(self.directory, "queue.db"), lease_seconds=60)
+
+    def get_state(self, task):
+        return self.work_queue.get_connection().execute("SELECT state FROM tasks WHERE task_id = ?", (task.task_id,)).fetchone()[0]
+
+    def add_pages(self, pages):
+        self.work_queue.add_jobs([JOB])
+        endpoint_task, = self.work_queue.lease("worker")
+        children = [{'kind': PAGE_TASK, 'page': page, 'last_page_number': len(pages)} for page in pages]
+        self.work_queue.wait_for_children(endpoint_task, "worker", children)
+        return endpoint_task
+
+    def test_expired_lease_is_taken_over(self):
+        self.work_queue.add_jobs([JOB])
+        task, = self.work_queue.lease("first")
+        self.assertEqual(self.work_queue.lease("second"), [])
+
+        self.now += 61
+        taken_over, = self.work_queue.lease("second")
+        self.assertEqual(taken_over.task_id, task.task_id)
+        self.assertEqual(taken_over.attempts, 2)
+        # The first worker lost the task, only the second one completes it
+        self.assertFalse(self.work_queue.complete(task, "first"))
+        self.assertTrue(self.work_queue.complete(taken_over, "second"))
+        self.assertEqual(self.get_state(task), DONE)
+
+    def test_renewed_lease_does_not_expire(self):
+        self.work_queue.add_jobs([JOB])
+        task, = self.work_queue.lease("first")
+        self.now += 50
+        self.work_queue.renew_leases("first")
+        self.now += 50
+        self.assertEqual(self.work_queue.lease("second"), [])
+        self.assertEqual(self.get_state(task), LEASED)
+
+    def test_failed_task_is_retried_after_a_backoff(self):
+        self.work_queue.add_jobs([JOB])
+        task, = self.work_queue.lease("worker")
+        self.work_queue.fail(task, "worker", "status 502")
+        self.assertEqual(self.get_state(task), PENDING)
+        self.assertEqual(self.work_queue.lease("worker"), [])
+        self.assertEqual(self.work_queue.get_seconds_until_ready(), TASK_RETRY_BASE_SECONDS)
+
+        self.now += TASK_RETRY_BASE_SECONDS
+        retried, = self.work_queue.lease("worker")
+        self.assertEqual(retried.attempts, 2)
+
+    def test_task_fails_after_max_attempts_until_the_next_run(self):
+        self.work_queue.add_jobs([JOB])
+        for _ in range(MAX_TASK_ATTEMPTS):
+            self.now += 1000
+            task, = self.work_queue.lease("worker")
+            self.work_queue.fail(task, "worker", "status 502")
+        self.assertEqual(self.get_state(task), FAILED)
+        self.now += 1000
+        self.assertEqual(self.work_queue.lease("worker"), [])
+        # Drained: a failed task is not waited for
+        self.assertIsNone(self.work_queue.get_seconds_until_ready())
+
+        self.work_queue.add_jobs([JOB])
+        retried, = self.work_queue.lease("worker")
+        self.assertEqual(retried.attempts, 1)
+
+    def test_leases_of_a_stopped_worker_are_released(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        stopped_worker = f"{socket.gethostname()}:{process.pid}"
+        self.work_queue.add_jobs([JOB, ("user", "repo", "pulls")])
+        stopped_task, running_task = self.work_queue.lease(stopped_worker, 1) + self.work_queue.lease(f"{socket.gethostname()}:{os.getpid()}", 1)
+
+        self.work_queue.add_jobs([JOB])
+        self.assertEqual(self.get_state(stopped_task), PENDING)
+        # A worker that is still running keeps its lease
+        self.assertEqual(self.get_state(running_task), LEASED)
+
+    def test_parent_finishes_once_every_child_is_done(self):
+        endpoint_task = self.add_pages([1, 2])
+        self.assertEqual(self.get_state(endpoint_task), WAITING)
+        first_page, second_page = self.work_queue.lease("worker", 2)
+        self.work_queue.complete(first_page, "worker")
+        self.assertEqual(self.get_state(endpoint_task), WAITING)
+        self.work_queue.complete(second_page, "worker")
+
+        finishing_task, = self.work_queue.lease("worker")
+        self.assertEqual((finishing_task.task_id, finishing_task.stage), (endpoint_task.task_id, "finish"))
+
+    def test_skipped_page_finishes_the_parent_but_stops_the_progress(self):
+        endpoint_task = self.add_pages([1, 2, 3])
+        first_page, second_page, third_page = self.work_queue.lease("worker", 3)
+        self.work_queue.complete(first_page, "worker")
+        self.work_queue.complete(second_page, "worker", skipped=True)
+        self.work_queue.complete(third_page, "worker")
+        self.assertEqual(self.get_state(second_page), SKIPPED)
+        self.assertEqual(self.work_queue.get_first_unfinished_page(endpoint_task.task_id), 2)
+        # The endpoint is queued again to finish
+        self.assertEqual(self.get_state(endpoint_task), PENDING)
+
+    def test_result_files_are_deleted_once_the_parent_is_done(self):
+        endpoint_task = self.add_pages([1])
+        page_task, = self.work_queue.lease("worker")
+        path = self.work_queue.spool_result(page_task, "comments", [{'id': 1}, {'id': 2}])
+        self.work_queue.complete(page_task, "worker", [path])
+        self.assertEqual(self.work_queue.get_child_results(endpoint_task), [[path]])
+        self.assertEqual(list(read_result_file(path)), ['{"id": 1}\n', '{"id": 2}\n'])
+
+        finishing_task, = self.work_queue.lease("worker")
+        self.work_queue.complete(finishing_task, "worker")
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.work_queue.get_child_results(endpoint_task), [None])
+
+    def test_result_files_of_a_lost_lease_are_deleted(self):
+        self.add_pages([1])
+        page_task, = self.work_queue.lease("first")
+        path = self.work_queue.spool_result(page_task, "comments", [{'id': 1}])
+        self.now += 61
+        self.work_queue.lease("second")
+        self.assertFalse(self.work_queue.complete(page_task, "first", [path]))
+        self.assertFalse(os.path.exists(path))
+
+    def test_result_of_a_waiting_task_is_kept_until_it_finishes(self):
+        self.add_pages([1])
+        page_task, = self.work_queue.lease("worker")
+        path = self.work_queue.spool_result(page_task, "page", [{'id': 1}])
+        self.work_queue.wait_for_children(page_task, "worker", [{'kind': ISSUE_TASK, 'page': 1}], [path])
+        issue_task, = self.work_queue.lease("worker")
+        self.work_queue.complete(issue_task, "worker")
+
+        finishing_task, = self.work_queue.lease("worker")
+        self.assertEqual((finishing_task.stage, finishing_task.result), ("finish", [path]))
+        self.assertTrue(os.path.exists(path))
+
+
+API_URL = "https://api.github.com"
+ISSUES_URL = f"{API_URL}/repos/user/repo/issues"
+
+
+class FakeResponse:
+
+    def __init__(self, items):
+        self.status_code = 200
+        self.headers = {'ETag': '"etag"'}
+        self.url = None
+        self.items = items
+        self.content = json.dumps(items).encode()
+
+    def json(self):
+        return self.items
+
+
+class FakeClient:
+
+    def __init__(self, items_by_url):
+        self.items_by_url = items_by_url
+
+    def get(self, url, timeout=None, headers=None):
+        for url_prefix, items in self.items_by_url.items():
+            if url.startswith(url_prefix):
+                return FakeResponse(items)
+        raise AssertionError(f"Unexpected request: {url}")
+
+
+class IssuesPageTaskTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        config = DownloaderConfig(tokens=["token"], data_directory=os.path.join(directory, "data"),
+                                  progress_database=os.path.join(directory, "progress.db"),
+                                  verification_json=os.path.join(directory, "verification.json"), repository_cache=None,
+                                  api_url=API_URL, work_queue=os.path.join(directory, "queue.db"))
+        self.downloader = Downloader(config)
+        self.downloader.prepare_repository("user", "repo")
+        url = f"{ISSUES_URL}/1"
+        self.issue = {'id': 1, 'number': 1, 'url': url, 'comments_url': f"{url}/comments", 'events_url': f"{url}/events"}
+        self.downloader.__dict__['client'] = FakeClient({
+            f"{ISSUES_URL}?": [self.issue],
+            f"{url}/comments": [{'id': 10, 'issue_url': url}],
+            f"{url}/events": [{'id': 20, 'url': url}],
+        })
+
+        work_queue = self.downloader.work_queue
+        work_queue.add_jobs([("user", "repo", "issues")])
+        endpoint_task, = work_queue.lease("worker")
+        work_queue.wait_for_children(endpoint_task, "worker", [{'kind': PAGE_TASK, 'page': 1, 'last_page_number': 1}])
+
+    def run_next_task(self):
+        task, = self.downloader.work_queue.lease("worker")
+        self.downloader.run_task(task, "worker")
+        return task
+
+    def test_issues_page_is_saved_after_its_threads(self):
+        output_writer = self.downloader.output_writer
+        self.run_next_task()
+        # The queue could be abandoned here, the page must not look saved
+        self.assertFalse(output_writer.page_exists("user", "repo", "issues", 1))
+
+        self.run_next_task()
+        page_task = self.run_next_task()
+        self.assertEqual(page_task.stage, "finish")
+        self.assertEqual(output_writer.read_page("user", "repo", "issues", 1), [self.issue])
+        self.assertEqual(output_writer.read_page("user", "repo", "issues_comments", 1), [{'id': 10, 'issue_url': self.issue['url']}])
+        self.assertEqual(output_writer.read_page("user", "repo", "issues_events", 1), [{'id': 20, 'url': self.issue['url']}])
+        # The page kept by the task is deleted with it
+        self.assertFalse(os.path.exists(page_task.result[0]))
+
+
+class QueueChangesTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.work_queue = WorkQueue(os.path.join(directory, "queue.db"))
+
+    def test_missed_change_does_not_wait(self):
+        change_count = self.work_queue.get_change_count()
+        self.work_queue.notify_change()
+        start = time.monotonic()
+        self.work_queue.wait_for_change(change_count, 5)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_change_wakes_the_waiter(self):
+        change_count = self.work_queue.get_change_count()
+        timer = threading.Timer(0.05, self.work_queue.notify_change)
+        timer.start()
+        start = time.monotonic()
+        self.work_queue.wait_for_change(change_count, 5)
+        timer.join()
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_wait_times_out_without_a_change(self):
+        start = time.monotonic()
+        self.work_queue.wait_for_change(self.work_queue.get_change_count(), 0.05)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()